@@ -0,0 +1,37 @@
+"""
+Open a channel on an asyncio node and print its broadcast messages
+"""
+
+import asyncio
+
+from libAnt.asyncnode import AsyncNode
+from libAnt.drivers.usb import USBDriver
+
+
+def callback(msg):
+    print(msg)
+
+
+def eCallback(e):
+    print(e)
+
+
+async def main():
+    # For USB driver
+    # USBm sticks have pid=0x1009
+    # USB2 sticks have pid=0x1008
+    async with AsyncNode(USBDriver(vid=0x0FCF, pid=0x1008),
+                         onFailure=eCallback,
+                         name='MyNode') as n:
+        if not await n.open_channel(channel_num=0, profile='FE-C'):
+            return
+        count = 0
+        async for msg in n.channels[0].messages():
+            callback(msg)
+            count += 1
+            if count == 40:  # About 10sec at 4Hz
+                break
+        await n.close_channel(0)
+
+
+asyncio.run(main())
@@ -0,0 +1,26 @@
+"""
+Spread channels over every ANT stick plugged in, USB-m and USB2 alike
+"""
+
+from time import sleep
+
+from libAnt.pool import NodePool
+
+
+def callback(msg):
+    print(msg)
+
+
+def eCallback(e):
+    print(e)
+
+
+with NodePool.from_usb(onSuccess=callback, onFailure=eCallback, name='Gym') as pool:
+    print(f'{len(pool.nodes)} sticks, {pool.max_channels} channels')
+    # Each channel opens on the stick with the most channels free
+    channels = pool.open_channels([{'profile': 'FE-C'}] * 4
+                                  + [{'profile': 'HR'}] * 4)
+    sleep(10)
+    for channel in channels:
+        if channel is not None:
+            pool.close_channel(channel)
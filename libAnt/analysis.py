@@ -0,0 +1,220 @@
+"""
+Offline decoding of captures written by PcapLogger
+
+Instead of replaying a capture through PcapDriver at wall-clock speed, the
+file is memory-mapped and indexed by PcapReader, and every broadcast frame
+is decoded at once into NumPy structured arrays.
+
+NumPy is an optional dependency of libAnt (pip install LibAnt[analysis]),
+it is only needed by this module.
+"""
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+import libAnt.constants as c
+from libAnt.drivers.pcap import PcapReader
+from libAnt.profiles.history import FIELDS
+
+# Frame layout: sync, length, type, channel, 8 payload bytes, flag, extended data, checksum
+_CHANNEL = 3
+_PAYLOAD = 4
+_FLAG = 12
+_EXTENDED = 13
+# Longest frame decoded: every extended field present
+_MAX_FRAME = _EXTENDED + 4 + 3 + 2 + 1
+
+BROADCAST_TYPES = (c.MESSAGE_CHANNEL_BROADCAST_DATA,
+                   c.MESSAGE_CHANNEL_ACKNOWLEDGED_DATA,
+                   c.MESSAGE_CHANNEL_BURST_DATA)
+
+FRAME_DTYPE = [
+    ('timestamp', 'f8'),
+    ('type', 'u1'),
+    ('channel', 'u1'),
+    ('payload', 'u1', (8,)),
+    ('flag', 'u1'),
+    ('device_number', 'u2'),
+    ('device_type', 'u1'),
+    ('tx_type', 'u1'),
+    ('rssi_measurement_type', 'u1'),
+    ('rssi', 'i1'),
+    ('rssi_threshold', 'i1'),
+    ('rx_timestamp', 'u2'),
+]
+
+SERIES_DTYPE = [('timestamp', 'f8')] + [(f, 'f8') for f in FIELDS]
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('libAnt.analysis requires numpy: pip install numpy')
+
+
+def decode_frames(data, offsets, lengths, timestamps):
+    """
+    Decode the broadcast, acknowledged and burst frames of an indexed capture
+
+    Frames failing their checksum are left out.
+
+    :return: structured array of FRAME_DTYPE, one entry per frame, extended
+             fields absent from a frame are 0
+    """
+    _require_numpy()
+    raw = np.frombuffer(data, dtype=np.uint8)
+    # gather a fixed size window of every packet, padded with zeros past its end
+    window = np.arange(_MAX_FRAME)
+    positions = offsets[:, None] + window
+    inside = window < lengths[:, None]
+    frames = np.where(inside, raw[np.minimum(positions, len(raw) - 1)], 0).astype(np.uint8)
+
+    # sync, length, type and checksum around the content, the checksum makes
+    # the xor of every byte of a valid frame 0
+    frameLengths = frames[:, 1].astype(np.int64) + 4
+    inFrame = window < frameLengths[:, None]
+    checksum = np.bitwise_xor.reduce(np.where(inFrame, frames, 0), axis=1)
+    keep = ((lengths >= _FLAG + 1)
+            & (frameLengths <= np.minimum(lengths, _MAX_FRAME))
+            & (frames[:, 0] == c.MESSAGE_TX_SYNC)
+            & np.isin(frames[:, 2], BROADCAST_TYPES)
+            & (checksum == 0))
+    frames, lengths, timestamps = frames[keep], lengths[keep], timestamps[keep]
+
+    out = np.zeros(len(frames), dtype=FRAME_DTYPE)
+    out['timestamp'] = timestamps
+    out['type'] = frames[:, 2]
+    out['channel'] = frames[:, _CHANNEL]
+    out['payload'] = frames[:, _PAYLOAD:_PAYLOAD + 8]
+
+    # the flag byte is only there when the frame is longer than the plain message
+    has_flag = frames[:, 1] > 9
+    flag = np.where(has_flag, frames[:, _FLAG], 0)
+    out['flag'] = flag
+
+    def u16(col):
+        return frames[rows, col].astype(np.uint16) | (frames[rows, col + 1].astype(np.uint16) << 8)
+
+    # offset of the next extended field in every frame
+    pos = np.full(len(frames), _EXTENDED)
+    rows = np.arange(len(frames))
+    cols = np.minimum(pos, _MAX_FRAME - 2)
+
+    has_id = (flag & c.EXT_FLAG_CHANNEL_ID) != 0
+    out['device_number'] = np.where(has_id, u16(cols), 0)
+    out['device_type'] = np.where(has_id, frames[rows, cols + 2], 0)
+    out['tx_type'] = np.where(has_id, frames[rows, cols + 3], 0)
+    pos += np.where(has_id, 4, 0)
+
+    cols = np.minimum(pos, _MAX_FRAME - 3)
+    has_rssi = (flag & c.EXT_FLAG_RSSI) != 0
+    out['rssi_measurement_type'] = np.where(has_rssi, frames[rows, cols], 0)
+    out['rssi'] = np.where(has_rssi, frames[rows, cols + 1], 0).astype(np.uint8).view(np.int8)
+    out['rssi_threshold'] = np.where(has_rssi, frames[rows, cols + 2], 0).astype(np.uint8).view(np.int8)
+    pos += np.where(has_rssi, 3, 0)
+
+    cols = np.minimum(pos, _MAX_FRAME - 2)
+    has_ts = (flag & c.EXT_FLAG_TIMESTAMP) != 0
+    out['rx_timestamp'] = np.where(has_ts, u16(cols), 0)
+    return out
+
+
+def load_pcap(path: str, cacheIndex: bool = False, indexDir: str = None):
+    """
+    Decode every broadcast frame of a capture written by PcapLogger
+
+    :param path: pcap file
+    :param cacheIndex: keep the packet index in a sidecar file, see PcapReader
+    :param indexDir: directory of the sidecar file, next to the capture by default
+    :return: structured array of FRAME_DTYPE
+    """
+    _require_numpy()
+    with PcapReader(path, cacheIndex=cacheIndex, indexDir=indexDir) as reader:
+        if not len(reader):
+            return np.zeros(0, dtype=FRAME_DTYPE)
+        return decode_frames(reader.view,
+                             np.frombuffer(reader.offsets, dtype=np.int64),
+                             np.frombuffer(reader.lengths, dtype=np.uint32).astype(np.int64),
+                             np.frombuffer(reader.timestamps, dtype=np.float64))
+
+
+def devices(frames) -> list:
+    """ :return: sorted list of the (device_number, device_type) found in the frames """
+    _require_numpy()
+    with_id = frames[(frames['flag'] & c.EXT_FLAG_CHANNEL_ID) != 0]
+    pairs = np.unique(np.stack([with_id['device_number'].astype(np.int64),
+                                with_id['device_type'].astype(np.int64)], axis=1), axis=0)
+    return [(int(num), int(type)) for num, type in pairs]
+
+
+def _diff(values, rollover):
+    """ Differences between consecutive counter values, wrapping at rollover """
+    d = np.diff(values.astype(np.int64)) % rollover
+    return np.concatenate([[0], d])
+
+
+def _power(payload, powerCol, accCol, eventCol=1, mask12=False):
+    event = payload[:, eventCol]
+    acc = payload[:, accCol].astype(np.int64) | (payload[:, accCol + 1].astype(np.int64) << 8)
+    inst = payload[:, powerCol].astype(np.int64) | (payload[:, powerCol + 1].astype(np.int64) << 8)
+    if mask12:
+        inst &= 0x0FFF
+    eventDiff = _diff(event, 256)
+    accDiff = _diff(acc, 65536)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(eventDiff > 0, accDiff / eventDiff, inst)
+
+
+def device_series(frames, device_number: int, device_type: int, circumference: int = 2096):
+    """
+    Power, cadence, speed and heart rate of one device, with rollovers handled
+
+    Mirrors what the profile messages compute one message at a time: power
+    from the accumulated power of power-only (0x10) and FE-C trainer (0x19)
+    pages, speed and cadence from the event times of speed & cadence sensors.
+    Speed and cadence are NaN for messages without a new event rather than
+    holding the last value.
+
+    :param circumference: circumference of the wheel (mm), for speed
+    :return: structured array of SERIES_DTYPE, fields a device does not report are NaN
+    """
+    _require_numpy()
+    mine = frames[((frames['flag'] & c.EXT_FLAG_CHANNEL_ID) != 0)
+                  & (frames['device_number'] == device_number)
+                  & (frames['device_type'] == device_type)]
+    payload = mine['payload']
+    page = payload[:, 0]
+
+    if device_type == c.PROFILES['PWR']:
+        mine, payload = mine[page == c.PAGE_POWER_ONLY], payload[page == c.PAGE_POWER_ONLY]
+    elif device_type == c.PROFILES['FE-C']:
+        mine, payload = mine[page == c.PAGE_TRAINER_DATA], payload[page == c.PAGE_TRAINER_DATA]
+
+    out = np.full(len(mine), np.nan, dtype=SERIES_DTYPE)
+    out['timestamp'] = mine['timestamp']
+    if not len(mine):
+        return out
+
+    if device_type == c.PROFILES['PWR']:
+        out['power'] = _power(payload, powerCol=6, accCol=4)
+        cadence = payload[:, 3].astype(np.float64)
+        out['cadence'] = np.where(cadence != 0xFF, cadence, np.nan)
+    elif device_type == c.PROFILES['FE-C']:
+        out['power'] = _power(payload, powerCol=5, accCol=3, mask12=True)
+        cadence = payload[:, 2].astype(np.float64)
+        out['cadence'] = np.where(cadence != 0xFF, cadence, np.nan)
+    elif device_type == c.PROFILES['HR']:
+        hr = payload[:, 7].astype(np.float64)
+        out['heartrate'] = np.where(hr != 0, hr, np.nan)
+    elif device_type == 121:
+        words = payload.copy().view('<u2').astype(np.int64)
+        cadenceTimeDiff = _diff(words[:, 0], 65536)
+        cadenceRevDiff = _diff(words[:, 1], 65536)
+        speedTimeDiff = _diff(words[:, 2], 65536)
+        speedRevDiff = _diff(words[:, 3], 65536)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out['cadence'] = np.where(cadenceTimeDiff > 0, cadenceRevDiff * 1024 * 60 / cadenceTimeDiff, np.nan)
+            out['speed'] = np.where(speedTimeDiff > 0, speedRevDiff * 1.024 * circumference / speedTimeDiff, np.nan)
+        # the first message has nothing to be compared to
+        out['cadence'][0] = out['speed'][0] = np.nan
+    return out
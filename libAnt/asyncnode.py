@@ -0,0 +1,457 @@
+"""
+Asyncio counterpart of libAnt.node
+
+AsyncNode offers the same operations as Node as coroutines. A single reader
+task per node parses incoming frames and resolves the futures of outstanding
+requests, so no thread is needed per node apart from the transport's own
+reader and many nodes can share one event loop.
+"""
+import asyncio
+import libAnt.constants as c
+import libAnt.exceptions as ex
+import libAnt.message as m
+from libAnt.drivers.asyncdriver import AsyncDriver
+from libAnt.dispatcher import Dispatcher
+from libAnt.drivers.driver import Driver, DriverException
+
+class AsyncNode:
+    def __init__(self, driver,
+                 onSuccess=None,
+                 onFailure=None,
+                 name: str = None,
+                 timeout: float = 5,
+                 debug=False):
+        if isinstance(driver, Driver):
+            driver = AsyncDriver(driver)
+        self._driver = driver
+        self._name = name
+        self._reader = None
+        self._dispatcher = Dispatcher()
+        # Content of the config messages acknowledged by the device, keyed by
+        # (message type, channel or network number)
+        self._applied = {}
+        self.timeout = timeout
+        self.debug = debug
+        self.onSuccess = onSuccess
+        self.onFailure = onFailure
+        self.channels = []
+        self.max_channels = 0
+        self.max_networks = 0
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+    async def start(self, onSuccess=None, onFailure=None):
+        if self.isRunning():
+            return True
+
+        if onSuccess:
+            self.onSuccess = onSuccess
+        if onFailure:
+            self.onFailure = onFailure
+        await self._driver.open()
+        self._reader = asyncio.create_task(self._readLoop())
+        await self.reset()
+        self.capabilities = await self.get_capabilities(disp=False)
+        self.serial_number = await self.get_ANT_serial_number(disp=False)
+        self.max_channels = self.capabilities["max_channels"]
+        self.max_networks = self.capabilities["max_networks"]
+        self.channels = [None] * self.max_channels
+        self.networks = [0] * self.max_networks
+        return True
+
+    async def stop(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+            self._reader = None
+        self._failWaiters(DriverException("Node stopped"))
+        for channel in self.channels:
+            if channel is not None:
+                channel._end()
+        await self._driver.close()
+        return True
+
+    def isRunning(self):
+        return self._reader is not None and not self._reader.done()
+
+    async def reset(self):
+        try:
+            await self._request(m.ResetSystemMessage(), timeout=1)
+        except asyncio.TimeoutError:
+            # Not every device answers a reset with a startup message
+            pass
+        self._applied.clear()
+        for channel in self.channels:
+            if channel is not None:
+                channel._end()
+        self.channels = [None] * self.max_channels
+
+    async def open_channel(self, channel_num: int = 0,
+                           network_num: int = 0,
+                           network_key=c.ANTPLUS_NETWORK_KEY,
+                           channel_type=c.CHANNEL_BIDIRECTIONAL_SLAVE,
+                           device_type=0,
+                           channel_frequency=2457,
+                           channel_msg_freq=4,
+                           channel_search_timeout=5,
+                           **kwargs):
+        if channel_num >= self.max_channels or channel_num < 0:
+            self._fail(ValueError("Channel assignment exceeds device "
+                                  "capabilities"))
+            return False
+
+        if network_num >= self.max_networks or network_num < 0:
+            self._fail(ValueError("Network assignment exceeds device "
+                                  "capabilities"))
+            return False
+
+        if self.channels[channel_num] is not None:
+            self._fail(ValueError("Channel is already in use"))
+            return False
+
+        if 'profile' in kwargs:
+            match kwargs.get('profile'):
+                case 'FE-C':
+                    device_type = 17
+
+                case 'PWR':
+                    device_type = 0
+
+                case 'HR':
+                    device_type = 0x78
+                    channel_msg_freq = 4.06
+
+        channel = AsyncChannel(self,
+                               channel_num,
+                               network_num,
+                               network_key,
+                               channel_type,
+                               device_type,
+                               channel_frequency,
+                               channel_msg_freq,
+                               channel_search_timeout)
+        self.channels[channel_num] = channel
+        try:
+            await channel.configure()
+        except Exception as e:
+            self.channels[channel_num] = None
+            self._fail(e)
+            return False
+
+        self._succeed(f"Channel {channel_num} Configuration Success!\n"
+                      f"Attempting to Open Channel {channel_num}...")
+        if not await channel.open():
+            # Search timed out, the device closed the channel itself
+            try:
+                await channel.close(timeout=True)
+            except Exception as e:
+                self._fail(e)
+            self.channels[channel_num] = None
+            return False
+
+        self._succeed("First Message Recieved!\n"
+                      f"Idenfiying Channel {channel_num} Properties...")
+        channel.id = await self.get_channel_ID(channel_num, disp=False)
+        channel.status = await self.get_channel_status(channel_num,
+                                                       disp=False)
+        return True
+
+    async def close_channel(self, channel_num, timeout=False):
+        await self.channels[channel_num].close(timeout=timeout)
+        self.channels[channel_num] = None
+        return True
+
+    async def send_tx_msg(self, msg):
+        channel = self.channels[msg.content[0]]
+        if channel is None:
+            raise ex.ChannelNotOpened()
+        return await channel.send(msg)
+
+    async def get_capabilities(self, disp=True):
+        cap_msg = await self.send_message(m.RequestCapabilitiesMessage())
+        if disp:
+            self._succeed(cap_msg.disp_capabilities(cap_msg))
+        return cap_msg.capabilities_dict
+
+    async def get_channel_status(self, channel_num: int, disp=True):
+        stat_msg = await self.send_message(
+            m.RequestChannelStatusMessage(channel_num))
+        if disp:
+            self._succeed(stat_msg.disp_status(stat_msg))
+        return stat_msg.status_dict
+
+    async def get_channel_ID(self, channel_num: int, disp=True):
+        id_msg = await self.send_message(
+            m.RequestChannelIDMessage(channel_num))
+        if disp:
+            self._succeed(id_msg.disp_ID(id_msg))
+        return id_msg.id_dict
+
+    async def get_ANT_serial_number(self, disp=True):
+        sn_msg = await self.send_message(m.RequestSerialNumberMessage())
+        if disp:
+            self._succeed(sn_msg.disp_SN(sn_msg))
+        return sn_msg.serial_number
+
+    async def send_message(self, msg: m.Message, timeout=None):
+        """
+        Send a config, control or request message and await the reply
+
+        :return: the decoded reply for request messages, otherwise the
+                 result of the message's callback on the channel response
+        """
+        reply = await self._request(msg, timeout=timeout)
+        if msg.type == c.MESSAGE_CHANNEL_REQUEST:
+            return msg.callback(reply.content)
+        return msg.callback(reply, msg.type)
+
+    async def configure(self, msgs: list, timeout=None) -> list:
+        """
+        Send config messages in one batch and await every acknowledgement.
+        Settings the device already acknowledged are not sent again.
+
+        :return: the callback result of each message, in order
+        """
+        loop = asyncio.get_running_loop()
+        batch = []
+        results = []
+        for msg in msgs:
+            key = (msg.type, msg.content[0])
+            if self._applied.get(key) == bytes(msg.content):
+                results.append(f'Message Skipped. Type: {hex(msg.type)}')
+                continue
+            future = loop.create_future()
+            batch.append((key, msg, self._dispatcher.expect(msg, future)))
+            results.append(future)
+
+        try:
+            if batch:
+                await self._driver.write_many([msg for _, msg, _ in batch])
+            replies = await asyncio.wait_for(
+                asyncio.gather(*(w.future for _, _, w in batch)),
+                timeout or self.timeout)
+        finally:
+            for _, _, waiter in batch:
+                self._dispatcher.withdraw(waiter)
+
+        sent = iter(zip(batch, replies))
+        for i, result in enumerate(results):
+            if isinstance(result, asyncio.Future):
+                (key, msg, _), reply = next(sent)
+                results[i] = msg.callback(reply, msg.type)
+                self._applied[key] = bytes(msg.content)
+        return results
+
+    def _config_cleared(self, channel_num):
+        """Forget the channel settings once the channel is unassigned"""
+        for key in [k for k in self._applied
+                    if k[1] == channel_num
+                    and k[0] not in c.network_config_messages]:
+            del self._applied[key]
+
+    async def _request(self, msg: m.Message, timeout=None):
+        future = asyncio.get_running_loop().create_future()
+        waiter = self._dispatcher.expect(msg, future)
+        try:
+            await self._driver.write(msg)
+            if self.debug:
+                print(f'Message Sent: {msg}')
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        finally:
+            self._dispatcher.withdraw(waiter)
+
+    def _resolve(self, msg: m.Message) -> bool:
+        waiter = self._dispatcher.resolve(msg)
+        if waiter is None:
+            return False
+        waiter.future.set_result(msg)
+        return True
+
+    def _failWaiters(self, e: Exception):
+        for waiter in self._dispatcher.drain():
+            waiter.future.set_exception(e)
+
+    async def _readLoop(self):
+        try:
+            while True:
+                for msg in await self._driver.read_many():
+                    if self.debug:
+                        print(f'Message Recieved: {msg}')
+                    try:
+                        self._process(msg)
+                    except Exception as e:
+                        self._fail(e)
+        except DriverException as e:
+            self._failWaiters(e)
+            self._fail(e)
+
+    def _process(self, msg: m.Message):
+        if msg.type == c.MESSAGE_CHANNEL_BROADCAST_DATA:
+            bmsg = m.BroadcastMessage(msg.type, msg.content).build(msg.content)
+            bmsg.timestamp = msg.timestamp
+            channel = self._channel(bmsg.channel)
+            if channel is not None:
+                channel._deliver(bmsg)
+            self._succeed(bmsg)
+
+        elif (msg.type == c.MESSAGE_CHANNEL_EVENT
+              and msg.content[1] == c.MESSAGE_RF_EVENT):
+            channel = self._channel(msg.content[0])
+            try:
+                out = m.process_event_code(msg, msg.content[2])
+            except Exception as e:
+                if channel is not None:
+                    channel._event(msg.content[2], e)
+                raise e
+            else:
+                if channel is not None:
+                    channel._event(msg.content[2])
+                self._succeed(out)
+
+        elif msg.type == c.MESSAGE_SERIAL_ERROR:
+            raise ex.SerialError(msg.content)
+
+        elif not self._resolve(msg) and msg.type == c.MESSAGE_STARTUP:
+            self._succeed(m.StartUpMessage(msg.content).disp_startup(msg))
+
+    def _channel(self, channel_num):
+        if 0 <= channel_num < len(self.channels):
+            return self.channels[channel_num]
+        return None
+
+    def _succeed(self, out):
+        if callable(self.onSuccess):
+            self.onSuccess(out)
+
+    def _fail(self, e):
+        if callable(self.onFailure):
+            self.onFailure(e)
+
+
+class AsyncChannel:
+    """Channel handled by an AsyncNode"""
+
+    def __init__(self, node: AsyncNode,
+                 channel_num=0,
+                 network_num=0,
+                 network_key=c.ANTPLUS_NETWORK_KEY,
+                 channel_type=c.CHANNEL_BIDIRECTIONAL_SLAVE,
+                 device_type=0,
+                 channel_frequency=2457,
+                 channel_msg_freq=4,
+                 channel_search_timeout=30,
+                 maxQueued: int = 256):
+        self._node = node
+        self.number = channel_num
+        self.network = network_num
+        self.network_key = network_key
+        self._type = channel_type
+        self.device_type = device_type
+        self.frequency = channel_frequency
+        self.msg_freq = channel_msg_freq
+        self.search_timeout = channel_search_timeout
+        self.id = None
+        self.status = None
+        self._messages = asyncio.Queue(maxsize=maxQueued)
+        self._firstMessage = None
+        self._closed = None
+        self._txResult = None
+        self._txLock = asyncio.Lock()
+
+    async def configure(self):
+        await self._node.configure(self.config_messages())
+
+    def config_messages(self):
+        """Messages configuring the device for this channel, in order"""
+        return [m.SetNetworkKeyMessage(self.network, self.network_key),
+                m.AssignChannelMessage(self.number, self._type, self.network),
+                m.SetChannelIdMessage(self.number,
+                                      device_type=self.device_type),
+                m.SetChannelRfFrequencyMessage(self.number, self.frequency),
+                m.ChannelMessagingPeriodMessage(self.number, self.msg_freq),
+                m.ChannelSearchTimeoutMessage(self.number,
+                                              self.search_timeout)]
+
+    async def open(self) -> bool:
+        """
+        Open the channel and wait for the first broadcast message
+
+        :return: False if the search timed out before a device was found
+        """
+        loop = asyncio.get_running_loop()
+        self._firstMessage = loop.create_future()
+        await self._node.send_message(m.OpenChannelMessage(self.number))
+        try:
+            await self._firstMessage
+        except ex.RxSearchTimeout:
+            return False
+        return True
+
+    async def close(self, timeout=False):
+        if not timeout:
+            self._closed = asyncio.get_running_loop().create_future()
+            await self._node.send_message(m.CloseChannelMessage(self.number))
+            await asyncio.wait_for(self._closed, self._node.timeout)
+        await self._node.send_message(m.UnassignChannelMessage(self.number))
+        self._node._config_cleared(self.number)
+        self._end()
+
+    async def send(self, msg: m.Message) -> bool:
+        """
+        Send an acknowledged data message on this channel
+
+        :return: True once the device confirms the transfer, False if it fails
+        """
+        async with self._txLock:
+            self._txResult = asyncio.get_running_loop().create_future()
+            await self._node._driver.write(msg)
+            return await asyncio.wait_for(self._txResult, self._node.timeout)
+
+    async def messages(self):
+        """Iterate over the broadcast messages received until closed"""
+        while True:
+            msg = await self._messages.get()
+            if msg is None:
+                return
+            yield msg
+
+    def _deliver(self, msg: m.BroadcastMessage):
+        if self._firstMessage is not None and not self._firstMessage.done():
+            self._firstMessage.set_result(msg)
+        if self._messages.full():
+            # drop the oldest message rather than stall the reader
+            self._messages.get_nowait()
+        self._messages.put_nowait(msg)
+
+    def _event(self, code, error=None):
+        match code:
+            case c.EVENT_RX_SEARCH_TIMEOUT:
+                self._settle(self._firstMessage, exception=error)
+            case c.EVENT_CHANNEL_CLOSED:
+                self._settle(self._closed, True)
+            case c.EVENT_TRANSFER_TX_COMPLETED:
+                self._settle(self._txResult, True)
+            case c.EVENT_TRANSFER_TX_FAILED:
+                self._settle(self._txResult, False)
+
+    def _end(self):
+        if self._messages.full():
+            self._messages.get_nowait()
+        self._messages.put_nowait(None)
+
+    @staticmethod
+    def _settle(future, result=None, exception=None):
+        if future is None or future.done():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
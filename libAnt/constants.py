@@ -1,6 +1,12 @@
 MESSAGE_TX_SYNC = 0xA4
 MESSAGE_TX_SYNC_LEGACY = 0xA5
 
+# USB sticks
+USB_VENDOR_ID = 0x0FCF
+USB_PID_ANT_USB2 = 0x1008
+USB_PID_ANT_USBM = 0x1009
+USB_PRODUCT_IDS = (USB_PID_ANT_USBM, USB_PID_ANT_USB2)
+
 # Channel Types
 CHANNEL_BIDIRECTIONAL_SLAVE = 0x00
 CHANNEL_BIDIRECTIONAL_MASTER = 0x10
@@ -27,6 +33,12 @@ MESSAGE_LOW_PRIORITY_SEARCH_TIMEOUT = 0x63  # [Channel number, Search timeout]
 MESSAGE_PROXIMITY_SEARCH = 0x71
 MESSAGE_ENABLE_EXT_RX_MESSAGES = 0x66  # [0, enable (0 or 1)]
 MESSAGE_LIB_CONFIG = 0x6E  # [0, libconfig]
+# Config messages applying to a network or the whole device rather than a
+# channel, their settings survive unassigning a channel
+network_config_messages = [
+    MESSAGE_NETWORK_KEY,
+    MESSAGE_ENABLE_EXT_RX_MESSAGES,
+    MESSAGE_LIB_CONFIG]
 
 # Notification messages
 MESSAGE_STARTUP = 0x6F
@@ -113,6 +125,8 @@ CHANNEL_STATE_UNASSIGNED = 0x00
 CHANNEL_STATE_ASSIGNED = 0x01
 CHANNEL_STATE_SEARCHING = 0x02
 CHANNEL_STATE_TRACKING = 0x03
+# Host side only: the search timed out and the device closed the channel
+CHANNEL_STATE_SEARCH_TIMEOUT = 0x04
 CAPABILITIES_NO_RECEIVE_CHANNELS = 0x01
 CAPABILITIES_NO_TRANSMIT_CHANNELS = 0x02
 CAPABILITIES_NO_RECEIVE_MESSAGES = 0x04
@@ -143,7 +157,16 @@ EXT_FLAG_RSSI = 0x40
 EXT_FLAG_TIMESTAMP = 0x20
 
 # FE-C PAGES
+PAGE_GENERAL_FE_DATA = 0x10
+PAGE_GENERAL_SETTINGS = 0x11
+PAGE_TRAINER_DATA = 0x19
+PAGE_TRAINER_TORQUE_DATA = 0x1A
 PAGE_TRACK_RESISTANCE = 0x33
 PAGE_USER_CONFIGURATION = 0x37
 
+# Bicycle power pages
+PAGE_POWER_ONLY = 0x10
+PAGE_WHEEL_TORQUE = 0x11
+PAGE_CRANK_TORQUE = 0x12
+
 PROFILES = {'FE-C': 17, 'PWR': 11, 'HR': 120}
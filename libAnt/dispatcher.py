@@ -0,0 +1,168 @@
+"""
+Correlation of outgoing ANT requests with the messages replying to them
+
+Every config, control and request message is answered either by a channel
+event quoting the id of the message it responds to, or by a dedicated
+response message (capabilities, channel id, startup...). Both carry enough
+information to be mapped back to the request with a dictionary lookup.
+"""
+import heapq
+import itertools
+import time
+from collections import deque
+from threading import Lock
+
+import libAnt.constants as c
+
+# Requested response messages that do not carry a channel number
+GLOBAL_RESPONSES = (c.MESSAGE_CAPABILITIES,
+                    c.MESSAGE_SERIAL_NUMBER,
+                    c.MESSAGE_VERSION)
+
+
+def request_key(msg):
+    """
+    Key under which the reply to an outgoing message will be filed
+
+    Replies carried by a channel event are keyed (channel, event, message id)
+    so they can not be confused with a requested response of the same id,
+    e.g. the event acknowledging a SetChannelIdMessage and a ChannelIDMessage.
+    """
+    if msg.type == c.MESSAGE_SYSTEM_RESET:
+        return None, c.MESSAGE_STARTUP
+    if msg.type == c.MESSAGE_CHANNEL_REQUEST:
+        if msg.content[1] in GLOBAL_RESPONSES:
+            return None, msg.content[1]
+        return msg.content[0], msg.content[1]
+    return msg.content[0], c.MESSAGE_CHANNEL_EVENT, msg.type
+
+
+def response_key(msg):
+    """
+    Key of the request an incoming message replies to, None for messages
+    which are not replies (broadcasts, RF events...)
+    """
+    if msg.type == c.MESSAGE_CHANNEL_EVENT:
+        if msg.content[1] == c.MESSAGE_RF_EVENT:
+            return None
+        return msg.content[0], c.MESSAGE_CHANNEL_EVENT, msg.content[1]
+    if msg.type in GLOBAL_RESPONSES or msg.type == c.MESSAGE_STARTUP:
+        return None, msg.type
+    if msg.type in (c.MESSAGE_CHANNEL_STATUS, c.MESSAGE_CHANNEL_ID):
+        return msg.content[0], msg.type
+    return None
+
+
+class Waiter:
+    """Outstanding request and the future its reply will be delivered to"""
+
+    __slots__ = ('msg', 'future', 'deadline')
+
+    def __init__(self, msg, future, deadline):
+        self.msg = msg
+        self.future = future
+        self.deadline = deadline
+
+
+class Dispatcher:
+    """
+    Table of outstanding requests keyed by (channel, message id)
+
+    Requests sharing a key are answered in the order they were sent. Futures
+    may be concurrent.futures or asyncio futures, the dispatcher only looks
+    them up; completing them is left to the caller.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._waiters = {}
+        self._deadlines = []
+        self._seq = itertools.count()
+
+    def __len__(self):
+        with self._lock:
+            return sum(1 for waiters in self._waiters.values()
+                       for w in waiters if not w.future.done())
+
+    def expect(self, msg, future, timeout=None) -> Waiter:
+        """
+        Register a request before it is sent
+
+        :param msg: the outgoing message
+        :param future: future the reply will be delivered to
+        :param timeout: seconds after which expire() gives up on the reply
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        waiter = Waiter(msg, future, deadline)
+        with self._lock:
+            self._waiters.setdefault(request_key(msg), deque()).append(waiter)
+            if deadline is not None:
+                heapq.heappush(self._deadlines,
+                               (deadline, next(self._seq), waiter))
+        return waiter
+
+    def resolve(self, reply):
+        """
+        Find the oldest outstanding request the incoming message replies to
+
+        :return: the matching Waiter, removed from the table, or None
+        """
+        key = response_key(reply)
+        if key is None:
+            return None
+        with self._lock:
+            waiters = self._waiters.get(key)
+            while waiters:
+                waiter = waiters.popleft()
+                if not waiter.future.done():
+                    if not waiters:
+                        del self._waiters[key]
+                    return waiter
+            self._waiters.pop(key, None)
+        return None
+
+    def expire(self, now=None) -> list:
+        """
+        Remove the requests whose timeout has passed
+
+        :return: list of the expired Waiters whose future is still pending
+        """
+        now = time.monotonic() if now is None else now
+        expired = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                waiter = heapq.heappop(self._deadlines)[2]
+                if waiter.future.done():
+                    continue
+                waiters = self._waiters.get(request_key(waiter.msg))
+                if waiters is None or waiter not in waiters:
+                    # already handed out by resolve()
+                    continue
+                waiters.remove(waiter)
+                expired.append(waiter)
+        return expired
+
+    def next_deadline(self):
+        """ :return: time.monotonic() at which expire() is next due, None if never """
+        with self._lock:
+            return self._deadlines[0][0] if self._deadlines else None
+
+    def withdraw(self, waiter: Waiter) -> None:
+        """ Forget a request its sender stopped waiting for """
+        with self._lock:
+            waiters = self._waiters.get(request_key(waiter.msg))
+            if waiters is not None and waiter in waiters:
+                waiters.remove(waiter)
+
+    def drain(self) -> list:
+        """
+        Remove every outstanding request, e.g. when the device goes away
+
+        :return: list of the Waiters whose future is still pending
+        """
+        with self._lock:
+            pending = [w for waiters in self._waiters.values()
+                       for w in waiters if not w.future.done()]
+            self._waiters.clear()
+            self._deadlines.clear()
+        return pending
@@ -0,0 +1,110 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty
+
+from libAnt.drivers.driver import Driver, DriverException
+from libAnt.drivers.framer import Framer
+from libAnt.message import Message
+
+
+class AsyncDriver:
+    """
+    Asyncio front end for a Driver
+
+    Reads are driven from the event loop: transports that can notify when data
+    arrives (USB, pcap) are drained without blocking, the others are polled
+    from the default executor. Incoming data goes through the same Framer as
+    the blocking Driver.read, so logging and timestamps (the capture time of
+    replayed packets) behave identically. Writes block on the transport, they
+    run one after the other in a thread of their own.
+    """
+
+    def __init__(self, driver: Driver, pollInterval: float = 0.1):
+        self._driver = driver
+        self._pollInterval = pollInterval
+        self._framer = Framer(onFrame=driver._logFrame)
+        self._ready = None
+        self._watched = False
+        self._loop = None
+        self._writer = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    @property
+    def driver(self) -> Driver:
+        return self._driver
+
+    def isOpen(self) -> bool:
+        return self._driver.isOpen()
+
+    async def open(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+        self._framer.clear()
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='AsyncDriver-write')
+        await self._loop.run_in_executor(None, self._driver.open)
+        if not self._driver.isOpen():
+            raise DriverException("Could not open specified device")
+        self._watched = self._driver._watch(self._notify)
+
+    async def close(self) -> None:
+        if self._loop is not None:
+            await self._loop.run_in_executor(None, self._driver.close)
+        if self._writer is not None:
+            self._writer.shutdown(wait=False)
+            self._writer = None
+
+    async def write(self, msg: Message) -> None:
+        await self._write(self._driver.write, msg)
+
+    async def write_many(self, msgs) -> None:
+        await self._write(self._driver.write_many, msgs)
+
+    async def _write(self, write, arg) -> None:
+        if self._writer is None:
+            raise DriverException("Device is closed")
+        await asyncio.get_running_loop().run_in_executor(self._writer, write, arg)
+
+    async def read_many(self) -> list:
+        """
+        Wait until at least one complete message has arrived
+
+        :return: list of every message parsed from the data received so far
+        """
+        while True:
+            if not self._driver.isOpen():
+                raise DriverException("Device is closed")
+            msgs = []
+            for timestamp, data in await self._readStamped():
+                if data:
+                    msgs.extend(self._framer.feed(data, timestamp))
+            if msgs:
+                return msgs
+
+    async def _readStamped(self) -> list:
+        if not self._watched:
+            try:
+                return await self._loop.run_in_executor(
+                    None, self._driver._readStamped, self._pollInterval)
+            except (Empty, IndexError):
+                return []
+
+        while True:
+            # clear before polling so a notification racing the poll is kept
+            self._ready.clear()
+            try:
+                return self._driver._readStamped(timeout=0)
+            except Empty:
+                await self._ready.wait()
+
+    def _notify(self) -> None:
+        # called from the transport's reader thread
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._ready.set)
@@ -0,0 +1,98 @@
+from collections import deque
+from queue import Empty
+from threading import Event
+
+
+class ChunkBuffer:
+    """
+    Hand-off of raw data chunks from a transport reader thread to the driver
+
+    The producer appends whole packets, the consumer drains everything that
+    is buffered in one call. deque.append and deque.popleft are atomic, so
+    the only synchronisation is an Event used to wake a waiting consumer.
+    A None chunk marks the end of the stream.
+    """
+
+    def __init__(self):
+        self._chunks = deque()
+        self._ready = Event()
+        self._drained = Event()
+        self._listener = None
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def setListener(self, listener) -> None:
+        """
+        Register a callable invoked, from the producer thread, after every put
+        """
+        self._listener = listener
+
+    def put(self, chunk) -> None:
+        self._chunks.append(chunk)
+        self._ready.set()
+        if self._listener is not None:
+            self._listener()
+
+    def putMany(self, chunks) -> None:
+        """ Append several chunks at once, waking the consumer only once """
+        self._chunks.extend(chunks)
+        self._ready.set()
+        if self._listener is not None:
+            self._listener()
+
+    def get(self, timeout=None):
+        """
+        Return all buffered data joined into one bytes object, waiting up to
+        timeout for at least one chunk
+
+        :return: bytes, or None once the end of stream marker is reached
+        :raises Empty: if nothing arrived before the timeout
+        """
+        chunks = self.getMany(timeout)
+        return b''.join(chunks) if chunks is not None else None
+
+    def getMany(self, timeout=None):
+        """
+        Like get, but return the buffered chunks as a list without joining them
+
+        :return: list of chunks, or None once the end of stream marker is reached
+        :raises Empty: if nothing arrived before the timeout
+        """
+        chunks = self._chunks
+        if not chunks:
+            self._ready.clear()
+            # re-check after clearing, a chunk may have slipped in between
+            if not chunks and not self._ready.wait(timeout):
+                raise Empty
+
+        data = []
+        while chunks:
+            chunk = chunks[0]
+            if chunk is None:
+                if not data:
+                    # leave the marker in place so every later read sees it
+                    return None
+                break
+            data.append(chunks.popleft())
+        self._drained.set()
+        return data
+
+    def waitBelow(self, limit: int, timeout=None) -> bool:
+        """
+        Block the producer until at most limit chunks are buffered
+
+        :return: False if the buffer is still above the limit after timeout
+        """
+        if len(self._chunks) <= limit:
+            return True
+        self._drained.clear()
+        if len(self._chunks) <= limit:
+            return True
+        self._drained.wait(timeout)
+        return len(self._chunks) <= limit
+
+    def clear(self) -> None:
+        self._chunks.clear()
+        self._ready.clear()
+        self._drained.set()
@@ -0,0 +1,17 @@
+from libAnt.drivers.pcap import PcapDriver
+from libAnt.loggers.compressed import CompressedReader
+from libAnt.loggers.logger import Logger
+
+
+class CompressedDriver(PcapDriver):
+    """
+    Replays a capture written by CompressedLogger, with the same replay
+    speeds and time range as PcapDriver
+    """
+
+    def __init__(self, capture: str, logger: Logger = None, speed: float = PcapDriver.REPLAY_REALTIME,
+                 start: float = None, end: float = None):
+        super().__init__(capture, logger=logger, speed=speed, start=start, end=end)
+
+    def _openReader(self):
+        return CompressedReader(self._pcap)
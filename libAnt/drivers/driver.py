@@ -1,10 +1,11 @@
 import time
 from abc import abstractmethod
+from collections import deque
 from queue import Empty
 from threading import Lock
 
-from libAnt.constants import MESSAGE_TX_SYNC
-# from libAnt.loggers.logger import Logger
+from libAnt.drivers.framer import Framer
+from libAnt.loggers.logger import Logger
 from libAnt.message import Message
 
 
@@ -15,32 +16,46 @@ class DriverException(Exception):
 class Driver:
     """
     The driver provides an interface to read and write raw data to and from an ANT+ capable hardware device
+
+    Reads and writes are serialized by separate locks, so a write goes out
+    immediately even while another thread is blocked in read. Opening and
+    closing take both.
     """
 
     def __init__(self, logger=None):
-        self._lock = Lock()
-        self._gui_logger = logger
+        """
+        :param logger: Logger recording every frame read, or a logging.Logger
+                       style object receiving status messages (GUI)
+        """
+        self._rxLock = Lock()
+        self._txLock = Lock()
         self._openTime = None
-        self._logger = None
+        if isinstance(logger, Logger):
+            self._logger = logger
+            self._gui_logger = None
+        else:
+            self._logger = None
+            self._gui_logger = logger
+        self._framer = Framer(onFrame=self._logFrame)
+        self._pending = deque()
 
     def __enter__(self):
         self.open()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if self._dev is not None:
-            self.close()
+        self.close()
 
     def isOpen(self) -> bool:
-        with self._lock:
-            return self._isOpen()
+        return self._isOpen()
 
     def open(self) -> None:
-        with self._lock:
+        with self._txLock, self._rxLock:
             if not self._isOpen():
                 self._openTime = time.time()
                 if self._logger is not None:
                     self._logger.open()
+                self._resetFramer()
                 try:
                     self._open()
                 except Exception as e:
@@ -48,53 +63,81 @@ class Driver:
                     pass
 
     def close(self) -> None:
-        with self._lock:
-            if self._isOpen:
+        with self._txLock, self._rxLock:
+            if self._isOpen():
                 self._close()
-                if self._logger is not None:
-                    self._logger.close()
+            if self._logger is not None:
+                self._logger.close()
 
     def reOpen(self) -> None:
-        with self._lock:
+        with self._txLock, self._rxLock:
             if self._isOpen():
                 self._close()
+            self._resetFramer()
             self._open()
 
     def read(self, timeout=None) -> Message:
-        if not self.isOpen():
+        with self._rxLock:
+            if not self._pending:
+                self._pending.extend(self._readFrames(timeout))
+            if not self._pending:
+                raise Empty
+            return self._pending.popleft()
+
+    def read_many(self, timeout=None) -> list:
+        """
+        Return every complete message currently buffered, waiting up to
+        timeout for the transport to deliver at least one
+
+        :return: list of messages, empty if none arrived before the timeout
+        """
+        with self._rxLock:
+            if self._pending:
+                msgs = list(self._pending)
+                self._pending.clear()
+                return msgs
+            return self._readFrames(timeout)
+
+    def _readFrames(self, timeout=None) -> list:
+        if not self._isOpen():
             raise DriverException("Device is closed")
 
-        with self._lock:
-            while True:
-                try:
-                    sync = self._read(1, timeout=timeout)[0]
-                    if sync is not MESSAGE_TX_SYNC:
-                        continue
-                    length = self._read(1, timeout=timeout)[0]
-                    type = self._read(1, timeout=timeout)[0]
-                    data = self._read(length, timeout=timeout)
-                    chk = self._read(1, timeout=timeout)[0]
-                    msg = Message(type, data)
-
-                    if self._logger:
-                        logMsg = bytearray([sync, length, type])
-                        logMsg.extend(data)
-                        logMsg.append(chk)
-
-                        self._logger.log(bytes(logMsg))
-
-                    if msg.checksum() == chk:
-                        return msg
-                except IndexError:
-                    raise Empty
+        while True:
+            try:
+                data = self._readChunk(timeout=timeout)
+            except (Empty, IndexError):
+                return []
+            if not data:
+                return []
+            msgs = self._framer.feed(data, time.time())
+            if msgs:
+                return msgs
+
+    def _logFrame(self, frame: bytes) -> None:
+        if self._logger:
+            self._logger.log(frame)
+
+    def _resetFramer(self) -> None:
+        self._framer.clear()
+        self._pending.clear()
 
     def write(self, msg: Message) -> None:
         if not self.isOpen():
             raise DriverException("Device is closed")
 
-        with self._lock:
+        with self._txLock:
             self._write(msg.encode())
 
+    def write_many(self, msgs) -> None:
+        """
+        Send several messages back to back in a single transport write
+        """
+        if not self.isOpen():
+            raise DriverException("Device is closed")
+
+        with self._txLock:
+            self._write(b''.join(msg.encode() for msg in msgs))
+
     def abort(self) -> None:
         self._abort()
 
@@ -114,6 +157,36 @@ class Driver:
     def _read(self, count: int, timeout=None) -> bytes:
         pass
 
+    def _readChunk(self, timeout=None) -> bytes:
+        """
+        Return whatever data the transport has available, blocking up to
+        timeout for at least one byte. Drivers able to hand over more than a
+        byte at a time should override this.
+        """
+        return self._read(1, timeout=timeout)
+
+    def _readStamped(self, timeout=None) -> list:
+        """
+        Like _readChunk, with the time the data was received. Transports
+        which know it better than the time of the read (replayed captures)
+        override this.
+
+        :return: list of (timestamp, data)
+        """
+        data = self._readChunk(timeout=timeout)
+        return [(time.time(), data)]
+
+    def _watch(self, callback) -> bool:
+        """
+        Ask the transport to call callback, from any thread, whenever new data
+        may be available to _readChunk. Must be called after the device is
+        opened.
+
+        :return: False if the transport can not notify, in which case the
+                 caller has to block in _readChunk instead
+        """
+        return False
+
     @abstractmethod
     def _write(self, data: bytes) -> None:
         pass
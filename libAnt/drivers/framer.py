@@ -0,0 +1,89 @@
+from functools import reduce
+from operator import xor
+
+from libAnt.constants import MESSAGE_TX_SYNC
+from libAnt.message import Message
+
+# Sync, length, type and checksum bytes wrapped around the content of a frame
+FRAME_OVERHEAD = 4
+
+
+class Framer:
+    """
+    Incremental parser splitting a raw byte stream into ANT messages
+
+    The transport can hand over data in chunks of any size. Incomplete frames
+    are held in an internal buffer until the rest of them arrives, anything
+    between frames is skipped by resyncing on MESSAGE_TX_SYNC, and frames with
+    an invalid checksum are dropped.
+    """
+
+    def __init__(self, onFrame=None, maxLength: int = 64):
+        """
+        :param onFrame: optional callable receiving every complete raw frame
+                        (bytes), including the ones failing the checksum
+        :param maxLength: largest content length accepted, anything above is
+                          treated as a false sync byte
+        """
+        self._buffer = bytearray()
+        self._onFrame = onFrame
+        self._maxLength = maxLength
+
+    def __len__(self):
+        """ Number of buffered bytes not yet consumed as a frame """
+        return len(self._buffer)
+
+    def clear(self) -> None:
+        self._buffer.clear()
+
+    def feed(self, data: bytes, timestamp: float = None) -> list:
+        """
+        Append a chunk of data and parse every frame that is now complete
+
+        :param data: raw bytes as returned by the transport
+        :param timestamp: reception time of the chunk, given to every message
+                          completed by it
+        :return: list of checksum-verified messages, in arrival order
+        """
+        buf = self._buffer
+        buf += data
+        end = len(buf)
+        pos = 0
+        messages = []
+        # frames are copied out of the buffer once, through a view released
+        # before the buffer is resized
+        with memoryview(buf) as view:
+            while True:
+                start = buf.find(MESSAGE_TX_SYNC, pos)
+                if start < 0:
+                    pos = end
+                    break
+                if end - start < 2:
+                    pos = start
+                    break
+                length = buf[start + 1]
+                if length > self._maxLength:
+                    pos = start + 1
+                    continue
+                frameEnd = start + length + FRAME_OVERHEAD
+                if frameEnd > end:
+                    pos = start
+                    break
+
+                frame = bytes(view[start:frameEnd])
+                if self._onFrame is not None:
+                    self._onFrame(frame)
+
+                # XOR over the whole frame including the checksum byte is 0
+                if reduce(xor, frame) == 0:
+                    # content is a view into the frame, not another copy
+                    msg = Message(frame[2], memoryview(frame)[3:-1])
+                    msg.timestamp = timestamp
+                    messages.append(msg)
+                    pos = frameEnd
+                else:
+                    pos = start + 1
+
+        if pos:
+            del buf[:pos]
+        return messages
@@ -1,69 +1,303 @@
+import mmap
+import os
+import sys
 import time
-from queue import Queue
-from struct import unpack, error
+from array import array
+from bisect import bisect_left
+from itertools import islice
+from queue import Empty
+from struct import Struct
 from threading import Thread, Event
 
-from libAnt.drivers.driver import Driver
+from libAnt.drivers.buffer import ChunkBuffer
+from libAnt.drivers.driver import Driver, DriverException
 from libAnt.loggers.logger import Logger
 
+PCAP_GLOBAL_HEADER_LENGTH = 24
+_packet_header = Struct('<IIII')
+
+# Sidecar index: magic, version, size and mtime of the capture, packet count,
+# followed by the offset, length and timestamp arrays (little endian)
+INDEX_MAGIC = b'LAPI'
+INDEX_VERSION = 1
+_index_header = Struct('<4sBxxxQqQ')
+
+
+class PcapReader:
+    """
+    Random access to a pcap capture
+
+    The file is memory-mapped and the offset, length and timestamp of every
+    packet are indexed in one pass when it is opened. With cacheIndex the
+    index is saved to <capture>.idx, next to the capture or in indexDir, and
+    reused as long as the capture does not change. Packets are returned as (timestamp, data)
+    where data is a memoryview into the mapping: no copy is made, and the
+    views must not be used after the reader is closed.
+    """
+
+    def __init__(self, pcap: str, cacheIndex: bool = False, indexDir: str = None):
+        self._pcap = pcap
+        self._cacheIndex = cacheIndex
+        self._indexDir = indexDir
+        self._file = None
+        self._map = None
+        self._view = None
+        self._pos = 0
+        self.offsets = array('q')
+        self.lengths = array('I')
+        self.timestamps = array('d')
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __iter__(self):
+        """ Packets from the current position to the end """
+        while self._pos < len(self.offsets):
+            packet = self[self._pos]
+            self._pos += 1
+            yield packet
+
+    def __getitem__(self, i: int) -> tuple:
+        offset = self.offsets[i]
+        return self.timestamps[i], self._view[offset:offset + self.lengths[i]]
+
+    @property
+    def view(self) -> memoryview:
+        """ The whole capture, valid until the reader is closed """
+        return self._view
+
+    @property
+    def indexFile(self) -> str:
+        if self._indexDir is None:
+            return self._pcap + '.idx'
+        return os.path.join(self._indexDir, os.path.basename(self._pcap) + '.idx')
+
+    @property
+    def startTime(self):
+        return self.timestamps[0] if self.timestamps else None
+
+    @property
+    def endTime(self):
+        return self.timestamps[-1] if self.timestamps else None
+
+    def open(self) -> None:
+        if self._file is not None:
+            self.close()
+        self._file = open(self._pcap, 'rb')
+        stat = os.fstat(self._file.fileno())
+        if stat.st_size > PCAP_GLOBAL_HEADER_LENGTH:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._map)
+        else:
+            self._view = memoryview(b'')
+        self._pos = 0
+        if not (self._cacheIndex and self._loadIndex(stat)):
+            self._buildIndex()
+            if self._cacheIndex:
+                self._saveIndex(stat)
+
+    def close(self) -> None:
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # views handed out are still alive, the mapping goes with them
+                pass
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def tell(self) -> int:
+        """ Index of the next packet returned by iteration """
+        return self._pos
+
+    def seek(self, timestamp: float) -> int:
+        """
+        Move to the first packet captured at or after timestamp
+
+        :return: index of that packet, len(self) if there is none
+        """
+        self._pos = bisect_left(self.timestamps, timestamp)
+        return self._pos
+
+    def slice(self, start: float = None, end: float = None):
+        """
+        Packets captured within [start, end), either bound may be None
+
+        :return: generator of (timestamp, data) tuples
+        """
+        first = bisect_left(self.timestamps, start) if start is not None else 0
+        last = bisect_left(self.timestamps, end) if end is not None else len(self.timestamps)
+        for i in range(first, last):
+            yield self[i]
+
+    def _buildIndex(self) -> None:
+        view = self._view
+        unpack_from = _packet_header.unpack_from
+        headerSize = _packet_header.size
+        offsets, lengths, timestamps = array('q'), array('I'), array('d')
+        pos = PCAP_GLOBAL_HEADER_LENGTH
+        end = len(view)
+        while pos + headerSize <= end:
+            ts_sec, ts_usec, incl_len, _ = unpack_from(view, pos)
+            pos += headerSize
+            if pos + incl_len > end:
+                # truncated last packet
+                break
+            offsets.append(pos)
+            lengths.append(incl_len)
+            timestamps.append(ts_sec + ts_usec / 1000000)
+            pos += incl_len
+        self.offsets, self.lengths, self.timestamps = offsets, lengths, timestamps
+
+    def _loadIndex(self, stat) -> bool:
+        try:
+            with open(self.indexFile, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return False
+        if len(data) < _index_header.size:
+            return False
+        magic, version, size, mtime, count = _index_header.unpack_from(data)
+        if (magic, version, size, mtime) != (INDEX_MAGIC, INDEX_VERSION, stat.st_size, stat.st_mtime_ns):
+            return False
+        columns = []
+        pos = _index_header.size
+        for typecode in ('q', 'I', 'd'):
+            column = array(typecode)
+            length = count * column.itemsize
+            if len(data) < pos + length:
+                return False
+            column.frombytes(data[pos:pos + length])
+            if sys.byteorder != 'little':
+                column.byteswap()
+            columns.append(column)
+            pos += length
+        self.offsets, self.lengths, self.timestamps = columns
+        return True
+
+    def _saveIndex(self, stat) -> None:
+        header = _index_header.pack(INDEX_MAGIC, INDEX_VERSION, stat.st_size, stat.st_mtime_ns, len(self.offsets))
+        try:
+            with open(self.indexFile, 'wb') as f:
+                f.write(header)
+                for column in (self.offsets, self.lengths, self.timestamps):
+                    if sys.byteorder != 'little':
+                        column = array(column.typecode, column)
+                        column.byteswap()
+                    f.write(column.tobytes())
+        except OSError:
+            # a read-only location only costs rebuilding the index next time
+            pass
+
 
 class PcapDriver(Driver):
-    def __init__(self, pcap : str, logger: Logger = None):
+    """
+    Replays a capture written by PcapLogger
+
+    Every message read carries the original capture time in its timestamp.
+    The replay speed is set with speed: 1 replays in real time, N replays N
+    times faster than real time and None (or REPLAY_MAX) delivers the packets
+    as fast as they are consumed, without sleeping. start and end limit the
+    replay to the packets captured within [start, end).
+    """
+
+    REPLAY_REALTIME = 1.0
+    REPLAY_MAX = None
+
+    # Packets read ahead of the consumer in max mode
+    maxPending = 10000
+    # Packets handed to the buffer at once in max mode
+    batchSize = 1000
+
+    def __init__(self, pcap: str, logger: Logger = None, speed: float = REPLAY_REALTIME,
+                 start: float = None, end: float = None, cacheIndex: bool = False, indexDir: str = None):
         super().__init__(logger=logger)
+        if speed is not None and speed <= 0:
+            raise ValueError('speed must be positive, or None for max')
         self._isopen = False
         self._pcap = pcap
-        self._buffer = Queue()
+        self._speed = speed
+        self._start = start
+        self._end = end
+        self._cacheIndex = cacheIndex
+        self._indexDir = indexDir
+        self._buffer = ChunkBuffer()
+        # (capture time, data) of the packets _read took more of than needed
+        self._leftover = []
 
         self._loop = None
 
     class PcapLoop(Thread):
-        def __init__(self, pcap, buffer: Queue):
+        def __init__(self, driver):
             super().__init__()
             self._stopper = Event()
-            self._pcap = pcap
-            self._buffer = buffer
+            self._driver = driver
+            self._buffer = driver._buffer
 
         def stop(self) -> None:
             self._stopper.set()
 
         def run(self) -> None:
-            self._pcapfile = open(self._pcap, 'rb')
-            # move file pointer to first packet header
-            global_header_length = 24
-            self._pcapfile.seek(global_header_length, 0)
+            d = self._driver
+            with d._openReader() as reader:
+                packets = reader.slice(d._start, d._end)
+                if d._speed is None:
+                    self._replayMax(packets, d.batchSize, d.maxPending)
+                else:
+                    self._replayTimed(packets, d._speed)
 
-            first_ts = 0
-            start_time = time.time()
+        def _replayMax(self, packets, batchSize, maxPending) -> None:
             while not self._stopper.is_set():
-                try:
-                    ts_sec, = unpack('i', self._pcapfile.read(4))
-                except error:
-                    break
-                ts_usec = unpack('i', self._pcapfile.read(4))[0] / 1000000
-
-                if first_ts is 0:
-                    first_ts = ts_sec + ts_usec
+                batch = list(islice(packets, batchSize))
+                if not batch:
+                    return
+                # backpressure: do not read the whole file ahead of the consumer
+                while not self._buffer.waitBelow(maxPending, timeout=0.1):
+                    if self._stopper.is_set():
+                        return
+                self._buffer.putMany(batch)
 
-                ts = ts_sec + ts_usec
-                send_time = ts - first_ts
-                elapsed_time = time.time() - start_time
-                if send_time > (elapsed_time):
-                    sleep_time = send_time - elapsed_time
-                    time.sleep(sleep_time)
+        def _replayTimed(self, packets, speed) -> None:
+            first_ts = None
+            start_time = time.monotonic()
+            for ts, data in packets:
+                if first_ts is None:
+                    first_ts = ts
+                send_time = (ts - first_ts) / speed
+                sleep_time = send_time - (time.monotonic() - start_time)
+                if sleep_time > 0 and self._stopper.wait(sleep_time):
+                    return
+                if self._stopper.is_set():
+                    return
+                self._buffer.put((ts, data))
 
-                packet_length = unpack('i', self._pcapfile.read(4))[0]
-                self._pcapfile.seek(4, 1)
-                for i in range(packet_length):
-                    self._buffer.put(self._pcapfile.read(1))
+    def _openReader(self):
+        return PcapReader(self._pcap, cacheIndex=self._cacheIndex, indexDir=self._indexDir)
 
-            self._pcapfile.close()
+    def isFinished(self) -> bool:
+        """ Whether every packet of the capture has been replayed and read """
+        return self._loop is not None and not self._loop.is_alive() and not self._buffer
 
     def _isOpen(self) -> bool:
         return self._isopen
 
     def _open(self) -> None:
         self._isopen = True
-        self._loop = self.PcapLoop(self._pcap, self._buffer)
+        self._buffer.clear()
+        self._leftover = []
+        self._loop = self.PcapLoop(self)
         self._loop.start()
 
     def _close(self) -> None:
@@ -74,13 +308,59 @@ class PcapDriver(Driver):
                 self._loop.join()
         self._loop = None
 
+    def _readFrames(self, timeout=None) -> list:
+        # packets are framed one by one so every message gets the capture
+        # time of the packet it was logged in
+        if not self._isOpen():
+            raise DriverException("Device is closed")
+
+        while True:
+            try:
+                packets = self._readStamped(timeout=timeout)
+            except Empty:
+                return []
+            msgs = []
+            for ts, data in packets:
+                msgs.extend(self._framer.feed(data, ts))
+            if msgs:
+                return msgs
+
     def _read(self, count: int, timeout=None) -> bytes:
+        packets = []
+        size = 0
+        try:
+            while size < count:
+                for ts, data in self._readStamped(timeout=timeout):
+                    packets.append((ts, data))
+                    size += len(data)
+        except Empty:
+            self._leftover = packets
+            raise
         result = bytearray()
+        leftover = []
+        for ts, data in packets:
+            taken = min(len(data), count - len(result))
+            result += data[:taken]
+            if taken < len(data):
+                leftover.append((ts, bytes(data[taken:])))
+        self._leftover = leftover
+        return bytes(result)
 
-        while len(result) < count:
-            result += self._buffer.get(block=True, timeout=timeout)
+    def _readChunk(self, timeout=None) -> bytes:
+        return b''.join(data for _, data in self._readStamped(timeout=timeout))
 
-        return bytes(result)
+    def _readStamped(self, timeout=None) -> list:
+        if self._leftover:
+            packets, self._leftover = self._leftover, []
+            return packets
+        return self._buffer.getMany(timeout=timeout)
+
+    def _watch(self, callback) -> bool:
+        self._buffer.setListener(callback)
+        return True
 
     def _write(self, data: bytes) -> None:
         pass
+
+    def _abort(self) -> None:
+        pass
@@ -1,8 +1,7 @@
-from queue import Queue
-from threading import Thread, Event
+from queue import Empty
 
 from serial import Serial
-from serial import SerialTimeoutException, SerialException
+from serial import SerialException
 
 from libAnt.drivers.driver import Driver, DriverException
 from libAnt.loggers.logger import Logger
@@ -11,43 +10,104 @@ from libAnt.loggers.logger import Logger
 class SerialDriver(Driver):
     """
     An implementation of a serial ANT+ device driver
+
+    Reads never block longer than the timeout they are given, and take every
+    byte the port has received so far rather than the exact count needed.
     """
 
-    def __init__(self, device: str, baudRate: int = 115200, logger: Logger = None):
+    def __init__(self, device: str, baudRate: int = 115200, logger: Logger = None,
+                 rtscts: bool = False, writeTimeout: float = 1.0, lowLatency: bool = False):
+        """
+        :param baudRate: any rate the module and the port support, e.g.
+                         57600, 115200 or higher rates such as 460800
+        :param rtscts: enable RTS/CTS hardware flow control
+        :param writeTimeout: seconds a write may block, e.g. while CTS is
+                             deasserted, None to wait forever
+        :param lowLatency: ask the port to hand received bytes over as soon
+                           as they arrive (Linux, USB-serial adapters)
+        """
         super().__init__(logger=logger)
         self._device = device
         self._baudRate = baudRate
+        self._rtscts = rtscts
+        self._writeTimeout = writeTimeout
+        self._lowLatency = lowLatency
         self._serial = None
+        # read timeout the port is set to, changing it reconfigures the port
+        self._timeout = None
+        self._leftover = b''
 
     def __str__(self):
         if self.isOpen():
             return self._device + " @ " + str(self._baudRate)
-        return None
+        return "Closed"
 
     def _isOpen(self) -> bool:
         return self._serial is not None
 
     def _open(self) -> None:
         try:
-            self._serial = Serial(port=self._device, baudrate=self._baudRate)
-        except SerialException as e:
+            self._serial = Serial(port=self._device, baudrate=self._baudRate, timeout=self._timeout,
+                                  write_timeout=self._writeTimeout, rtscts=self._rtscts)
+        except (SerialException, ValueError) as e:
             raise DriverException(str(e))
 
         if not self._serial.isOpen():
             raise DriverException("Could not open specified device")
+        if self._lowLatency:
+            try:
+                self._serial.set_low_latency_mode(True)
+            except (AttributeError, NotImplementedError, ValueError, OSError):
+                pass  # not supported by this port or platform
+        self._leftover = b''
 
     def _close(self) -> None:
-        self._serial.close()
-        self._serial = None
+        if self._serial is not None:
+            self._serial.close()
+            self._serial = None
+
+    def _setTimeout(self, timeout) -> None:
+        if timeout != self._timeout:
+            self._serial.timeout = timeout
+            self._timeout = timeout
 
     def _read(self, count: int, timeout=None) -> bytes:
-        return self._serial.read(count)
+        data = bytearray()
+        try:
+            while len(data) < count:
+                data += self._readChunk(timeout=timeout)
+        except Empty:
+            self._leftover = bytes(data)
+            raise
+        self._leftover = bytes(data[count:])
+        return bytes(data[:count])
+
+    def _readChunk(self, timeout=None) -> bytes:
+        if self._leftover:
+            data, self._leftover = self._leftover, b''
+            return data
+        try:
+            self._setTimeout(timeout)
+            waiting = self._serial.in_waiting
+            # nothing received yet: wait up to timeout for the first byte
+            data = self._serial.read(waiting or 1)
+            if not data:
+                raise Empty
+            if not waiting:
+                # and take whatever came in with it
+                waiting = self._serial.in_waiting
+                if waiting:
+                    data += self._serial.read(waiting)
+        except (SerialException, OSError) as e:
+            raise DriverException(str(e))
+        return data
 
     def _write(self, data: bytes) -> None:
         try:
             self._serial.write(data)
             self._serial.flush()
-        except SerialTimeoutException as e:
+        except (SerialException, OSError) as e:
+            # SerialTimeoutException included, or the device went away
             raise DriverException(str(e))
 
     def _abort(self) -> None:
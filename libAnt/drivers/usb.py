@@ -1,39 +1,185 @@
-from queue import Queue
-from threading import Event, Thread
-
-from usb import USBError, ENDPOINT_OUT, ENDPOINT_IN
-from usb.control import get_interface
-import usb.backend.libusb0 as libusb0
-from usb.core import find
-from usb.util import (find_descriptor, endpoint_direction, claim_interface,
-                      dispose_resources, get_string)
+from queue import Empty
+from threading import Event, Thread, Lock
+from weakref import WeakValueDictionary
 
+import libAnt.constants as c
+from libAnt.drivers.buffer import ChunkBuffer
 from libAnt.drivers.driver import Driver, DriverException
 from libAnt.loggers.logger import Logger
 
+# pyusb is imported on first use, importing libAnt does not need it
+_usb = None
+_backend = None
+_cacheLock = Lock()
+# Devices of the last enumeration, by (vid, pid, bus, address)
+_devices = {}
+# Descriptors of the devices opened so far, by _location()
+_descriptors = {}
+# USBDriver bound to each device, by _location()
+_bound = WeakValueDictionary()
+
+
+def _pyusb():
+    """ :return: the usb package, with the modules the driver uses imported """
+    global _usb
+    if _usb is None:
+        import usb.core
+        import usb.util
+        import usb.control
+        import usb.backend.libusb0
+        _usb = usb
+    return _usb
+
+
+def _getBackend():
+    global _backend
+    if _backend is None:
+        _backend = _pyusb().backend.libusb0.get_backend()
+    return _backend
+
+
+def _ports(dev):
+    """ :return: bus and port path of the device, None if the backend does not report ports (libusb0) """
+    ports = getattr(dev, 'port_numbers', None)
+    return (dev.bus, tuple(ports)) if ports else None
+
+
+def _serial(dev):
+    """ :return: serial number string of the device, None if it has none or it can not be read """
+    if not dev.iSerialNumber:
+        return None
+    usb = _pyusb()
+    try:
+        return usb.util.get_string(dev, dev.iSerialNumber)
+    except (usb.core.USBError, ValueError, NotImplementedError):
+        return None
+
+
+def _location(dev) -> tuple:
+    """
+    Key of the device as enumerated: bus and port path, or bus and address
+    with backends which do not report ports
+    """
+    return dev.idVendor, dev.idProduct, _ports(dev) or (dev.bus, dev.address)
+
+
+def find_devices(vid=c.USB_VENDOR_ID, pids=c.USB_PRODUCT_IDS) -> list:
+    """
+    Enumerate the connected ANT sticks
+
+    The devices found are kept, a USBDriver created for one of them does not
+    search the bus again.
+
+    :return: (vid, pid, bus, address) of every matching device, ready to be
+             passed to USBDriver
+    """
+    usb = _pyusb()
+    backend = _getBackend()
+    found = []
+    with _cacheLock:
+        for pid in pids:
+            for dev in usb.core.find(find_all=True, backend=backend, idVendor=vid, idProduct=pid):
+                key = (vid, pid, dev.bus, dev.address)
+                _devices[key] = dev
+                found.append(key)
+    return found
+
+
+class _Descriptors:
+    """ What opening a device needs from its descriptors, looked up once per device """
+
+    __slots__ = ('product', 'configuration', 'interfaceNumber', 'epOut', 'epIn', 'packetSize')
+
+    def __init__(self, dev):
+        usb = _pyusb()
+        self.product = usb.util.get_string(dev, dev.iProduct)
+        # set the active configuration. With no arguments, the first
+        # configuration will be the active one
+        try:
+            cfg = dev.get_active_configuration()
+        except usb.core.USBError:
+            cfg = None
+        if cfg is None:
+            dev.set_configuration()
+            cfg = dev.get_active_configuration()
+        self.configuration = cfg.bConfigurationValue
+        self.interfaceNumber = cfg[(0, 0)].bInterfaceNumber
+        interface = usb.util.find_descriptor(cfg, bInterfaceNumber=self.interfaceNumber,
+                                             bAlternateSetting=usb.control.get_interface(dev,
+                                                                                         self.interfaceNumber))
+        epOut = usb.util.find_descriptor(interface, custom_match=lambda e: usb.util.endpoint_direction(
+            e.bEndpointAddress) == usb.util.ENDPOINT_OUT)
+        epIn = usb.util.find_descriptor(interface, custom_match=lambda e: usb.util.endpoint_direction(
+            e.bEndpointAddress) == usb.util.ENDPOINT_IN)
+        if epOut is None or epIn is None:
+            raise DriverException("Could not initialize USB endpoint")
+        self.epOut = epOut.bEndpointAddress
+        self.epIn = epIn.bEndpointAddress
+        self.packetSize = epIn.wMaxPacketSize
+
+
+def _describe(dev) -> _Descriptors:
+    key = _location(dev)
+    with _cacheLock:
+        descriptors = _descriptors.get(key)
+    if descriptors is None:
+        descriptors = _Descriptors(dev)
+        with _cacheLock:
+            _descriptors[key] = descriptors
+    return descriptors
+
+
+def _forget(dev) -> None:
+    """ Drop what is known about a device which went away """
+    key = _location(dev)
+    with _cacheLock:
+        _descriptors.pop(key, None)
+        for found in [k for k, d in _devices.items() if d is dev]:
+            del _devices[found]
+
 
 class USBDriver(Driver):
     """
     An implementation of a USB ANT+ device driver
+
+    Binds to the first device matching vid and pid, or with bus and address
+    to that device, e.g. one of those listed by find_devices(). Once found,
+    reopening binds to the same physical device: if it was replugged, it is
+    looked up again by its port, or by its serial number with backends which
+    do not report ports (libusb0). A device with neither is swapped for any
+    matching device no other driver is bound to. Its descriptors are looked
+    up on the first open only, and shared by every driver of the process.
     """
 
-    def __init__(self, vid, pid, logger=None):
+    def __init__(self, vid, pid, bus=None, address=None, logger=None):
         super().__init__(logger=logger)
         self._idVendor = vid
         self._idProduct = pid
+        match = {}
+        if bus is not None:
+            match['bus'] = bus
+        if address is not None:
+            match['address'] = address
         self._dev = None
         self._epOut = None
         self._epIn = None
         self._interfaceNumber = None
         self._packetSize = 0x20
-        self._queue = None
+        self._buffer = None
+        self._leftover = b''
         self._loop = None
         self._driver_open = False
-        libusb0_backend = libusb0.get_backend()
-        self._dev = find(backend=libusb0_backend,
-                         idVendor=self._idVendor, idProduct=self._idProduct)
+        with _cacheLock:
+            self._dev = _devices.get((vid, pid, bus, address))
+        if self._dev is None:
+            self._dev = self._find(match)
         if self._dev is None:
             raise DriverException("Could not open specified device")
+        # bind to this very device from now on
+        self._ports = _ports(self._dev)
+        self._serial = _serial(self._dev)
+        with _cacheLock:
+            _bound[_location(self._dev)] = self
 
     def __str__(self):
         if self.isOpen():
@@ -41,28 +187,61 @@ class USBDriver(Driver):
         return "Closed"
 
     class USBLoop(Thread):
-        def __init__(self, ep, packetSize: int, queue: Queue):
+        def __init__(self, read, packetSize: int, buffer: ChunkBuffer):
+            """
+            :param read: callable reading up to size bytes from the IN endpoint
+            """
             super().__init__()
             self._stopper = Event()
-            self._ep = ep
+            self._read = read
             self._packetSize = packetSize
-            self._queue = queue
+            self._buffer = buffer
 
         def stop(self) -> None:
             self._stopper.set()
 
         def run(self) -> None:
+            USBError = _pyusb().core.USBError
             while not self._stopper.is_set():
                 try:
-                    data = self._ep.read(self._packetSize, timeout=1000)
-                    for d in data:
-                        self._queue.put(d)
+                    data = self._read(self._packetSize, timeout=1000)
+                    if len(data):
+                        self._buffer.put(memoryview(data))
                 except USBError as e:
                     if e.errno not in (60, 110) and e.backend_error_code != -116:  # Timout errors
                         print(e)
                         self._stopper.set()
-            # We Put in an invalid byte so threads will realize the device is stopped
-            self._queue.put(None)
+            # We Put in an invalid chunk so threads will realize the device is stopped
+            self._buffer.put(None)
+
+    def _find(self, match: dict):
+        # find the first USB device that matches the filter
+        return _pyusb().core.find(backend=_getBackend(),
+                                  idVendor=self._idVendor, idProduct=self._idProduct, **match)
+
+    def _relocate(self) -> None:
+        """ Look the device up again, e.g. once replugged under a new address """
+        self._dev = None
+        with _cacheLock:
+            for key in [k for k, driver in _bound.items() if driver is self]:
+                del _bound[key]
+        devices = list(_pyusb().core.find(find_all=True, backend=_getBackend(),
+                                          idVendor=self._idVendor, idProduct=self._idProduct))
+        serials = {}
+        if self._ports is None and self._serial is not None:
+            serials = {id(dev): _serial(dev) for dev in devices}
+        with _cacheLock:
+            free = [dev for dev in devices if _bound.get(_location(dev)) is None]
+            if self._ports is not None:
+                found = [dev for dev in free if _ports(dev) == self._ports]
+            elif self._serial is not None:
+                found = [dev for dev in free if serials[id(dev)] == self._serial]
+            else:
+                found = free
+            if not found:
+                raise DriverException("Could not open specified device")
+            self._dev = found[0]
+            _bound[_location(self._dev)] = self
 
     def _isOpen(self) -> bool:
         return self._driver_open
@@ -70,57 +249,25 @@ class USBDriver(Driver):
     def _open(self) -> None:
         if not self._gui_logger:
             print('USB OPEN START')
+        usb = _pyusb()
         try:
-            # find the first USB device that matches the filter
-            libusb0_backend = libusb0.get_backend()
-            self._dev = find(backend=libusb0_backend,
-                             idVendor=self._idVendor, idProduct=self._idProduct)
-
             if self._dev is None:
-                raise DriverException("Could not open specified device")
-            else:
-                self._dev._product = get_string(self._dev, self._dev.iProduct)
+                self._relocate()
 
-            # Detach kernel driver
-            try:
-                if self._dev.is_kernel_driver_active(0):
-                    try:
-                        self._dev.detach_kernel_driver(0)
-                    except USBError:
-                        raise DriverException("Could not detach kernel driver")
-            except NotImplementedError:
-                pass  # for non unix systems
-
-# TODO: I think this is our problem between sessions
-            # set the active configuration. With no arguments, the first
-            # configuration will be the active one
-            self._dev.set_configuration()
-
-            # get an endpoint instance
             try:
-                cfg = self._dev.get_active_configuration()
-            except USBError:
-                cfg = None
-            # print(cfg)
-            # if cfg is None or cfg.bConfigurationValue
-            self._interfaceNumber = cfg[(0, 0)].bInterfaceNumber
-            interface = find_descriptor(cfg, bInterfaceNumber=self._interfaceNumber,
-                                        bAlternateSetting=get_interface(self._dev,
-                                                                        self._interfaceNumber))
-            claim_interface(self._dev, self._interfaceNumber)
-
-            self._epOut = find_descriptor(interface, custom_match=lambda e: endpoint_direction(
-                e.bEndpointAddress) == ENDPOINT_OUT)
-
-            self._epIn = find_descriptor(interface, custom_match=lambda e: endpoint_direction(
-                e.bEndpointAddress) == ENDPOINT_IN)
-
-            if self._epOut is None or self._epIn is None:
-                raise DriverException("Could not initialize USB endpoint")
-
-            self._queue = Queue()
+                self._claim()
+            except usb.core.USBError:
+                # The device went away since it was found, e.g. unplugged and
+                # plugged back: look it up again
+                _forget(self._dev)
+                self._relocate()
+                self._claim()
+
+            self._buffer = ChunkBuffer()
+            self._leftover = b''
             self._loop = self.USBLoop(
-                self._epIn, self._packetSize, self._queue)
+                lambda size, timeout: self._dev.read(self._epIn, size, timeout=timeout),
+                self._packetSize, self._buffer)
             self._loop.start()
             self._driver_open = True
             if self._gui_logger:
@@ -131,6 +278,36 @@ class USBDriver(Driver):
             self._close()
             raise DriverException(str(e))
 
+    def _claim(self) -> None:
+        usb = _pyusb()
+        descriptors = _describe(self._dev)
+        self._dev._product = descriptors.product
+
+        # Detach kernel driver
+        try:
+            if self._dev.is_kernel_driver_active(0):
+                try:
+                    self._dev.detach_kernel_driver(0)
+                except usb.core.USBError:
+                    raise DriverException("Could not detach kernel driver")
+        except NotImplementedError:
+            pass  # for non unix systems
+
+        # Setting the configuration again resets the device, only do it when
+        # it is not the active one
+        try:
+            active = self._dev.get_active_configuration().bConfigurationValue
+        except usb.core.USBError:
+            active = None
+        if active != descriptors.configuration:
+            self._dev.set_configuration(descriptors.configuration)
+
+        self._interfaceNumber = descriptors.interfaceNumber
+        usb.util.claim_interface(self._dev, self._interfaceNumber)
+        self._epOut = descriptors.epOut
+        self._epIn = descriptors.epIn
+        self._packetSize = descriptors.packetSize
+
     def _close(self) -> None:
         if not self._gui_logger:
             print('USB CLOSE START')
@@ -139,13 +316,19 @@ class USBDriver(Driver):
                 self._loop.stop()
                 self._loop.join()
         self._loop = None
-        try:
-            self._dev.reset()
-            dispose_resources(self._dev)
-        except Exception as e:
-            print(e)
-            pass
-        self._dev = self._epOut = self._epIn = None
+        if self._dev is not None:
+            # Release the device without resetting it, a reset would make it
+            # enumerate again. The next open reuses it, or looks it up again
+            # if it went away.
+            usb = _pyusb()
+            try:
+                if self._interfaceNumber is not None:
+                    usb.util.release_interface(self._dev, self._interfaceNumber)
+                usb.util.dispose_resources(self._dev)
+            except Exception as e:
+                print(e)
+                pass
+        self._epOut = self._epIn = None
         self._driver_open = False
         if self._gui_logger:
             self._gui_logger.info('ANT+ Device USB Loop Terminated')
@@ -154,19 +337,34 @@ class USBDriver(Driver):
 
     def _read(self, count: int, timeout=None) -> bytes:
         data = bytearray()
-        for i in range(0, count):
-            b = self._queue.get(timeout=timeout)
-            if b is None:
-                print("Closing due to failed read")
-                self._close()
-                raise DriverException("Device is closed!")
-            data.append(b)
-        return bytes(data)
+        try:
+            while len(data) < count:
+                data += self._readChunk(timeout=timeout)
+        except Empty:
+            self._leftover = bytes(data)
+            raise
+        self._leftover = bytes(data[count:])
+        return bytes(data[:count])
+
+    def _readChunk(self, timeout=None) -> bytes:
+        if self._leftover:
+            data, self._leftover = self._leftover, b''
+            return data
+        data = self._buffer.get(timeout=timeout)
+        if data is None:
+            print("Closing due to failed read")
+            self._close()
+            raise DriverException("Device is closed!")
+        return data
+
+    def _watch(self, callback) -> bool:
+        self._buffer.setListener(callback)
+        return True
 
     def _write(self, data: bytes) -> None:
         # Diagnostic Print Statement to verify backend
         # print(f'Data written to USB endpoint: {data}')
-        return self._epOut.write(data)
+        return self._dev.write(self._epOut, data)
 
     def _abort(self) -> None:
         pass  # not implemented for USB driver, use timeouts instead
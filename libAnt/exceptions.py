@@ -103,3 +103,8 @@ class InvalidNetworkNumber(Exception):
 class SerialQueueOverflow(Exception):
     def init(self):
         pass
+
+
+class NoChannelAvailable(Exception):
+    def __init__(self, message="Every channel of every device is in use"):
+        super().__init__(message)
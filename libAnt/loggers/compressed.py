@@ -0,0 +1,354 @@
+"""
+Compact block-compressed capture format
+
+Frames are grouped into blocks compressed with zlib or lzma. Inside a block
+every frame is stored as the varint delta of its timestamp (microseconds)
+from the previous frame, its varint length and the frame itself, which
+takes a few bytes instead of the 16 byte pcap packet header.
+
+File layout:
+    header  magic, version, codec
+    blocks  header (compressed size, frame count, first and last timestamp)
+            followed by the compressed frames
+    index   one entry per block (offset, first and last timestamp, count)
+    footer  offset of the index, number of entries, magic
+
+The index is only written when the file is closed. A file left without one
+(e.g. after a crash) is still readable, the blocks are then scanned.
+
+Timestamps never decrease through a file: where the capture clock stepped
+back, frames are stored with the timestamp of the frame before them, and
+block headers and index entries hold those same stored values.
+"""
+import lzma
+import zlib
+from bisect import bisect_left
+from struct import Struct, error
+
+from libAnt.drivers.pcap import PcapReader
+from libAnt.loggers.logger import Logger
+from libAnt.loggers.pcap import pcap_global_header, _packet_header as _pcap_packet_header
+
+MAGIC = b'LACZ'
+INDEX_MAGIC = b'LACI'
+VERSION = 1
+
+CODEC_ZLIB = 0
+CODEC_LZMA = 1
+CODECS = {
+    'zlib': CODEC_ZLIB,
+    'lzma': CODEC_LZMA,
+}
+
+_file_header = Struct('<4sBBxx')
+_block_header = Struct('<IIqq')
+_index_entry = Struct('<QqqI')
+_footer = Struct('<QI4s')
+# frame record handed from log() to the writer thread: timestamp (us), frame
+_record = Struct('<q')
+
+
+def _compress(codec: int, data: bytes) -> bytes:
+    if codec == CODEC_LZMA:
+        return lzma.compress(data)
+    return zlib.compress(data)
+
+
+def _decompress(codec: int, data: bytes) -> bytes:
+    if codec == CODEC_LZMA:
+        return lzma.decompress(data)
+    return zlib.decompress(data)
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _readVarint(data, pos: int) -> tuple:
+    value = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        value |= (b & 0x7F) << shift
+        if b < 0x80:
+            return value, pos
+        shift += 7
+
+
+def encodeBlock(records) -> bytes:
+    """
+    :param records: list of (timestamp in microseconds, frame)
+    :return: uncompressed block payload
+    """
+    out = bytearray()
+    previous = records[0][0]
+    for ts, frame in records:
+        # the clock may step back, clamp rather than store negative deltas
+        delta = max(0, ts - previous)
+        previous += delta
+        out += _varint(delta)
+        out += _varint(len(frame))
+        out += frame
+    return bytes(out)
+
+
+def decodeBlock(payload: bytes, first: int) -> list:
+    """
+    :return: list of (timestamp in seconds, memoryview of the frame)
+    """
+    view = memoryview(payload)
+    frames = []
+    ts = first
+    pos = 0
+    end = len(payload)
+    while pos < end:
+        delta, pos = _readVarint(payload, pos)
+        length, pos = _readVarint(payload, pos)
+        ts += delta
+        frames.append((ts / 1000000, view[pos:pos + length]))
+        pos += length
+    return frames
+
+
+class CompressedLogger(Logger):
+    """
+    Logger writing the block-compressed format
+
+    Frames are compressed once blockSize bytes of them are pending, and when
+    the file is closed or rotated. maxBytes rotation counts uncompressed bytes.
+    """
+
+    def __init__(self, logFile: str, codec: str = 'zlib', blockSize: int = 256 * 1024, **kwargs):
+        """
+        :param codec: 'zlib' or 'lzma'
+        :param blockSize: uncompressed bytes of frames per block
+        :param kwargs: Logger options (batchSize, flushInterval, rotation...)
+        """
+        super().__init__(logFile, **kwargs)
+        self._codec = CODECS[codec]
+        self._blockSize = blockSize
+        self._records = []
+        self._recordBytes = 0
+        self._index = []
+
+    def onOpen(self):
+        self._log.write(_file_header.pack(MAGIC, VERSION, self._codec))
+        self._index = []
+
+    def beforeClose(self):
+        self._writeBlock()
+        indexOffset = self._log.tell()
+        self._log.write(b''.join(_index_entry.pack(*entry) for entry in self._index))
+        self._log.write(_footer.pack(indexOffset, len(self._index), INDEX_MAGIC))
+
+    def encodeData(self, data):
+        return _record.pack(int(self.timestamp() * 1000000)) + bytes(data)
+
+    def writeBatch(self, batch: list):
+        for item in batch:
+            self._records.append((_record.unpack_from(item)[0], item[_record.size:]))
+            self._recordBytes += len(item)
+        if self._recordBytes >= self._blockSize:
+            self._writeBlock()
+
+    def _writeBlock(self):
+        records, self._records = self._records, []
+        self._recordBytes = 0
+        _writeBlock(self._log, self._codec, records, self._index)
+
+
+class CompressedReader:
+    """
+    Random access to a block-compressed capture
+
+    Same interface as PcapReader: iteration, seek(time) and slice(start, end)
+    yield (timestamp, frame) tuples. Only the blocks holding the requested
+    frames are decompressed.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._file = None
+        self._codec = CODEC_ZLIB
+        # (offset, first, last, count) of every block, timestamps in microseconds
+        self._index = []
+        self._lasts = []
+        self._block = None
+        self._pos = (0, 0)
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return sum(entry[3] for entry in self._index)
+
+    def __iter__(self):
+        """ Frames from the current position to the end """
+        block, i = self._pos
+        while block < len(self._index):
+            frames = self._frames(block)
+            while i < len(frames):
+                self._pos = (block, i + 1)
+                yield frames[i]
+                i += 1
+            block, i = block + 1, 0
+            self._pos = (block, 0)
+
+    @property
+    def startTime(self):
+        return self._index[0][1] / 1000000 if self._index else None
+
+    @property
+    def endTime(self):
+        return self._index[-1][2] / 1000000 if self._index else None
+
+    def open(self) -> None:
+        if self._file is not None:
+            self.close()
+        self._file = open(self._path, 'rb')
+        magic, version, self._codec = _file_header.unpack(self._file.read(_file_header.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not a compressed capture: {}'.format(self._path))
+        if not self._readIndex():
+            self._scanIndex()
+        self._lasts = [entry[2] for entry in self._index]
+        self._block = None
+        self._pos = (0, 0)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._block = None
+
+    def seek(self, timestamp: float) -> None:
+        """ Move to the first frame captured at or after timestamp """
+        us = timestamp * 1000000
+        block = bisect_left(self._lasts, us)
+        i = 0
+        if block < len(self._index):
+            i = bisect_left([ts for ts, _ in self._frames(block)], timestamp)
+        self._pos = (block, i)
+
+    def slice(self, start: float = None, end: float = None):
+        """
+        Frames captured within [start, end), either bound may be None
+
+        :return: generator of (timestamp, frame) tuples
+        """
+        if start is not None:
+            self.seek(start)
+        else:
+            self._pos = (0, 0)
+        for ts, frame in self:
+            if end is not None and ts >= end:
+                return
+            yield ts, frame
+
+    def _frames(self, block: int) -> list:
+        if self._block is None or self._block[0] != block:
+            offset, first, _, _ = self._index[block]
+            self._file.seek(offset)
+            size, _, _, _ = _block_header.unpack(self._file.read(_block_header.size))
+            self._block = (block, decodeBlock(_decompress(self._codec, self._file.read(size)), first))
+        return self._block[1]
+
+    def _readIndex(self) -> bool:
+        end = self._file.seek(0, 2)
+        if end < _file_header.size + _footer.size:
+            return False
+        self._file.seek(end - _footer.size)
+        indexOffset, count, magic = _footer.unpack(self._file.read(_footer.size))
+        if magic != INDEX_MAGIC or indexOffset + count * _index_entry.size != end - _footer.size:
+            return False
+        self._file.seek(indexOffset)
+        data = self._file.read(count * _index_entry.size)
+        self._index = [entry for entry in _index_entry.iter_unpack(data)]
+        return True
+
+    def _scanIndex(self) -> None:
+        index = []
+        pos = _file_header.size
+        self._file.seek(pos)
+        while True:
+            header = self._file.read(_block_header.size)
+            try:
+                size, count, first, last = _block_header.unpack(header)
+            except error:
+                break
+            if len(self._file.read(size)) < size:
+                # truncated last block
+                break
+            index.append((pos, first, last, count))
+            pos += _block_header.size + size
+        self._index = index
+
+
+def pcap_to_compressed(src: str, dst: str, codec: str = 'zlib', blockSize: int = 256 * 1024) -> int:
+    """
+    Convert a pcap capture to the compressed format, keeping the timestamps
+
+    :return: number of frames converted
+    """
+    codecId = CODECS[codec]
+    index = []
+    count = 0
+    with PcapReader(src) as reader, open(dst, 'wb') as out:
+        out.write(_file_header.pack(MAGIC, VERSION, codecId))
+        records = []
+        size = 0
+        for ts, frame in reader:
+            records.append((int(round(ts * 1000000)), bytes(frame)))
+            size += len(frame)
+            count += 1
+            if size >= blockSize:
+                _writeBlock(out, codecId, records, index)
+                records, size = [], 0
+        _writeBlock(out, codecId, records, index)
+        indexOffset = out.tell()
+        out.write(b''.join(_index_entry.pack(*entry) for entry in index))
+        out.write(_footer.pack(indexOffset, len(index), INDEX_MAGIC))
+    return count
+
+
+def compressed_to_pcap(src: str, dst: str) -> int:
+    """
+    Convert a compressed capture back to pcap
+
+    :return: number of frames converted
+    """
+    count = 0
+    with CompressedReader(src) as reader, open(dst, 'wb') as out:
+        out.write(pcap_global_header())
+        for ts, frame in reader:
+            us = int(round(ts * 1000000))
+            out.write(_pcap_packet_header.pack(us // 1000000, us % 1000000, len(frame), len(frame)))
+            out.write(frame)
+            count += 1
+    return count
+
+
+def _writeBlock(out, codec: int, records: list, index: list) -> None:
+    if not records:
+        return
+    # clamp to the previous block too, the index is searched by last timestamp
+    previous = index[-1][2] if index else records[0][0]
+    clamped = []
+    for ts, frame in records:
+        previous = max(previous, ts)
+        clamped.append((previous, frame))
+    records = clamped
+    compressed = _compress(codec, encodeBlock(records))
+    first, last = records[0][0], records[-1][0]
+    index.append((out.tell(), first, last, len(records)))
+    out.write(_block_header.pack(len(compressed), len(records), first, last))
+    out.write(compressed)
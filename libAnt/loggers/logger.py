@@ -1,7 +1,54 @@
+import os
+import re
+import time
+from collections import deque
+from threading import Thread, Event, Lock
+
+
 class Logger:
-    def __init__(self, logFile: str):
+    """
+    Writes every raw frame read by a Driver to a log file
+
+    log() only encodes the frame and appends it to an in-memory batch, so it
+    never waits on the disk while the driver lock is held. A background thread
+    writes the batch out once it reaches batchSize bytes or every
+    flushInterval seconds. If the disk falls more than maxPending bytes
+    behind, further frames are dropped and counted rather than stalling reads.
+
+    Logs are written to name-N.ext, N following the highest number already
+    in the directory. With maxBytes or maxAge the log is rotated to the next
+    number once the file reaches that size or age (seconds), each file
+    starting with its own header, and with retention only that many of the
+    most recent files are kept.
+    """
+
+    def __init__(self, logFile: str, batchSize: int = 64 * 1024, flushInterval: float = 1.0,
+                 maxPending: int = 16 * 1024 * 1024, maxBytes: int = None, maxAge: float = None,
+                 retention: int = None):
+        self._baseFile = logFile
         self._logFile = logFile
         self._log = None
+        self._maxBytes = maxBytes
+        self._maxAge = maxAge
+        self._retention = retention
+        self._files = deque()
+        self._nextNum = 0
+        self._fileBytes = 0
+        self._headerBytes = 0
+        self._fileOpened = 0.0
+        self._batchSize = batchSize
+        self._flushInterval = flushInterval
+        self._maxPending = maxPending
+        self._batch = []
+        self._pending = 0
+        self._batchLock = Lock()
+        self._full = Event()
+        self._stopper = Event()
+        self._writer = None
+        # wall clock time at open, advanced with the monotonic clock
+        self._wallStart = 0.0
+        self._monoStart = 0.0
+        self.dropped = 0
 
     def __enter__(self):
         self.open()
@@ -10,39 +57,125 @@ class Logger:
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
 
-    def open(self):
-        def validate(logFile: str) -> str:
-            if '.' in logFile:
-                name, ext = logFile.split('.', 2)
-                ext = '.' + ext
-            else:
-                name = logFile
-                ext = ''
-            num = 0
-            exists = True
-            while(exists):
-                logFile = name + '-' + str(num) + ext
-                try:
-                    with open(logFile):
-                            pass
-                except IOError:
-                    return logFile
-                num += 1
+    @property
+    def logFile(self) -> str:
+        """ File currently written to """
+        return self._logFile
 
+    def open(self):
         if self._log is not None:
             self.close()
-        self._logFile = validate(self._logFile)
-        self._log = open(self._logFile, 'wb')
-        self.onOpen()
+        self._files = self._existingFiles()
+        self._nextNum = self._files[-1][0] + 1 if self._files else 0
+        self._wallStart = time.time()
+        self._monoStart = time.monotonic()
+        self._openFile()
+        self._stopper.clear()
+        self._writer = Thread(target=self._run, name='Logger', daemon=True)
+        self._writer.start()
 
     def close(self):
         if self._log is not None:
-            self.beforeClose()
-            self._log.close()
-            self.afterClose()
+            if self._writer is not None:
+                self._stopper.set()
+                self._full.set()
+                self._writer.join()
+                self._writer = None
+            self.flush()
+            self._closeFile()
 
     def log(self, data: bytes):
-        self._log.write(self.encodeData(data))
+        encoded = self.encodeData(data)
+        with self._batchLock:
+            if self._pending + len(encoded) > self._maxPending:
+                self.dropped += 1
+                return
+            self._batch.append(encoded)
+            self._pending += len(encoded)
+            full = self._pending >= self._batchSize
+        if full:
+            self._full.set()
+
+    def flush(self):
+        """ Write the pending batch to the file, from the calling thread """
+        with self._batchLock:
+            batch, self._batch = self._batch, []
+            self._pending = 0
+        if self._maxAge is not None and time.monotonic() - self._fileOpened >= self._maxAge:
+            self._rotate()
+        if self._maxBytes is None:
+            if batch:
+                self.writeBatch(batch)
+                self._fileBytes += sum(map(len, batch))
+        else:
+            # split the batch where the size limit is crossed
+            start = 0
+            size = self._fileBytes
+            for i, data in enumerate(batch):
+                if size + len(data) > self._maxBytes and size > self._headerBytes:
+                    self.writeBatch(batch[start:i])
+                    self._rotate()
+                    start = i
+                    size = self._fileBytes
+                size += len(data)
+            if start < len(batch):
+                self.writeBatch(batch[start:])
+            self._fileBytes = size
+        self._log.flush()
+
+    def timestamp(self) -> float:
+        """ Seconds since the epoch, immune to wall clock adjustments after open """
+        return self._wallStart + (time.monotonic() - self._monoStart)
+
+    def _existingFiles(self) -> deque:
+        """ (number, path) of the logs already written under this name, oldest first """
+        directory, base = os.path.split(self._baseFile)
+        name, ext = os.path.splitext(base)
+        pattern = re.compile(re.escape(name) + r'-(\d+)' + re.escape(ext) + '$')
+        try:
+            entries = os.listdir(directory or '.')
+        except OSError:
+            entries = []
+        found = []
+        for entry in entries:
+            match = pattern.match(entry)
+            if match:
+                found.append((int(match.group(1)), os.path.join(directory, entry)))
+        return deque(sorted(found))
+
+    def _openFile(self):
+        name, ext = os.path.splitext(self._baseFile)
+        num = self._nextNum
+        self._nextNum += 1
+        self._logFile = '{}-{}{}'.format(name, num, ext)
+        self._log = open(self._logFile, 'wb')
+        self._fileOpened = time.monotonic()
+        self.onOpen()
+        self._headerBytes = self._fileBytes = self._log.tell()
+        self._files.append((num, self._logFile))
+        if self._retention is not None:
+            while len(self._files) > self._retention:
+                _, path = self._files.popleft()
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _closeFile(self):
+        self.beforeClose()
+        self._log.close()
+        self._log = None
+        self.afterClose()
+
+    def _rotate(self):
+        self._closeFile()
+        self._openFile()
+
+    def _run(self):
+        while not self._stopper.is_set():
+            self._full.wait(self._flushInterval)
+            self._full.clear()
+            self.flush()
 
     def onOpen(self):
         pass
@@ -54,4 +187,8 @@ class Logger:
         pass
 
     def encodeData(self, data):
-        return data
\ No newline at end of file
+        return data
+
+    def writeBatch(self, batch: list):
+        """ Write encoded frames to the current file, from the writer thread """
+        self._log.write(b''.join(batch))
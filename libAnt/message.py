@@ -11,14 +11,22 @@ class Message:
     consistent with ANT Section 7.1. Class has custom attributes to return
     useful information about a message in readable format such as length and
     display functions.
+
+    Content may be any bytes-like object, received messages hold a
+    memoryview into the frame they were parsed from. Received messages also
+    carry the time they were received at, or the original capture time when
+    replayed from a capture.
     """
 
+    __slots__ = ('_type', '_content', '_callback', 'reply_type', 'source', 'timestamp')
+
     def __init__(self, type: int, content: bytes):
         self._type = type  # Message type indicated in constants file
         self._content = content  # Byte array of Message content
-        self.callback = self.device_reply  # Function called on message success
+        self._callback = None  # Function called on message success
         self.reply_type = None  # Field to indicate if message expects a reply
         self.source = ''  # Descriptive field to know where message comes from
+        self.timestamp = None  # Reception time (s since epoch), None if not received
 
     def __len__(self):
         "Length property updated to only show length of content attribute"
@@ -26,7 +34,7 @@ class Message:
 
     def __iter__(self):
         "Iterating message object only examines values in content attribute"
-        return self._content
+        return iter(self._content)
 
     def __str__(self):
         """
@@ -99,6 +107,17 @@ class Message:
         else:
             return(process_event_code(msg, msg.content[2]))
 
+    @property
+    def callback(self):
+        """Function called on message success, device_reply by default"""
+        if self._callback is None:
+            return self.device_reply
+        return self._callback
+
+    @callback.setter
+    def callback(self, fn):
+        self._callback = fn
+
     @property
     def type(self) -> int:
         return self._type
@@ -455,18 +474,27 @@ class BroadcastMessage(Message):
     Braodcast messages are one-way, un-acknowledged data packets sent across a
     channel. The data payload is 8 bytes and can be configred to contain
     extended fields.
+
+    The payload is a view into the received frame rather than a copy, and the
+    extended fields are only decoded the first time one of them is read.
+    Instances are not modified once built and can be shared freely.
     """
 
+    __slots__ = ('_raw', 'channel', 'flag', '_ext')
+
+    # Value of every extended field when the flag byte does not include it
+    _NO_EXT = (None,) * 7
+
     def __init__(self, type: int, content: bytes):
-        self.flag = None
-        self.device_number = self.device_type = self.tx_type = None
-        self.rssi_measurement_type = self.rssi = self._rssi_threshold = None
-        self.rssi = None
-        self.rssi_threshold = None
-        self.rx_timestamp = None
-        self.channel = None
-        self.ext_content = None
         super().__init__(type, content)
+        self._raw = content
+        self.channel = None
+        self.flag = None
+        self._ext = self._NO_EXT
+
+    def __reduce__(self):
+        # memoryviews can not be pickled or deep copied, rebuild from bytes
+        return _rebuild_broadcast, (bytes(self._raw), self.timestamp)
 
     def build(self, raw: bytes):
         """Construct broadcast message to a standard format.
@@ -488,32 +516,83 @@ class BroadcastMessage(Message):
             assignment
 
         """
+        if not isinstance(raw, memoryview):
+            raw = memoryview(raw)
         self._type = c.MESSAGE_CHANNEL_BROADCAST_DATA
+        self._raw = raw
         self.channel = raw[0]
         self._content = raw[1:9]
         if len(raw) > 9:  # Extended message
             self.flag = raw[9]
-            self.ext_content = raw[10:]
-            offset = 0
-            if self.flag & c.EXT_FLAG_CHANNEL_ID:
-                self.device_number = int.from_bytes(self.ext_content[:2],
-                                                    byteorder='little',
-                                                    signed=False)
-                self.device_type = self.ext_content[2]
-                self.tx_type = self.ext_content[3]
-                offset += 4
-            if self.flag & c.EXT_FLAG_RSSI:
-                rssi = self.ext_content[offset:(offset + 3)]
-                self.rssi_measurement_type = rssi[0]
-                self.rssi = rssi[1]
-                self.rssi_threshold = rssi[2]
-                offset += 3
-            if self.flag & c.EXT_FLAG_TIMESTAMP:
-                self.rx_timestamp = int.from_bytes(self.ext_content[offset:],
-                                                   byteorder='little',
-                                                   signed=False)
+            self._ext = None
+        else:
+            self.flag = None
+            self._ext = self._NO_EXT
         return self
 
+    def _extended(self):
+        """Decode the extended fields (ANT Section 7.1.1) once"""
+        if self._ext is not None:
+            return self._ext
+        ext_content = self._raw[10:]
+        device_number = device_type = tx_type = None
+        rssi_measurement_type = rssi = rssi_threshold = rx_timestamp = None
+        offset = 0
+        if self.flag & c.EXT_FLAG_CHANNEL_ID:
+            device_number = ext_content[0] | (ext_content[1] << 8)
+            device_type = ext_content[2]
+            tx_type = ext_content[3]
+            offset += 4
+        if self.flag & c.EXT_FLAG_RSSI:
+            rssi_measurement_type = ext_content[offset]
+            rssi = ext_content[offset + 1]
+            rssi_threshold = ext_content[offset + 2]
+            offset += 3
+        if self.flag & c.EXT_FLAG_TIMESTAMP:
+            rx_timestamp = int.from_bytes(ext_content[offset:],
+                                          byteorder='little',
+                                          signed=False)
+        self._ext = (device_number, device_type, tx_type,
+                     rssi_measurement_type, rssi, rssi_threshold,
+                     rx_timestamp)
+        return self._ext
+
+    @property
+    def ext_content(self):
+        return self._raw[10:] if self.flag is not None else None
+
+    @property
+    def device_number(self):
+        return self._extended()[0]
+
+    @property
+    def device_type(self):
+        return self._extended()[1]
+
+    @property
+    def tx_type(self):
+        return self._extended()[2]
+
+    @property
+    def rssi_measurement_type(self):
+        return self._extended()[3]
+
+    @property
+    def rssi(self):
+        return self._extended()[4]
+
+    @property
+    def rssi_threshold(self):
+        return self._extended()[5]
+
+    @property
+    def rx_timestamp(self):
+        return self._extended()[6]
+
+    # Names used by the profiles package
+    deviceNumber = device_number
+    deviceType = device_type
+
     def checksum(self) -> int:
         pass
 
@@ -521,6 +600,30 @@ class BroadcastMessage(Message):
         pass
 
 
+class Gap:
+    """Marker delivered with the messages when some of them were lost
+
+    Passed to the node callback after the device was reconnected, before the
+    first message received since. Nothing was received between start and end
+    (time.time() values).
+    """
+
+    __slots__ = ('start', 'end')
+
+    def __init__(self, start: float, end: float):
+        self.start = start
+        self.end = end
+
+    def __str__(self):
+        return f'Gap: {self.end - self.start:.1f}s without messages'
+
+
+def _rebuild_broadcast(raw: bytes, timestamp=None):
+    msg = BroadcastMessage(c.MESSAGE_CHANNEL_BROADCAST_DATA, raw).build(raw)
+    msg.timestamp = timestamp
+    return msg
+
+
 class AcknowledgedMessage(Message):
     """ANT Section 9.5.5.2 (0x4F)
 
@@ -761,7 +864,7 @@ class ChannelIDMessage(Message):
         self.id_dict = {'channel_number': self.channel_num,
                         'device_number': self.device_number,
                         'device_type': self.device_type,
-                        'tx_type': self.device_type}
+                        'tx_type': int(content[4])}
 
     def disp_ID(self, msg):
         if not msg.type == c.MESSAGE_CHANNEL_ID:
@@ -1,9 +1,14 @@
+import functools
 import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from queue import Queue, Empty
-from time import sleep
+from time import monotonic, time
 from datetime import datetime
 
+from libAnt.dispatcher import Dispatcher
 from libAnt.drivers.driver import Driver, DriverException
+from libAnt.scheduler import TxScheduler
+import libAnt.scheduler as sched
 import libAnt.message as m
 import libAnt.constants as c
 import libAnt.exceptions as ex
@@ -22,6 +27,22 @@ class Network:
         return self.name
 
 
+class WakeQueue(Queue):
+    """Queue setting an event whenever a message is put in it
+
+    Every queue feeding a Pump shares the event, so the transmit thread
+    sleeps until there is something to send instead of polling the queues.
+    """
+
+    def __init__(self, wake: threading.Event, maxsize=0):
+        super().__init__(maxsize)
+        self._wake = wake
+
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        self._wake.set()
+
+
 class Pump(threading.Thread):
     """Encapsulate device read/write functions for use in external thread
 
@@ -29,22 +50,42 @@ class Pump(threading.Thread):
     sends queued messages to the connected ANT device using a thread-safe usb
     driver. Therefore multiple pump objects can reference the same USB device.
 
+    The pump thread only reads from the device. Queued messages are written
+    by a second thread, woken as soon as a message is put in one of the
+    queues, so commands never wait behind a blocking read. The messages
+    are taken from the queues into a TxScheduler, which decides the order
+    they are written in and paces data messages by channel period.
+
     Attributes
     ----------
+    read_timeout : float
+        Longest a read blocks before the thread checks whether it was stopped
+    reset_timeout : float
+        Longest the transmit thread waits for the startup message after a
+        reset, for devices which do not send one
+    reconnect_delay, reconnect_max_delay : float
+        With on_reconnect, seconds between the attempts to reopen a device
+        which went away, doubling from the first to the second
 
     Methods
     -------
     run()
         Characteristic of any thread object containing the code to be executed
-        when the thread begins
-    send_message(queue, waiter, driver)
-        Encapsulated function for extracting message from queues and adding
-        necessary waiter content
+        when the thread begins. Reads and processes incoming messages.
+    send_message(msg, driver)
+        Encapsulated function for sending a message chosen by the scheduler
+        to the device
     process_read_message(msg)
-        Encapsulated function for processing recieved messages, executing
-        necessary callbacks, and raising errors when necessary
+        Encapsulated function for processing recieved messages, resolving the
+        requests they reply to through the dispatcher, executing necessary
+        callbacks, and raising errors when necessary
     """
 
+    read_timeout = 1
+    reset_timeout = 1
+    reconnect_delay = 0.5
+    reconnect_max_delay = 30
+
     def __init__(self, driver: Driver,
                  config_queue: Queue,
                  control_queue: Queue,
@@ -53,23 +94,40 @@ class Pump(threading.Thread):
                  on_shutdown,
                  onSuccess,
                  onFailure,
-                 debug):
+                 debug,
+                 dispatcher: Dispatcher = None,
+                 channels=None,
+                 wake: threading.Event = None,
+                 scheduler: TxScheduler = None,
+                 on_reconnect=None):
         super().__init__()
         self._stopper = threading.Event()
         self._pauser = threading.Event()
+        # Set while not paused, the threads wait on it
+        self._resumer = threading.Event()
+        self._resumer.set()
+        # Set by the queues when a message is put in one of them
+        self._wake = wake if wake is not None else threading.Event()
+        # Set when the device reports it finished a reset
+        self._startup = threading.Event()
+        # Cleared while the device is being reopened
+        self._connected = threading.Event()
+        self._connected.set()
+        # Called once the device is back, None to stop when it goes away
+        self._on_reconnect = on_reconnect
         self._driver = driver
         self._config = config_queue
         self._control = control_queue
         self._out = output_queue
         self._tx = tx_queue
-        self._config_waiters = []
-        self._control_waiters = []
-        self._tx_waiters = []
+        self._dispatcher = dispatcher if dispatcher is not None else Dispatcher()
+        self._scheduler = scheduler if scheduler is not None else TxScheduler()
         self._onSuccess = onSuccess
         self._onFailure = onFailure
         self._debug = debug
         self.on_shutdown = on_shutdown
-        self.first_message_flag = False
+        # Callable returning the Channel object for a channel number
+        self._channels = channels if channels is not None else (lambda n: None)
 
     def __enter__(self):  # Added by edyas 02/12/21
         return self
@@ -80,18 +138,26 @@ class Pump(threading.Thread):
     def stop(self):
         if not self._stopper.isSet():
             self._stopper.set()
+            # Release the transmit thread wherever it waits
+            self._resumer.set()
+            self._connected.set()
+            self._startup.set()
+            self._wake.set()
 
     def pause(self):
         if self.paused():
             return
         else:
             self._pauser.set()
+            self._resumer.clear()
 
     def resume(self):
         if not self.paused():
             return
         else:
             self._pauser.clear()
+            self._resumer.set()
+            self._wake.set()
 
     def paused(self):
         return self._pauser.isSet()
@@ -99,225 +165,261 @@ class Pump(threading.Thread):
     def stopped(self):
         return self._stopper.isSet()
 
-# Theres gotta be a better way to organize this run method? Right?
     def run(self):
         with self._driver as d:
-            while not self.stopped():
-                if self.paused():
-                    sleep(0.1)
-                    pass
+            tx = threading.Thread(target=self._run_tx, args=(d,),
+                                  name=f'{self.name}-tx', daemon=True)
+            tx.start()
+            try:
+                self._run_rx(d)
+            finally:
+                self.stop()
+                tx.join()
+
+        for w in self._dispatcher.drain():
+            w.future.set_exception(DriverException("Node stopped"))
+        for future in self._scheduler.drain():
+            future.set_result(False)
+
+    def _run_rx(self, d):
+        while not self.stopped():
+            self._resumer.wait()
+            if self.stopped():
+                break
+            try:
+                msgs = d.read_many(timeout=self.read_timeout)
+            except DriverException as e:
+                if self._on_reconnect is None:
+                    self._failed(e)
                 else:
-                    try:
-                        #  Write
-                        # Config messages should be sent in sequence. If
-                        # additions are made to config queue they should be
-                        # sent in a row.
-                        while not self._config.empty():
-                            self.send_message(self._config,
-                                              self._config_waiters,
-                                              d)
-
-                        # Otherwise messages are grabbed from the control queue
-                        self.send_message(self._control,
-                                          self._control_waiters,
-                                          d)
-
-                        # Otherwise messages are grabbed from the tx queue
-                        self.send_message(self._tx, self._tx_waiters, d)
-
-                        # Read
-                        try:
-                            msg = d.read(timeout=1)
-                            # Diagnostic Print Statements view incoming message
-                            if self._debug:
-                                print(f'Message Recieved: {msg}')
-                                # print(f'Message Type: {msg.type}')
-                                # print(f'Waiter msg: {w[0]}')
-                                # print(f'Waiter msg type: {w[0].type}')
-                        except Empty:
-                            pass
-
-                        except DriverException as e:
-                            # traceback.print_exc()
-                            # self._onFailure(e)
-                            # self.on_shutdown.fire()
-                            # print("Do we get here?")
-                            # self.stop()
-                            raise e
-
-                        else:
-                            try:
-                                out = self.process_read_message(msg)
-
-                            except Exception as e:
-                                raise e
-
-                            else:
-                                if out is not None:
-                                    self._onSuccess(out)
-
-                    except DriverException as e:
-                        traceback.print_exc()
-                        self._onFailure(e)
-                        # self.on_shutdown.fire()
-                        self.stop()
-                        # raise e
-
-                    except ex.RxFail as e:
-                        self._onFailure(e)
-
-                    except ex.TxFail as e:
-                        self._onFailure(e)
-                        self._tx.task_done()
-                        self._out.put(False)
-                        self._out.join()
-
-                    except ex.RxFailGoToSearch as e:
-                        self._onFailure(e)
-                        # TODO: Implement Search Procecdure
-
-                    except ex.RxSearchTimeout as e:
-                        self._onFailure(e)
-                        if not self.first_message_flag:
-                            self._out.get()
-                            self._out.task_done()
-                            sleep(0.01)
-                            self._out.put(e)
-                            self._out.join()
-
-                    except Exception as e:
-                        traceback.print_exc()
-                        self._onFailure(e)
-
-        self._config_waiters.clear()
-        self._control_waiters.clear()
-        self._tx_waiters.clear()
-        sleep(0.1)
-
-    def send_message(self, queue: Queue, waiters, driver):
-        try:
-            outMsg = queue.get(block=False)
-            driver.write(outMsg)
-            if outMsg.type == c.MESSAGE_SYSTEM_RESET:
-                # Wait for system to finish reset before doing anything
-                sleep(0.6)
-
-        except Empty:
-            pass
-
-        except Exception as e:
-            raise e
-
-        else:
-            if self._debug:
-                print(f'Message Sent: {outMsg}')
-            waiters.append((outMsg, outMsg.callback))
-
-    def process_read_message(self, msg):
-
-        # Control Message Responses
-
-        for w in self._control_waiters:
-            # Requested Response Messages
-            if w[0].type == c.MESSAGE_CHANNEL_REQUEST:
-                if w[0].content[1] == msg.type:
-                    try:
-                        msg = w[1](msg.content)
-                    except Exception as e:
-                        raise e
-                    finally:
-                        self._control.task_done()
-                        self._control_waiters.remove(w)
-                        self._out.put(msg)
-                        self._out.join()
-
-            # Channel Event Messages in response to control messages
-            elif (msg.type == c.MESSAGE_CHANNEL_EVENT
-                  and w[0].type == msg.content[1]
-                  and w[1] is not None):
+                    self._reconnect(d, e)
+                continue
+            except Exception as e:
+                self._failed(e)
+                continue
+
+            for msg in msgs:
+                # Diagnostic Print Statements view incoming message
+                if self._debug:
+                    print(f'Message Recieved: {msg}')
+                if msg.type == c.MESSAGE_STARTUP:
+                    self._startup.set()
                 try:
-                    out = w[1](msg, w[0].type)
+                    out = self.process_read_message(msg)
                 except Exception as e:
-                    raise e
+                    self._failed(e)
                 else:
-                    return out
-                finally:
-                    self._control.task_done()
-                    self._control_waiters.remove(w)
+                    if out is not None:
+                        self._onSuccess(out)
+
+    def _reconnect(self, d, error):
+        """Reopen a device which went away, retrying with backoff"""
+        start = time()
+        self._connected.clear()
+        self._onFailure(error)
+        # Nothing sent or queued before will be answered
+        self._schedule(self._config, sched.CONFIG)
+        self._schedule(self._control, sched.CONTROL)
+        self._schedule(self._tx, sched.DATA)
+        for future in self._scheduler.drain():
+            future.set_result(False)
+        for w in self._dispatcher.drain():
+            w.future.set_exception(DriverException("Device disconnected"))
+
+        delay = self.reconnect_delay
+        while True:
+            try:
+                d.reOpen()
+            except Exception:
+                if self._stopper.wait(delay):
+                    return
+                delay = min(2 * delay, self.reconnect_max_delay)
+            else:
                 break
 
-        if msg.type == c.MESSAGE_CHANNEL_EVENT:
-            # This is a response to our outgoing message
-            for w in self._config_waiters:
-                if w[0].type == msg.content[1] and w[1] is not None:
-                    try:
-                        out = w[1](msg, w[0].type)
-                    except Exception as e:
-                        raise e
-                    else:
-                        return out
-                    finally:
-                        self._config.task_done()
-                        self._config_waiters.remove(w)
-                    break
-
-            # msg.content[1] == c.MESSAGE_RF_EVENT:
+        self._connected.set()
+        self._onSuccess(m.Gap(start, time()))
+        self._on_reconnect()
+
+    def _run_tx(self, d):
+        while not self.stopped():
+            self._resumer.wait()
+            self._connected.wait()
+            # Cleared before looking at the queues so that a message put
+            # while they are being emptied still wakes the next wait
+            self._wake.clear()
+            wake = None
             try:
-                out = m.process_event_code(msg, msg.content[2])
+                self._schedule(self._config, sched.CONFIG)
+                self._schedule(self._control, sched.CONTROL)
+                self._schedule(self._tx, sched.DATA)
+
+                # Config messages first, in sequence, then control messages,
+                # then data paced by the channel periods
+                while not self.stopped() and not self.paused():
+                    outMsg, wake = self._scheduler.next()
+                    if outMsg is None:
+                        break
+                    self.send_message(outMsg, d)
+
+                # Give up on requests the device never answered
+                for w in self._dispatcher.expire():
+                    w.future.set_exception(
+                        FutureTimeoutError(f"No reply to message {w.msg}"))
             except Exception as e:
-                raise e
+                self._failed(e)
+
+            deadline = self._dispatcher.next_deadline()
+            if wake is None or (deadline is not None and deadline < wake):
+                wake = deadline
+            self._wake.wait(None if wake is None
+                            else max(0, wake - monotonic()))
+
+    def _schedule(self, queue: Queue, priority: int):
+        """Move the messages put in queue to the scheduler"""
+        while True:
+            try:
+                item = queue.get(block=False)
+            except Empty:
+                return
+            # Channel.send queues (message, future) pairs
+            if isinstance(item, tuple):
+                self._scheduler.put(priority, *item)
             else:
-                return out
-            finally:
-                # Special Case for Channel Close Confirmation message
-                if (msg.content[1] == c.MESSAGE_RF_EVENT
-                        and msg.content[2] == c.EVENT_CHANNEL_CLOSED):
-                    self._out.get()
-                    self._out.task_done()
-                    # This works for 1 channel handling at a time...
-                    self.first_message_flag = False
-
-                if msg.content[2] == c.EVENT_TRANSFER_TX_COMPLETED:
-                    self._tx.task_done()
-                    self._out.put(True)
-
-        elif msg.type == c.MESSAGE_CHANNEL_BROADCAST_DATA:
-            if not self.first_message_flag:
-                self._out.get()
-                self._out.task_done()
-                self.first_message_flag = True
+                self._scheduler.put(priority, item)
+            queue.task_done()
+
+    def _failed(self, e):
+        """Report an error raised while reading or writing"""
+        if isinstance(e, DriverException):
+            traceback.print_exc()
+            self._onFailure(e)
+            # self.on_shutdown.fire()
+            if self._on_reconnect is None:
+                self.stop()
+
+        elif isinstance(e, (ex.RxFail, ex.TxFail, ex.RxSearchTimeout)):
+            self._onFailure(e)
+
+        elif isinstance(e, ex.RxFailGoToSearch):
+            self._onFailure(e)
+            # TODO: Implement Search Procecdure
+
+        else:
+            traceback.print_exc()
+            self._onFailure(e)
+
+    def send_message(self, outMsg, driver):
+        """Write a message, or a batch of config messages, to the device"""
+        if getattr(outMsg, 'type', None) == c.MESSAGE_SYSTEM_RESET:
+            self._startup.clear()
+            driver.write(outMsg)
+            # Wait for system to finish reset before doing anything
+            self._startup.wait(self.reset_timeout)
+        elif isinstance(outMsg, list):
+            # Batch queued by Node.configure, sent in one write
+            driver.write_many(outMsg)
+        else:
+            driver.write(outMsg)
+
+        if self._debug:
+            for sent in (outMsg if isinstance(outMsg, list) else [outMsg]):
+                print(f'Message Sent: {sent}')
+        # Replies are tracked by the dispatcher and the channels
+
+    def process_read_message(self, msg):
+
+        if msg.type == c.MESSAGE_CHANNEL_BROADCAST_DATA:
             bmsg = m.BroadcastMessage(msg.type,
                                       msg.content)
             bmsg = bmsg.build(msg.content)
+            bmsg.timestamp = msg.timestamp
+            channel = self._channels(bmsg.channel)
+            if channel is not None:
+                channel.process_broadcast(bmsg)
             return bmsg
 
+        # Replies to outstanding config, control and request messages
+        w = self._dispatcher.resolve(msg)
+        if w is not None:
+            return self.process_reply(w, msg)
+
+        if msg.type == c.MESSAGE_CHANNEL_EVENT:
+            # msg.content[1] == c.MESSAGE_RF_EVENT:
+            if msg.content[1] == c.MESSAGE_RF_EVENT:
+                if self._scheduler.transmitted(msg.content[0],
+                                               msg.content[2]):
+                    # The channel takes its next data message
+                    self._wake.set()
+                channel = self._channels(msg.content[0])
+                if channel is not None:
+                    channel.process_event(msg.content[2])
+            return m.process_event_code(msg, msg.content[2])
+
         # Patrick's Stuff
         else:
             # Notification Messages
             if msg.type == c.MESSAGE_STARTUP:
                 start_msg = m.StartUpMessage(msg.content)
-                self._control.task_done()
                 return(start_msg.disp_startup(msg))
 
             elif msg.type == c.MESSAGE_SERIAL_ERROR:
-                self._control.task_done()
                 raise ex.SerialError(msg.content)
 
+    def process_reply(self, w, msg):
+        """Complete the future of the request msg replies to"""
+        if w.msg.type == c.MESSAGE_CHANNEL_REQUEST:
+            # Requested Response Messages
+            try:
+                out = w.msg.callback(msg.content)
+            except Exception as e:
+                w.future.set_exception(e)
+                raise e
+            w.future.set_result(out)
+            return None
+
+        if msg.type == c.MESSAGE_STARTUP:
+            start_msg = m.StartUpMessage(msg.content)
+            w.future.set_result(start_msg)
+            return(start_msg.disp_startup(msg))
+
+        # Channel Event Messages in response to config and control messages
+        try:
+            out = w.msg.callback(msg, w.msg.type)
+        except Exception as e:
+            w.future.set_exception(e)
+            raise e
+        w.future.set_result(out)
+        return out
+
 
 class Node:
     def __init__(self, driver: Driver,
                  onSuccess=None,
                  onFailure=None,
                  name: str = None,
-                 debug=False):
+                 debug=False,
+                 timeout: float = 5,
+                 reconnect=False):
         self._driver = driver
         self._name = name
+        # Reopen the device and restore the channels when it goes away,
+        # instead of stopping
+        self._reconnect = reconnect
         self._init = []
         self._pump = None
-        self.config_messages = Queue()
-        self.control_messages = Queue()
+        self._dispatcher = Dispatcher()
+        # Content of the config messages acknowledged by the device, keyed by
+        # (message type, channel or network number)
+        self._applied = {}
+        # Extended data settings, applied again after a reconnect
+        self._extended = []
+        self.timeout = timeout
+        self._wake = threading.Event()
+        self.config_messages = WakeQueue(self._wake)
+        self.control_messages = WakeQueue(self._wake)
         self.outputs = Queue()
-        self.tx_messages = Queue()
+        self.tx_messages = WakeQueue(self._wake)
         self.on_shutdown = EventHook()
         self.channels = []
         self.debug = debug
@@ -349,7 +451,12 @@ class Node:
                           self.on_shutdown,
                           self.onSuccess,
                           self.onFailure,
-                          self.debug)
+                          self.debug,
+                          self._dispatcher,
+                          self._channel,
+                          self._wake,
+                          on_reconnect=(self._restore if self._reconnect
+                                        else None))
         self._pump.start()
         self.reset()
         self.capabilities = self.get_capabilities(disp=False)
@@ -368,13 +475,21 @@ class Node:
                      channel_frequency=2457,
                      channel_msg_freq=4,
                      channel_search_timeout=5,
+                     wait=True,
                      **kwargs):
+        """Configure and open a channel
+
+        With wait=True (default) block until the first message arrives or the
+        search times out. With wait=False return as soon as the channel is
+        searching; use Channel.wait_for_first_message or the channel's
+        on_state_change hook to follow it. Returns False on failure.
+        """
         # Some input checking
-        if channel_num > self.max_channels or channel_num < 0:
+        if channel_num >= self.max_channels or channel_num < 0:
             print("Error: Channel assignment exceeds device capabilities")
             return False
 
-        if network_num > self.max_networks or network_num < 0:
+        if network_num >= self.max_networks or network_num < 0:
             print("Error: Network assignment exceeds device capabilities")
             return False
 
@@ -396,46 +511,71 @@ class Node:
 
         # Create channel object in node's channels list
         try:
-            self.channels[channel_num] = Channel(self.config_messages,
-                                                 self.control_messages,
-                                                 self.outputs,
-                                                 channel_num,
-                                                 network_num,
-                                                 network_key,
-                                                 channel_type,
-                                                 device_type,
-                                                 channel_frequency,
-                                                 channel_msg_freq,
-                                                 channel_search_timeout)
+            channel = Channel(self,
+                              channel_num,
+                              network_num,
+                              network_key,
+                              channel_type,
+                              device_type,
+                              channel_frequency,
+                              channel_msg_freq,
+                              channel_search_timeout)
+            self.channels[channel_num] = channel
+
+            self.onSuccess(f"Channel {channel_num} Configuration Success!\n"
+                           f"Attempting to Open Channel {channel_num}...")
+            channel.open()
 
         except Exception as e:
             self.onFailure(e)
+            self.channels[channel_num] = None
             return False
 
-        self.onSuccess(f"Channel {channel_num} Configuration Success!\n"
-                       f"Attempting to Open Channel {channel_num}...")
-        self.channels[channel_num].open()
         self.onSuccess(f"Channel {channel_num} Open Success!\n"
                        "Waiting until First message...")
-        self._pump.first_msg_flag = False
-        self.outputs.put("Blocking until First Message")
-        # TODO: This wont work if the channel times out
-        self.outputs.join()
-        try:
-            err = self.outputs.get(block=True, timeout=0.5)
-        except Empty:
-            pass
+        if not wait:
+            return True
+        return self.wait_for_channel(channel_num)
 
-        else:
-            if isinstance(err, ex.RxSearchTimeout):
-                self.outputs.task_done()
-                return False
+    def open_channels(self, settings: list):
+        """Configure and open several channels with overlapping searches
+
+        Parameters
+        ----------
+        settings : list
+            One dict of open_channel keyword arguments per channel
+
+        Returns
+        -------
+        list
+            open_channel result for each entry of settings
+        """
+        opened = [self.open_channel(**kwargs, wait=False)
+                  for kwargs in settings]
+        return [ok and self.wait_for_channel(kwargs.get('channel_num', 0))
+                for ok, kwargs in zip(opened, settings)]
+
+    def wait_for_channel(self, channel_num: int):
+        """Block until an opened channel receives its first message
+
+        A channel whose search timed out is unassigned and released.
+        """
+        channel = self.channels[channel_num]
+        # Device reports the search timeout, the node timeout is a backstop
+        if not channel.wait_for_first_message(channel.search_timeout
+                                              + self.timeout):
+            try:
+                channel.close(
+                    timeout=channel.state == c.CHANNEL_STATE_SEARCH_TIMEOUT)
+            except Exception as e:
+                self.onFailure(e)
+            self.channels[channel_num] = None
+            return False
 
         self.onSuccess("First Message Recieved!\n"
                        f"Idenfiying Channel {channel_num} Properties...")
-        self.channels[channel_num].id = self.get_channel_ID(channel_num)
-        self.channels[channel_num].status = self.get_channel_status(
-            channel_num)
+        channel.id = self.get_channel_ID(channel_num)
+        channel.status = self.get_channel_status(channel_num)
         return True
 
     def close_channel(self, channel_num, timeout=False):
@@ -445,16 +585,34 @@ class Node:
             raise e
             return False
         else:
-            del self.channels[channel_num]
             self.channels[channel_num] = None
             return True
 
     def send_tx_msg(self, msg):
-        self.tx_messages.put(msg)
-        self.tx_messages.join()
-        msg_success = self.outputs.get()
-        self.outputs.task_done()
-        return msg_success
+        channel = self._channel(msg.content[0])
+        if channel is None:
+            self.onFailure(ex.ChannelNotOpened())
+            return False
+        return channel.send(msg)
+
+    def enable_extended_messages(self, rx_timestamp=False, rssi=False,
+                                 channel_id=True):
+        """Have the device append extended data to every broadcast
+
+        With channel_id, broadcasts carry the id (device number, type and
+        transmission type) of the device which sent them. The setting applies
+        to every channel of the device and is restored after a reconnect.
+
+        Returns
+        -------
+        bool
+            True once the device acknowledged the setting
+        """
+        self._extended = [m.EnableExtendedMessagesMessage(),
+                          m.LibConfigMessage(rx_timestamp, rssi, channel_id)]
+        for reply in self.configure(self._extended):
+            reply.result()
+        return True
 
     # Depreciated
     def enableRxScanMode(self, networkKey=c.ANTPLUS_NETWORK_KEY,
@@ -483,8 +641,112 @@ class Node:
             return False
         return self._pump.is_alive()
 
+    def _channel(self, channel_num):
+        if 0 <= channel_num < len(self.channels):
+            return self.channels[channel_num]
+        return None
+
+    def request(self, queue: Queue, msg, timeout=None) -> Future:
+        """Queue a message and return a future resolved with its reply
+
+        Parameters
+        ----------
+        queue : Queue
+            config_messages or control_messages
+        msg : Message
+            Message expecting a reply from the device
+        timeout : float, optional
+            Seconds to wait for the reply. The default is the node timeout.
+
+        Returns
+        -------
+        Future
+            Resolves to the decoded reply, or raises the error reported by
+            the device, concurrent.futures.TimeoutError if it never answers
+        """
+        future = Future()
+        self._dispatcher.expect(msg, future,
+                                timeout if timeout is not None
+                                else self.timeout)
+        queue.put(msg)
+        return future
+
+    def configure(self, msgs: list, timeout=None) -> list:
+        """Send config messages in one batch and track each reply
+
+        Messages whose setting the device already acknowledged, such as the
+        network key of a network number in use by another channel, are not
+        sent again.
+
+        Returns
+        -------
+        list
+            One future per message, resolved with its reply or with a
+            'Message Skipped' string for skipped messages
+        """
+        timeout = timeout if timeout is not None else self.timeout
+        futures = []
+        batch = []
+        for msg in msgs:
+            key = (msg.type, msg.content[0])
+            content = bytes(msg.content)
+            future = Future()
+            if self._applied.get(key) == content:
+                future.set_result(f'Message Skipped. Type: {hex(msg.type)}')
+            else:
+                self._dispatcher.expect(msg, future, timeout)
+                future.add_done_callback(
+                    functools.partial(self._config_applied, key, content))
+                batch.append(msg)
+            futures.append(future)
+        if batch:
+            self.config_messages.put(batch)
+        return futures
+
+    def _config_applied(self, key, content, future):
+        if not future.cancelled() and future.exception() is None:
+            self._applied[key] = content
+
+    def _config_cleared(self, channel_num):
+        """Forget the channel settings once the channel is unassigned"""
+        for key in [k for k in self._applied
+                    if k[1] == channel_num
+                    and k[0] not in c.network_config_messages]:
+            del self._applied[key]
+
+    def _restore(self):
+        """Restore the channels once the device is back, called by the pump"""
+        # The pump thread delivers the replies, it can not wait for them
+        threading.Thread(target=self._restore_channels,
+                         name=f'{self._name}-restore', daemon=True).start()
+
+    def _restore_channels(self):
+        self._applied.clear()
+        try:
+            self.request(self.control_messages,
+                         m.ResetSystemMessage()).result()
+        except FutureTimeoutError:
+            # Not every device answers a reset with a startup message
+            pass
+        except Exception as e:
+            self.onFailure(e)
+            return
+        try:
+            for reply in self.configure(self._extended):
+                reply.result()
+        except Exception as e:
+            self.onFailure(e)
+        for channel in self.channels:
+            if channel is not None:
+                try:
+                    channel.restore()
+                except Exception as e:
+                    self.onFailure(e)
+
     def reset(self):
-        self.control_messages.put(m.ResetSystemMessage())
+        # Startup message is matched by the dispatcher, nothing waits on it
+        self.request(self.control_messages, m.ResetSystemMessage())
+        self._applied.clear()
         if self.channels == []:
             return
         else:
@@ -494,46 +756,36 @@ class Node:
             self.channels = [None] * self.max_channels
 
     def get_capabilities(self, disp=True):
-        self.control_messages.put(m.RequestCapabilitiesMessage(), block=False)
-        self.control_messages.join()
-        cap_msg = self.outputs.get(block=True)
-        self.outputs.task_done()
+        cap_msg = self.request(self.control_messages,
+                               m.RequestCapabilitiesMessage()).result()
         cap_dict = cap_msg.capabilities_dict
         if disp:
             self.onSuccess(cap_msg.disp_capabilities(cap_msg))
         return cap_dict
 
     def get_channel_status(self, channel_num: int, disp=True):
-        # Not sure if this works
-        self.control_messages.put(m.RequestChannelStatusMessage(channel_num),
-                                  block=False)
-        self.control_messages.join()
-        stat_msg = self.outputs.get(block=True)
-        self.outputs.task_done()
+        stat_msg = self.request(self.control_messages,
+                                m.RequestChannelStatusMessage(channel_num)
+                                ).result()
         stat_dict = stat_msg.status_dict
         if disp:
             self.onSuccess(stat_msg.disp_status(stat_msg))
         return stat_dict
 
     def get_channel_ID(self, channel_num: int, disp=True):
-        self.control_messages.put(m.RequestChannelIDMessage(channel_num),
-                                  block=False)
-        self.control_messages.join()
-        id_msg = self.outputs.get(block=True)
+        id_msg = self.request(self.control_messages,
+                              m.RequestChannelIDMessage(channel_num)
+                              ).result()
         id_dict = id_msg.id_dict
-        self.outputs.task_done()
 
         if disp:
             self.onSuccess(id_msg.disp_ID(id_msg))
         return id_dict
 
     def get_ANT_serial_number(self, disp=True):
-        self.control_messages.put(m.RequestSerialNumberMessage(),
-                                  block=False)
-        self.control_messages.join()
-        sn_msg = self.outputs.get(block=True)
+        sn_msg = self.request(self.control_messages,
+                              m.RequestSerialNumberMessage()).result()
         sn = sn_msg.serial_number
-        self.outputs.task_done()
         if disp:
             self.onSuccess(sn_msg.disp_SN(sn_msg))
         return sn
@@ -581,11 +833,15 @@ class Node:
 
 
 class Channel:
-    """Channel class to handle IO of a single connection"""
+    """Channel class to handle IO of a single connection
+
+    Each channel tracks its own state (c.CHANNEL_STATE_*), updated by the
+    Pump from broadcast messages and RF events, so several channels can be
+    searching at the same time. Handlers added to on_state_change are called
+    with (channel, state) from the Pump thread.
+    """
 
-    def __init__(self, config_queue,
-                 control_queue,
-                 out_queue,
+    def __init__(self, node: Node,
                  channel_num=0,
                  network_num=0,
                  network_key=c.ANTPLUS_NETWORK_KEY,
@@ -595,9 +851,10 @@ class Channel:
                  channel_msg_freq=4,
                  channel_search_timeout=30):
 
-        self._cfig = config_queue
-        self._ctrl = control_queue
-        self._out = out_queue
+        self._node = node
+        self._cfig = node.config_messages
+        self._ctrl = node.control_messages
+        self._tx = node.tx_messages
         self.number = channel_num
         self.network = network_num
         self.network_key = network_key
@@ -606,37 +863,126 @@ class Channel:
         self.frequency = channel_frequency
         self.msg_freq = channel_msg_freq
         self.search_timeout = channel_search_timeout
-
-        self._cfig.put(m.SetNetworkKeyMessage(self.network,
-                                              self.network_key))
-        self._cfig.put(m.AssignChannelMessage(self.number,
-                                              self._type))
-        self._cfig.put(m.SetChannelIdMessage(self.number,
-                                             device_type=self.device_type))
-        self._cfig.put(m.SetChannelRfFrequencyMessage(self.number,
-                                                      self.frequency))
-        self._cfig.put(m.ChannelMessagingPeriodMessage(self.number,
-                                                       self.msg_freq))
-        self._cfig.put(m.ChannelSearchTimeoutMessage(self.number,
-                                                     self.search_timeout))
-        self._cfig.join()
+        self.id = None
+        self.status = None
+        self.state = c.CHANNEL_STATE_UNASSIGNED
+        self.on_state_change = EventHook()
+        self._first_message = threading.Event()
+        self._search_done = threading.Event()
+        self._closed = threading.Event()
+
+        for reply in self._node.configure(self.config_messages()):
+            reply.result()
+        self._set_state(c.CHANNEL_STATE_ASSIGNED)
+
+    def config_messages(self):
+        """Messages configuring the device for this channel, in order
+
+        Once the channel found a device, its id pins the channel to that
+        device.
+        """
+        device_number = self.id['device_number'] if self.id else 0
+        tx_type = self.id['tx_type'] if self.id else 0
+        return [
+            m.SetNetworkKeyMessage(self.network, self.network_key),
+            m.AssignChannelMessage(self.number, self._type, self.network),
+            m.SetChannelIdMessage(self.number, device_number=device_number,
+                                  device_type=self.device_type,
+                                  tx_type=tx_type),
+            m.SetChannelRfFrequencyMessage(self.number, self.frequency),
+            m.ChannelMessagingPeriodMessage(self.number, self.msg_freq),
+            m.ChannelSearchTimeoutMessage(self.number, self.search_timeout)]
 
     def open(self):
-        self._ctrl.put(m.OpenChannelMessage(self.number))
-        self._ctrl.join()
+        self._first_message.clear()
+        self._search_done.clear()
+        self._closed.clear()
+        self._set_state(c.CHANNEL_STATE_SEARCHING)
+        self._node.request(self._ctrl,
+                           m.OpenChannelMessage(self.number)).result()
+
+    def restore(self):
+        """Configure the channel again after the device was reset, and open
+        it if it was open"""
+        was_open = self.state in (c.CHANNEL_STATE_SEARCHING,
+                                  c.CHANNEL_STATE_TRACKING)
+        for reply in self._node.configure(self.config_messages()):
+            reply.result()
+        self._set_state(c.CHANNEL_STATE_ASSIGNED)
+        if was_open:
+            self.open()
 
     def close(self, timeout=False):
-        if not timeout:
-            self._ctrl.put(m.CloseChannelMessage(self.number))
-            self._ctrl.join()
+        if not self._closed.is_set():
+            # After a search timeout the device closes the channel itself
+            if not timeout:
+                self._node.request(self._ctrl,
+                                   m.CloseChannelMessage(self.number)).result()
+            self._closed.wait(self._node.timeout)
 
-        else:
-            sleep(0.5)
+        self._node.request(self._cfig,
+                           m.UnassignChannelMessage(self.number)).result()
+        self._node._config_cleared(self.number)
+        self._set_state(c.CHANNEL_STATE_UNASSIGNED)
+
+    def wait_for_first_message(self, timeout=None):
+        """Block until the search ends
+
+        Returns
+        -------
+        bool
+            True if a message was received, False if the search timed out
+        """
+        self._search_done.wait(timeout)
+        return self._first_message.is_set()
+
+    def send(self, msg, timeout=None, wait=True):
+        """Send an acknowledged data message and wait for the transfer result
+
+        A message still waiting for the channel's radio slot is replaced by
+        a newer one of the same data page, e.g. a newer grade.
+
+        Returns
+        -------
+        bool
+            True if the transfer completed, False if it failed, timed out or
+            was superseded. With wait=False the Future of that result.
+        """
+        result = Future()
+        self._tx.put((msg, result))
+        if not wait:
+            return result
+        try:
+            return result.result(
+                timeout if timeout is not None else self._node.timeout)
+        except FutureTimeoutError:
+            return False
 
-        self._out.put("Temp String")
-        self._out.join()
-        self._cfig.put(m.UnassignChannelMessage(self.number))
-        self._cfig.join()
+    def process_broadcast(self, msg):
+        if self.state != c.CHANNEL_STATE_TRACKING:
+            self._set_state(c.CHANNEL_STATE_TRACKING)
+        if not self._first_message.is_set():
+            self._first_message.set()
+            self._search_done.set()
+
+    def process_event(self, code):
+        match code:
+            case c.EVENT_RX_SEARCH_TIMEOUT:
+                self._set_state(c.CHANNEL_STATE_SEARCH_TIMEOUT)
+                self._search_done.set()
+
+            case c.EVENT_RX_FAIL_GO_TO_SEARCH:
+                self._set_state(c.CHANNEL_STATE_SEARCHING)
+
+            case c.EVENT_CHANNEL_CLOSED:
+                if self.state != c.CHANNEL_STATE_SEARCH_TIMEOUT:
+                    self._set_state(c.CHANNEL_STATE_ASSIGNED)
+                self._closed.set()
+                self._search_done.set()
+
+    def _set_state(self, state):
+        self.state = state
+        self.on_state_change.fire(self, state)
 
 
 class EventHook(object):
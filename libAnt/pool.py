@@ -0,0 +1,197 @@
+"""
+Several ANT sticks used as one
+
+A stick gives at most max_channels channels (8 on a USB-m). NodePool starts
+one Node per stick, opens every channel on the stick with the most channels
+free, and hands the messages received by all the sticks to one callback.
+Channel numbers repeat from one stick to the next, so every stick is set to
+send the channel id of the device along with each broadcast.
+"""
+import threading
+
+import libAnt.constants as c
+import libAnt.exceptions as ex
+from libAnt.drivers.driver import DriverException
+from libAnt.node import Node, Channel
+
+
+class NodePool:
+    """
+    One Node per driver, with the channels spread across them
+
+    onSuccess and onFailure receive what every node reports, one call at a
+    time, so they see a single stream of messages whichever stick they came
+    from. Broadcasts carry the channel number of their own stick, and the
+    channel id of the device which sent them (extended data, enabled on every
+    stick when it starts): use it to tell devices apart, as Factory does.
+    """
+
+    # Node, or any class taking the same arguments, run for every driver
+    nodeClass = Node
+
+    def __init__(self, drivers: list,
+                 onSuccess=None,
+                 onFailure=None,
+                 name: str = None,
+                 debug=False,
+                 timeout: float = 5,
+                 reconnect=False):
+        """
+        :param drivers: one Driver per stick
+        :param name: nodes are named name-0, name-1...
+        :param timeout: seconds each node waits for a reply to a request
+        :param reconnect: reopen sticks which go away and restore their
+                          channels, see Node
+        """
+        self.onSuccess = onSuccess
+        self.onFailure = onFailure
+        self._streamLock = threading.Lock()
+        # Held while a channel number is picked and claimed
+        self._placeLock = threading.Lock()
+        self._all = [self.nodeClass(driver,
+                                    self._success,
+                                    self._failure,
+                                    name=f'{name}-{i}' if name is not None else None,
+                                    debug=debug,
+                                    timeout=timeout,
+                                    reconnect=reconnect)
+                     for i, driver in enumerate(drivers)]
+        self.nodes = []
+        self._owners = {}
+
+    @classmethod
+    def from_usb(cls, vid=c.USB_VENDOR_ID, pids=c.USB_PRODUCT_IDS, **kwargs):
+        """
+        Pool of every ANT stick connected over USB
+
+        :param pids: product ids to look for, USB-m and USB2 sticks by default
+        :param kwargs: NodePool arguments
+        """
+        from libAnt.drivers.usb import USBDriver, find_devices
+        drivers = [USBDriver(*device) for device in find_devices(vid, pids)]
+        if not drivers:
+            raise DriverException("Could not find any ANT device")
+        return cls(drivers, **kwargs)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def channels(self) -> list:
+        """ Channels opened on every stick """
+        return [channel for node in self.nodes
+                for channel in node.channels if channel is not None]
+
+    @property
+    def max_channels(self) -> int:
+        return sum(node.max_channels for node in self.nodes)
+
+    def start(self, onSuccess=None, onFailure=None):
+        """
+        Start a node on every stick. A stick failing to start is reported
+        and left out of the pool.
+
+        :return: True if at least one node started
+        """
+        if onSuccess:
+            self.onSuccess = onSuccess
+        if onFailure:
+            self.onFailure = onFailure
+        for node in self._all:
+            if node in self.nodes:
+                continue
+            try:
+                node.start()
+                node.enable_extended_messages()
+            except Exception as e:
+                node.stop()
+                self._failure(e)
+            else:
+                self.nodes.append(node)
+        return bool(self.nodes)
+
+    def stop(self):
+        for node in self.nodes:
+            node.stop()
+        self.nodes = []
+        self._owners.clear()
+        return True
+
+    def open_channel(self, wait=True, **kwargs):
+        """
+        Configure and open a channel on the least loaded stick
+
+        :param wait: block until the first message arrives or the search
+                     times out, see Node.open_channel
+        :param kwargs: Node.open_channel arguments, except channel_num
+        :return: the Channel, None on failure
+        """
+        kwargs.pop('channel_num', None)
+        with self._placeLock:
+            node = self._least_loaded()
+            if node is None:
+                self._failure(ex.NoChannelAvailable())
+                return None
+            channel_num = node.channels.index(None)
+            if not node.open_channel(channel_num, wait=False, **kwargs):
+                return None
+            channel = node.channels[channel_num]
+            self._owners[channel] = node
+        if wait and not node.wait_for_channel(channel_num):
+            self._owners.pop(channel, None)
+            return None
+        return channel
+
+    def open_channels(self, settings: list) -> list:
+        """
+        Open several channels with overlapping searches
+
+        :param settings: one dict of open_channel arguments per channel
+        :return: open_channel result for each entry of settings
+        """
+        opened = [self.open_channel(wait=False, **kwargs) for kwargs in settings]
+        return [self.wait_for_channel(channel) if channel is not None else None
+                for channel in opened]
+
+    def wait_for_channel(self, channel: Channel):
+        """
+        Block until a channel opened with wait=False receives its first message
+
+        :return: the Channel, None if its search timed out
+        """
+        node = self._owners.get(channel)
+        if node is None or not node.wait_for_channel(channel.number):
+            self._owners.pop(channel, None)
+            return None
+        return channel
+
+    def close_channel(self, channel: Channel, timeout=False):
+        node = self._owners.pop(channel)
+        return node.close_channel(channel.number, timeout=timeout)
+
+    def node_of(self, channel: Channel) -> Node:
+        """ Node, hence stick, a channel was opened on """
+        return self._owners.get(channel)
+
+    def _least_loaded(self):
+        best = None
+        bestFree = 0
+        for node in self.nodes:
+            free = node.channels.count(None)
+            if free > bestFree:
+                best, bestFree = node, free
+        return best
+
+    def _success(self, msg):
+        if self.onSuccess:
+            with self._streamLock:
+                self.onSuccess(msg)
+
+    def _failure(self, e):
+        if self.onFailure:
+            with self._streamLock:
+                self.onFailure(e)
@@ -1,25 +1,44 @@
 from threading import Lock
 
-from libAnt.message import BroadcastMessage
-from libAnt.profiles.power_profile import PowerProfileMessage
-from libAnt.profiles.speed_cadence_profile import SpeedAndCadenceProfileMessage
-from libAnt.profiles.heartrate_profile import HeartRateProfileMessage
-from libAnt.profiles.fitness_equipment_profile import FitnessEquipmentProfileMessage
+from libAnt.message import BroadcastMessage, Gap
+# imported for the pages they register
+import libAnt.profiles.power_profile
+import libAnt.profiles.speed_cadence_profile
+import libAnt.profiles.heartrate_profile
+import libAnt.profiles.fitness_equipment_profile
+from libAnt.profiles import registry
+from libAnt.profiles.history import DeviceHistory
+from libAnt.profiles.profile import ProfileState
+from libAnt.sinks.sink import make_row
 
 
 class Factory:
-    types = {
-        120: HeartRateProfileMessage,
-        121: SpeedAndCadenceProfileMessage,
-        11: PowerProfileMessage,
-        17: FitnessEquipmentProfileMessage
-    }
+    """
+    Turns broadcast messages into profile messages
 
-    def __init__(self, callback=None):
+    The class decoding a message is looked up in the page registry by device
+    type and page number, messages of pages nobody registered are dropped.
+    """
+
+    def __init__(self, callback=None, capacity=1024, windows=(30, 180), circumference=2096,
+                 writer=None):
+        """
+        :param callback: called with every parsed profile message
+        :param capacity: maximum number of samples kept in the history of each device
+        :param windows: durations (s) of the rolling averages maintained for each device
+        :param circumference: circumference of the wheel (mm), for the recorded speed
+        :param writer: optional started SinkWriter receiving a row for every parsed message
+        """
         self._filter = None
         self._lock = Lock()
         self._messages = {}
+        self._states = {}
+        self._history = {}
         self._callback = callback
+        self._capacity = capacity
+        self._windows = windows
+        self._circumference = circumference
+        self._writer = writer
 
     def enableFilter(self):
         with self._lock:
@@ -48,30 +67,47 @@ class Factory:
                     del self._filter[deviceNumber]
 
     def parseMessage(self, msg: BroadcastMessage):
+        row = None
         with self._lock:
+            if isinstance(msg, Gap):
+                # counters rolled over an unknown number of times meanwhile
+                for state in self._states.values():
+                    state.gap()
+                return
             if self._filter is not None:
                 if msg.deviceNumber not in self._filter:
                     return
-            if msg.deviceType in Factory.types:
-                fid = open('test_output.txt','r+') #test file
+            type = msg.deviceType
+            cls = registry.lookup(type, msg.content[0])
+            if cls is not None:
                 num = msg.deviceNumber
-                type = msg.deviceType
-                if type == 11: # Quick patch to filter out power messages with non-power info
-                    if msg.content[0] != 16:
-                        return
-                if type == 17: 
-                    if msg.content[0] != 25: #filtering out factory data
-                        return
-                pmsg = self.types[type](msg, self._messages[(num, type)] if (num, type) in self._messages else None)
+                state = self._states.get((num, type))
+                if state is None:
+                    state = self._states[(num, type)] = ProfileState()
+                pmsg = cls(msg, state)
                 self._messages[(num, type)] = pmsg
-                #print("{printing pmsg: " + str(pmsg) + " }")
-                fid.write(str(pmsg))
-                fid.close()
-                #Can write power and speed data to external files from here
-                #also can probably send data to live graphing (3-5-21 edyas)
+                history = self._history.get((num, type))
+                if history is None:
+                    history = self._history[(num, type)] = DeviceHistory(self._capacity, self._windows)
+                record = pmsg.record(self._circumference)
+                history.append(pmsg.timestamp, **record)
+                if self._writer is not None:
+                    row = make_row(pmsg, num, type, record)
                 if callable(self._callback):
                     self._callback(pmsg)
+        if row is not None:
+            # outside the lock: a writer waiting for room only holds up this thread
+            self._writer.put(row)
+
+    def history(self, deviceNumber: int, deviceType: int):
+        """
+        :return: DeviceHistory of the device, None if nothing was received from it
+        """
+        with self._lock:
+            return self._history.get((deviceNumber, deviceType))
 
     def reset(self):
         with self._lock:
-            self._messages = {}
\ No newline at end of file
+            self._messages = {}
+            self._states = {}
+            self._history = {}
\ No newline at end of file
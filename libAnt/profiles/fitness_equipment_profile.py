@@ -4,7 +4,10 @@ from libAnt.core import lazyproperty
 import libAnt.message as m
 import libAnt.constants as c
 import libAnt.exceptions as e
-from datetime import datetime
+from libAnt.profiles.profile import ProfileMessage
+from libAnt.profiles.registry import register
+from math import pi
+from struct import Struct
 
 
 # %%FE-C Tx Messages
@@ -119,144 +122,180 @@ def set_grade(channel_num, grade=0, crr=0.004):
     return(grade_msg)
 
 
-class GeneralFEDataPage:
+@register(c.PROFILES['FE-C'], c.PAGE_GENERAL_FE_DATA)
+class GeneralFEDataPage(ProfileMessage):
     """ANT FE-C Section 8.5.2 (0x10)
 
     Main data page for all ANT+ fitness equipment devices
     """
 
-    def __init__(self, msg: m.BroadcastMessage):
-        self.msg = msg
-        if self.page_number != 0x10:
-            return ("Error: Unrecognized Page Type For FE Data Page!")
-        self.timestamp = datetime.now()
+    max_elapsed_time = 256
+    max_distance = 256
+
+    # page_number: Data Page Number
+    # equipment_type: Indicate equipment type
+    # elapsed_time: Accumulated time (0.25 s), rolls over at 64 s
+    # distance_traveled: Accumulated Distance (m), rolls over at 256 m
+    # speed: Instantaneous speed of unit (0.001 m/s)
+    # heart_rate: Instantaneous heart rate (bpm), 0xFF if invalid
+    # fe_state: capabilities (low nibble) and FE state (high nibble) bit fields
+    decoder = Struct('<BBBBHBB')
+    fields = ('page_number', 'equipment_type', 'elapsed_time', 'distance_traveled',
+              'speed', 'heart_rate', 'fe_state')
+
+    def __init__(self, msg: m.BroadcastMessage, prev=None):
+        super().__init__(msg, prev)
+        last = getattr(self.state, 'general_fe', None)
+        if last is None:
+            self.elapsed_time_diff = self.distance_diff = None
+        else:
+            elapsed_time, distance_traveled = last
+            self.elapsed_time_diff = (self.elapsed_time - elapsed_time) % self.max_elapsed_time
+            self.distance_diff = (self.distance_traveled - distance_traveled) % self.max_distance
+        self.state.general_fe = (self.elapsed_time, self.distance_traveled)
 
-    @lazyproperty
-    def page_number(self):
-        """
-        :return: Data Page Number (int)
-        """
-        return self.msg.content[0]
+    def record(self, circumference):
+        return {'speed': self.speed / 1000,
+                'heartrate': self.heart_rate if self.heart_rate not in (0, 0xFF) else None}
 
-    @lazyproperty
-    def equipment_type(self):
-        """
-        Indicate equipment type
-        """
-        return self.msg.content[1]
 
-    @lazyproperty
-    def elapsed_time(self):
-        """
-        Accumulated time in resolution
-        """
-        return self.msg.content[2]
+@register(c.PROFILES['FE-C'], c.PAGE_GENERAL_SETTINGS)
+class GeneralSettingsPage(ProfileMessage):
+    """ANT FE-C Section 8.5.3 (0x11)
 
-    @lazyproperty
-    def distance_traveled(self):
-        """Accumulated Distance """
-        return self.msg.content[3]
+    Settings of the fitness equipment
+    """
 
-    @lazyproperty
-    def speed(self):
-        """Instantaneous speed of unit"""
-        LSB = self.msg.content[4]
-        MSB = self.msg.content[5]
-        return (MSB << 8) | LSB
+    # page_number: Data Page Number
+    # cycle_length: length of one cycle, e.g. a stride or a wheel revolution (0.01 m)
+    # incline: signed incline (0.01 %), 0x7FFF if invalid
+    # resistance_level: percentage of the maximum resistance (0.5 %)
+    # fe_state: capabilities (low nibble) and FE state (high nibble) bit fields
+    decoder = Struct('<BxxBhBB')
+    fields = ('page_number', 'cycle_length', 'incline', 'resistance_level', 'fe_state')
 
 
-class TrainerDataPage:
-    # class TrainerDataPage(m.BroadcastMessage):
+@register(c.PROFILES['FE-C'], c.PAGE_TRAINER_DATA)
+class TrainerDataPage(ProfileMessage):
     """ANT FE-C Section 8.6.7 (0x19)
     Message from Specific Trainer / Stationary Bike """
 
     max_accumulated_power = 65536
     max_event = 256
 
-    def __init__(self, msg: m.BroadcastMessage, prev):
-        self.msg = msg
-        if self.page_number != 0x19:
-            return ("Error: Unrecognized Page Type!")
-        self.previous = prev
-        self.timestamp = datetime.now()
+    # page_number: Data Page Number
+    # event: incremented each time the information in the message is updated,
+    #     refers to updates of the Specific Trainer main data page (0x19)
+    # inst_cadence: pedaling cadence (RPM), an instantaneous value only
+    # accumulated_power: running sum of the instantaneous power data, incremented
+    #     at each update of the update event count, rolls over at 65.535kW
+    # inst_power: Instantaneous power (W), 12 bits; the high nibble of the second
+    #     byte holds the trainer status bit field
+    # flags: flags (low nibble) and FE state (high nibble) bit fields
+    decoder = Struct('<BBBHHB')
+    fields = ('page_number', 'event', 'inst_cadence', 'accumulated_power', 'inst_power', 'flags')
+
+    def __init__(self, msg: m.BroadcastMessage, prev=None):
+        # before the shared state of the device counts the message
+        if msg.content[0] != c.PAGE_TRAINER_DATA:
+            raise ValueError(f'Not a trainer data page: {msg.content[0]:#04x}')
+        super().__init__(msg, prev)
+        self.trainer_status = self.inst_power >> 12
+        self.inst_power &= 0x0FFF
+        last = getattr(self.state, 'trainer', None)
+        if last is None:
+            self.accumulated_pwr_diff = None
+            self.event_diff = None
+        else:
+            event, accumulated_power = last
+            # Modulo takes care of the rollover of both counters
+            self.accumulated_pwr_diff = (self.accumulated_power - accumulated_power) % self.max_accumulated_power
+            self.event_diff = (self.event - event) % self.max_event
+        self.state.trainer = (self.event, self.accumulated_power)
 
     def __str__(self):
-        return super().__str__() + ' Power: {0:.0f}W'.format(self.average_power)
+        return super().__str__() + ' Power: {0:.0f}W'.format(self.avg_power)
 
-    @lazyproperty
-    def page_number(self):
-        """
-        :return: Data Page Number (int)
-        """
-        return self.msg.content[0]
+    def record(self, circumference):
+        cadence = self.inst_cadence
+        return {'power': self.avg_power, 'cadence': cadence if cadence != 0xFF else None}
 
     @lazyproperty
-    def event(self):
+    def avg_power(self):
         """
-        The update event count field is incremented each time the information in the message is updated.
-        There are no invalid values for update event count.
-        The update event count in this message refers to updates of the Specific Trainer main data page (0x19)
-        :return: Power Event Count
+        Under normal conditions with complete RF reception, average power equals instantaneous power.
+        In conditions where packets are lost, average power accurately calculates power over the interval
+        between the received messages
+        :return: Average power (Watts)
         """
-        return self.msg.content[1]
+        if not self.event_diff:
+            return self.inst_power
+        return self.accumulated_pwr_diff / self.event_diff
 
-    @lazyproperty
-    def inst_cadence(self):
-        """
-        The instantaneous cadence field is used to transmit the pedaling cadence recorded from the power sensor.
-        This field is an instantaneous value only; it does not accumulate between messages.
-        :return: Instantaneous Cadence (W)
-        """
-        return self.msg.content[2]
 
-    @lazyproperty
-    def accumulated_power(self):
-        """
-        Accumulated power is the running sum of the instantaneous power data and is incremented at each update
-        of the update event count. The accumulated power field rolls over at 65.535kW.
-        :return:
-        """
-        return (self.msg.content[4] << 8) | self.msg.content[3]
+class FitnessEquipmentProfileMessage(TrainerDataPage):
+    """ Message from Fitness Equipment, as produced by the Factory """
 
-    @lazyproperty
-    def inst_power(self):
-        """ Instantaneous power (W) """
-        LSB_bits = [int(y) for y in bin(self.msg.content[5])[2:].zfill(8)[-8:]]
-        MSN_bits = [int(y) for y in bin(self.msg.content[6])[2:].zfill(4)[-4:]]
-        LSB = m.bits_2_num(LSB_bits)
-        MSN = m.bits_2_num(MSN_bits)
-        return (MSN << 8) | LSB
 
-    @lazyproperty
-    def accumulated_pwr_diff(self):
-        if self.previous is None:
-            return None
-        elif self.accumulated_power < self.previous.accumulated_power:
-            # Rollover
-            return (self.accumulated_power - self.previous.accumulated_power) + self.max_accumulated_power
-        else:
-            return self.accumulated_power - self.previous.accumulated_power
+@register(c.PROFILES['FE-C'], c.PAGE_TRAINER_TORQUE_DATA)
+class TrainerTorqueDataPage(ProfileMessage):
+    """ANT FE-C Section 8.6.8 (0x1A)
+    Torque data of Specific Trainer / Stationary Bike """
 
-    @lazyproperty
-    def event_diff(self):
-        if self.previous is None:
-            return None
-        elif self.event < self.previous.event:
-            # Rollover
-            return (self.event - self.previous.event) + self.max_event
+    max_event = 256
+    max_wheel_ticks = 256
+    max_wheel_period = 65536
+    max_accumulated_torque = 65536
+
+    # page_number: Data Page Number
+    # event: incremented with each wheel revolution event
+    # wheel_ticks: wheel revolutions
+    # wheel_period: accumulated wheel period (1/2048 s)
+    # accumulated_torque: accumulated torque (1/32 Nm)
+    # fe_state: capabilities (low nibble) and FE state (high nibble) bit fields
+    decoder = Struct('<BBBHHB')
+    fields = ('page_number', 'event', 'wheel_ticks', 'wheel_period', 'accumulated_torque', 'fe_state')
+
+    def __init__(self, msg: m.BroadcastMessage, prev=None):
+        super().__init__(msg, prev)
+        last = getattr(self.state, 'trainer_torque', None)
+        if last is None:
+            self.event_diff = self.wheel_period_diff = self.accumulated_torque_diff = None
         else:
-            return self.event - self.previous.event
+            event, wheel_period, accumulated_torque = last
+            self.event_diff = (self.event - event) % self.max_event
+            self.wheel_period_diff = (self.wheel_period - wheel_period) % self.max_wheel_period
+            self.accumulated_torque_diff = (self.accumulated_torque - accumulated_torque) % self.max_accumulated_torque
+        self.state.trainer_torque = (self.event, self.wheel_period, self.accumulated_torque)
+
+    def record(self, circumference):
+        record = {'power': self.avg_power}
+        speed = self.speed(circumference)
+        if speed is not None:
+            record['speed'] = speed
+        return record
+
+    def speed(self, c):
+        """
+        :param c: circumference of the wheel (mm)
+        :return: average speed (m/s) since the last message, None if unknown
+        """
+        if self.event_diff is None:
+            return None
+        if not self.wheel_period_diff:
+            return 0
+        return self.event_diff * c / 1000 / (self.wheel_period_diff / 2048)
 
     @lazyproperty
     def avg_power(self):
         """
-        Under normal conditions with complete RF reception, average power equals instantaneous power.
-        In conditions where packets are lost, average power accurately calculates power over the interval
-        between the received messages
-        :return: Average power (Watts)
+        Power from the average torque and angular velocity of the wheel
+        :return: Average power (Watts), None if unknown
         """
-        if self.previous is None:
-            return self.inst_power
-        if self.event == self.previous.event:
-            return self.inst_power
-        return self.accumulated_pwr_diff / self.event_diff
+        if self.event_diff is None:
+            return None
+        if not self.event_diff or not self.wheel_period_diff:
+            return 0
+        torque = self.accumulated_torque_diff / (32 * self.event_diff)
+        angular_velocity = 2 * pi * self.event_diff / (self.wheel_period_diff / 2048)
+        return torque * angular_velocity
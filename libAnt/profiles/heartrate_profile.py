@@ -1,22 +1,24 @@
-from libAnt.core import lazyproperty
+from struct import Struct
+
+import libAnt.constants as c
 from libAnt.profiles.profile import ProfileMessage
+from libAnt.profiles.registry import register
 
 
+@register(c.PROFILES['HR'])
 class HeartRateProfileMessage(ProfileMessage):
     """ Message from Heart Rate Monitor """
 
+    # heartrate: Instantaneous heart rate. This value is intended to be displayed
+    #     by the display device without further interpretation. If Invalid set to 0x00
+    decoder = Struct('<7xB')
+    fields = ('heartrate',)
+
     def __init__(self, msg, previous):
         super().__init__(msg, previous)
 
     def __str__(self):
         return f'{self.heartrate}'
 
-    @lazyproperty
-    def heartrate(self):
-        """ 
-            Instantaneous heart rate. This value is
-            intended to be displayed by the display
-            device without further interpretation.
-            If Invalid set to 0x00 
-        """
-        return self.msg.content[7]
\ No newline at end of file
+    def record(self, circumference):
+        return {'heartrate': self.heartrate or None}
@@ -0,0 +1,175 @@
+from array import array
+from collections import deque
+from math import isnan, nan
+
+# Decoded fields recorded for every profile message
+FIELDS = ('power', 'cadence', 'speed', 'heartrate')
+
+# Normalized power is computed from the 30 s rolling average of power
+NP_WINDOW = 30
+
+
+class _Rolling:
+    """
+    Running sum, count and maximum of the samples of a ring that fall within
+    the last `duration` seconds
+
+    Samples are addressed by their sequence number in the ring. Every sample
+    enters and leaves exactly once, so each aggregate costs O(1) amortized
+    per sample and O(1) per query.
+    """
+
+    def __init__(self, duration: float, fields):
+        self.duration = duration
+        self.start = 0
+        self.sums = dict.fromkeys(fields, 0.0)
+        self.counts = dict.fromkeys(fields, 0)
+        self.maxima = {f: deque() for f in fields}
+
+    def add(self, seq: int, values: dict) -> None:
+        for f, v in values.items():
+            if isnan(v):
+                continue
+            self.sums[f] += v
+            self.counts[f] += 1
+            maxima = self.maxima[f]
+            while maxima and maxima[-1][1] <= v:
+                maxima.pop()
+            maxima.append((seq, v))
+
+    def remove(self, seq: int, values: dict) -> None:
+        for f, v in values.items():
+            if isnan(v):
+                continue
+            self.sums[f] -= v
+            self.counts[f] -= 1
+            maxima = self.maxima[f]
+            if maxima and maxima[0][0] == seq:
+                maxima.popleft()
+
+    def mean(self, field: str):
+        count = self.counts[field]
+        return self.sums[field] / count if count else None
+
+    def max(self, field: str):
+        maxima = self.maxima[field]
+        return maxima[0][1] if maxima else None
+
+
+class DeviceHistory:
+    """
+    Bounded history of the decoded fields of one device
+
+    Samples are stored in fixed size typed arrays used as a ring buffer, so a
+    device never holds more than `capacity` samples whatever the length of the
+    session. Missing fields are stored as NaN. Rolling mean, maximum and
+    normalized power are maintained incrementally for every configured window.
+    """
+
+    def __init__(self, capacity: int = 1024, windows=(30, 180)):
+        """
+        :param capacity: maximum number of samples kept
+        :param windows: durations (s) of the rolling windows to maintain
+        """
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        self.capacity = capacity
+        self._timestamps = array('d', bytes(8 * capacity))
+        self._columns = {f: array('d', bytes(8 * capacity)) for f in FIELDS}
+        # 30 s rolling average of power at every sample, the input of normalized power
+        self._np = array('d', bytes(8 * capacity))
+        self._seq = 0
+        self._np_window = _Rolling(NP_WINDOW, ('power',))
+        self._windows = {w: _Rolling(w, FIELDS + ('np4',)) for w in windows}
+
+    def __len__(self):
+        return min(self._seq, self.capacity)
+
+    def append(self, timestamp: float, power=None, cadence=None, speed=None, heartrate=None) -> None:
+        """ Record one sample, evicting the oldest one when the ring is full """
+        seq = self._seq
+        oldest = seq - self.capacity
+        # samples about to be overwritten leave every window first
+        for window in self._all_windows():
+            if window.start <= oldest:
+                self._evict(window, window.start)
+                window.start += 1
+
+        i = seq % self.capacity
+        values = {'power': power, 'cadence': cadence, 'speed': speed, 'heartrate': heartrate}
+        self._timestamps[i] = timestamp
+        for f, v in values.items():
+            v = nan if v is None else float(v)
+            values[f] = v
+            self._columns[f][i] = v
+        self._seq = seq + 1
+
+        self._advance(self._np_window, timestamp)
+        self._np_window.add(seq, {'power': values['power']})
+        power30 = self._np_window.mean('power')
+        self._np[i] = nan if power30 is None else power30
+
+        values['np4'] = self._np[i] ** 4
+        for window in self._windows.values():
+            self._advance(window, timestamp)
+            window.add(seq, values)
+
+    def mean(self, field: str, window: float):
+        """
+        :param field: one of FIELDS
+        :param window: duration (s), one of the configured windows
+        :return: mean of the field over the window, None if there are no samples
+        """
+        return self._window(window).mean(field)
+
+    def max(self, field: str, window: float):
+        """
+        :return: maximum of the field over the window, None if there are no samples
+        """
+        return self._window(window).max(field)
+
+    def normalizedPower(self, window: float):
+        """
+        Fourth root of the mean of the fourth power of the 30 s rolling average power
+
+        :return: Normalized power (Watts) over the window, None if there are no samples
+        """
+        np4 = self._window(window).mean('np4')
+        return np4 ** 0.25 if np4 is not None else None
+
+    def timestamps(self) -> array:
+        """ Timestamps of the retained samples, oldest first """
+        return self._ordered(self._timestamps)
+
+    def series(self, field: str) -> array:
+        """ Values of a field for the retained samples, oldest first """
+        return self._ordered(self._columns[field])
+
+    def _ordered(self, column: array) -> array:
+        if self._seq <= self.capacity:
+            return column[:self._seq]
+        i = self._seq % self.capacity
+        return column[i:] + column[:i]
+
+    def _window(self, duration: float) -> _Rolling:
+        try:
+            return self._windows[duration]
+        except KeyError:
+            raise ValueError('No rolling window of {}s, configured: {}'.format(
+                duration, sorted(self._windows))) from None
+
+    def _all_windows(self):
+        yield self._np_window
+        yield from self._windows.values()
+
+    def _advance(self, window: _Rolling, now: float) -> None:
+        horizon = now - window.duration
+        while window.start < self._seq - 1 and self._timestamps[window.start % self.capacity] < horizon:
+            self._evict(window, window.start)
+            window.start += 1
+
+    def _evict(self, window: _Rolling, seq: int) -> None:
+        i = seq % self.capacity
+        values = {f: c[i] for f, c in self._columns.items()}
+        values['np4'] = self._np[i] ** 4
+        window.remove(seq, {f: values[f] for f in window.sums})
@@ -1,86 +1,165 @@
+from math import pi
+from struct import Struct
+
+import libAnt.constants as c
 from libAnt.core import lazyproperty
 from libAnt.profiles.profile import ProfileMessage
+from libAnt.profiles.registry import register
 
 
+@register(c.PROFILES['PWR'], c.PAGE_POWER_ONLY)
 class PowerProfileMessage(ProfileMessage):
-    """ Message from Power Meter """
+    """ Message from Power Meter, standard Power-Only main data page (0x10) """
 
     maxAccumulatedPower = 65536
     maxEventCount = 256
 
+    # dataPageNumber: Data Page Number
+    # eventCount: incremented each time the information in the message is updated,
+    #     refers to updates of the standard Power-Only main data page (0x10)
+    # instantaneousCadence: pedaling cadence recorded from the power sensor (RPM),
+    #     an instantaneous value only, it does not accumulate between messages
+    # accumulatedPower: running sum of the instantaneous power data, incremented at
+    #     each update of the update event count, rolls over at 65.535kW
+    # instantaneousPower: Instantaneous power (W)
+    decoder = Struct('<BBxBHH')
+    fields = ('dataPageNumber', 'eventCount', 'instantaneousCadence', 'accumulatedPower', 'instantaneousPower')
+
+    def __init__(self, msg, previous):
+        super().__init__(msg, previous)
+        # the device state is shared by every page, this one only sees its own counters
+        last = getattr(self.state, 'powerOnly', None)
+        if last is None:
+            self.accumulatedPowerDiff = None
+            self.eventCountDiff = None
+        else:
+            eventCount, accumulatedPower = last
+            # Modulo takes care of the rollover of both counters
+            self.accumulatedPowerDiff = (self.accumulatedPower - accumulatedPower) % self.maxAccumulatedPower
+            self.eventCountDiff = (self.eventCount - eventCount) % self.maxEventCount
+        self.state.powerOnly = (self.eventCount, self.accumulatedPower)
+
     def __str__(self):
         return super().__str__() + ' Power: {0:.0f}W'.format(self.averagePower)
 
-    @lazyproperty
-    def dataPageNumber(self):
-        """
-        :return: Data Page Number (int)
-        """
-        return self.msg.content[0]
+    def record(self, circumference):
+        cadence = self.instantaneousCadence
+        return {'power': self.averagePower, 'cadence': cadence if cadence != 0xFF else None}
 
     @lazyproperty
-    def eventCount(self):
+    def averagePower(self):
         """
-        The update event count field is incremented each time the information in the message is updated.
-        There are no invalid values for update event count.
-        The update event count in this message refers to updates of the standard Power-Only main data page (0x10)
-        :return: Power Event Count
+        Under normal conditions with complete RF reception, average power equals instantaneous power.
+        In conditions where packets are lost, average power accurately calculates power over the interval
+        between the received messages
+        :return: Average power (Watts)
         """
-        return self.msg.content[1]
+        if not self.eventCountDiff:
+            return self.instantaneousPower
+        return self.accumulatedPowerDiff / self.eventCountDiff
 
-    @lazyproperty
-    def instantaneousCadence(self):
-        """
-        The instantaneous cadence field is used to transmit the pedaling cadence recorded from the power sensor.
-        This field is an instantaneous value only; it does not accumulate between messages.
-        :return: Instantaneous Cadence (W)
-        """
-        return self.msg.content[3]
 
-    @lazyproperty
-    def accumulatedPower(self):
-        """
-        Accumulated power is the running sum of the instantaneous power data and is incremented at each update
-        of the update event count. The accumulated power field rolls over at 65.535kW.
-        :return:
-        """
-        return (self.msg.content[5] << 8) | self.msg.content[4]
+class TorqueProfileMessage(ProfileMessage):
+    """
+    Common part of the torque data pages (0x11, 0x12)
 
-    @lazyproperty
-    def instantaneousPower(self):
-        """ Instantaneous power (W) """
-        return (self.msg.content[7] << 8) | self.msg.content[6]
+    Power is derived from the accumulated torque and the accumulated period of
+    the wheel or crank revolutions between two updates.
+    """
+
+    maxEventCount = 256
+    maxTicks = 256
+    maxPeriod = 65536
+    maxAccumulatedTorque = 65536
+
+    # eventCount: incremented with each torque update
+    # ticks: wheel or crank revolutions, incremented with each revolution
+    # instantaneousCadence: RPM, 0xFF if invalid
+    # period: accumulated time of the revolutions (1/2048 s)
+    # accumulatedTorque: accumulated torque (1/32 Nm)
+    decoder = Struct('<BBBBHH')
+    fields = ('dataPageNumber', 'eventCount', 'ticks', 'instantaneousCadence', 'period', 'accumulatedTorque')
+
+    def __init__(self, msg, previous):
+        super().__init__(msg, previous)
+        last = getattr(self.state, self.stateName, None)
+        if last is None:
+            self.eventCountDiff = self.ticksDiff = self.periodDiff = self.accumulatedTorqueDiff = None
+        else:
+            eventCount, ticks, period, accumulatedTorque = last
+            self.eventCountDiff = (self.eventCount - eventCount) % self.maxEventCount
+            self.ticksDiff = (self.ticks - ticks) % self.maxTicks
+            self.periodDiff = (self.period - period) % self.maxPeriod
+            self.accumulatedTorqueDiff = (self.accumulatedTorque - accumulatedTorque) % self.maxAccumulatedTorque
+        setattr(self.state, self.stateName, (self.eventCount, self.ticks, self.period, self.accumulatedTorque))
+
+    def __str__(self):
+        return super().__str__() + ' Power: {0:.0f}W'.format(self.averagePower or 0)
+
+    def record(self, circumference):
+        cadence = self.instantaneousCadence
+        return {'power': self.averagePower, 'cadence': cadence if cadence != 0xFF else None}
 
     @lazyproperty
-    def accumulatedPowerDiff(self):
-        if self.previous is None:
+    def averageAngularVelocity(self):
+        """ :return: rad/s over the interval between the received messages, None if unknown """
+        if not self.eventCountDiff or not self.periodDiff:
             return None
-        elif self.accumulatedPower < self.previous.accumulatedPower:
-            # Rollover
-            return (self.accumulatedPower - self.previous.accumulatedPower) + self.maxAccumulatedPower
-        else:
-            return self.accumulatedPower - self.previous.accumulatedPower
+        return 2 * pi * self.eventCountDiff / (self.periodDiff / 2048)
 
     @lazyproperty
-    def eventCountDiff(self):
-        if self.previous is None:
+    def averageTorque(self):
+        """ :return: Nm over the interval between the received messages, None if unknown """
+        if not self.eventCountDiff:
             return None
-        elif self.eventCount < self.previous.eventCount:
-            # Rollover
-            return (self.eventCount - self.previous.eventCount) + self.maxEventCount
-        else:
-            return self.eventCount - self.previous.eventCount
+        return self.accumulatedTorqueDiff / (32 * self.eventCountDiff)
 
     @lazyproperty
     def averagePower(self):
         """
-        Under normal conditions with complete RF reception, average power equals instantaneous power.
-        In conditions where packets are lost, average power accurately calculates power over the interval
-        between the received messages
-        :return: Average power (Watts)
+        :return: Average power (Watts), 0 when the wheel or crank stopped, None if unknown
         """
-        if self.previous is None:
-            return self.instantaneousPower
-        if self.eventCount == self.previous.eventCount:
-            return self.instantaneousPower
-        return self.accumulatedPowerDiff / self.eventCountDiff
+        if self.eventCountDiff == 0:
+            return 0
+        if self.averageAngularVelocity is None:
+            return None
+        return self.averageTorque * self.averageAngularVelocity
+
+
+@register(c.PROFILES['PWR'], c.PAGE_WHEEL_TORQUE)
+class WheelTorqueProfileMessage(TorqueProfileMessage):
+    """ Message from Power Meter, standard wheel torque main data page (0x11) """
+
+    stateName = 'wheelTorque'
+
+    def record(self, circumference):
+        record = super().record(circumference)
+        speed = self.speed(circumference)
+        if speed is not None:
+            record['speed'] = speed
+        return record
+
+    def speed(self, c):
+        """
+        :param c: circumference of the wheel (mm)
+        :return: average speed (m/s) since the last message, None if unknown
+        """
+        if self.eventCountDiff is None:
+            return None
+        if not self.periodDiff:
+            return 0
+        return self.eventCountDiff * c / 1000 / (self.periodDiff / 2048)
+
+
+@register(c.PROFILES['PWR'], c.PAGE_CRANK_TORQUE)
+class CrankTorqueProfileMessage(TorqueProfileMessage):
+    """ Message from Power Meter, standard crank torque main data page (0x12) """
+
+    stateName = 'crankTorque'
+
+    @lazyproperty
+    def averageCadence(self):
+        """ :return: RPM over the interval between the received messages, None if unknown """
+        if not self.eventCountDiff or not self.periodDiff:
+            return None
+        return 60 * self.eventCountDiff / (self.periodDiff / 2048)
@@ -1,22 +1,74 @@
-from copy import deepcopy
-
 import time
 
 from libAnt.message import BroadcastMessage
 
 
+class ProfileState:
+    """
+    Running state of one device, carried from one profile message to the next
+
+    Profiles store the values of the last message that rollover and difference
+    computations need here, instead of keeping a reference to the previous
+    message (and through it, to the whole history of the device).
+    """
+
+    # Attributes which survive a gap
+    kept = ('count', 'firstTimestamp', 'totalRevolutions', 'totalSpeedRevolutions')
+
+    def __init__(self):
+        self.count = 0
+        self.firstTimestamp = None
+
+    def gap(self):
+        """
+        Forget the counters of the last message after messages were lost,
+        rollovers can no longer be told from the counter values. Counts and
+        totals are kept.
+        """
+        for name in [name for name in vars(self) if name not in self.kept]:
+            delattr(self, name)
+
+
 class ProfileMessage:
+    # struct.Struct unpacking the fields of the 8 byte payload in one call,
+    # and the attribute names the values are stored under
+    decoder = None
+    fields = ()
+
     def __init__(self, msg, previous):
-        self.previous = previous
-        self.msg = deepcopy(msg)
-        self.count = previous.count + 1 if previous is not None else 1
-        self.timestamp = time.time()
-        self.firstTimestamp = previous.firstTimestamp if previous is not None else self.timestamp
+        """
+        :param msg: the broadcast message, shared rather than copied
+        :param previous: ProfileState of the device, or the previous profile
+                         message of the device, or None for the first message
+        """
+        if self.decoder is not None:
+            self.__dict__.update(zip(self.fields, self.decoder.unpack(msg.content)))
+        if isinstance(previous, ProfileMessage):
+            previous = previous.state
+        state = previous if previous is not None else ProfileState()
+        self.msg = msg
+        self.state = state
+        # capture time of replayed messages, so rates and averages match the recording
+        self.timestamp = msg.timestamp if msg.timestamp is not None else time.time()
+        # Whether this is the first message seen from the device
+        self.first = state.count == 0
+        state.count += 1
+        self.count = state.count
+        if state.firstTimestamp is None:
+            state.firstTimestamp = self.timestamp
+        self.firstTimestamp = state.firstTimestamp
 
     def __str__(self):
         return str(self.msg.deviceNumber)
 
+    def record(self, circumference):
+        """
+        :param circumference: circumference of the wheel (mm), for speed
+        :return: dict of the decoded fields kept in the device history
+        """
+        return {}
+
     @staticmethod
     def decode(cls, msg: BroadcastMessage):
         if msg.deviceType in cls.match:
-            cls.match[msg.deviceType]()
\ No newline at end of file
+            cls.match[msg.deviceType]()
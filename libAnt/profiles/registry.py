@@ -0,0 +1,43 @@
+"""
+Registry of the profile message classes decoding each ANT+ data page
+
+Classes are registered under (device type, page number). A page number of
+None registers a class for every page of a device type, for profiles
+without a page byte (speed & cadence) or whose fields are the same on all
+pages (heart rate). Profiles register their pages when their module is
+imported, so new pages can be added without editing the Factory:
+
+    @register(11, 0x20)
+    class CrankTorqueFrequencyMessage(ProfileMessage):
+        ...
+"""
+
+_pages = {}
+
+
+def register(device_type: int, page_number: int = None):
+    """ Class decorator registering a ProfileMessage subclass for a data page """
+    def wrap(cls):
+        _pages[(device_type, page_number)] = cls
+        return cls
+    return wrap
+
+
+def unregister(device_type: int, page_number: int = None) -> None:
+    _pages.pop((device_type, page_number), None)
+
+
+def lookup(device_type: int, page_number: int):
+    """
+    :return: the class registered for the page, or for every page of the
+             device type, None if the page is not decoded
+    """
+    cls = _pages.get((device_type, page_number))
+    if cls is None:
+        cls = _pages.get((device_type, None))
+    return cls
+
+
+def device_types() -> set:
+    """ Device types for which at least one page is registered """
+    return {device_type for device_type, _ in _pages}
@@ -1,27 +1,78 @@
+from struct import Struct
+
 from libAnt.core import lazyproperty
 from libAnt.profiles.profile import ProfileMessage
+from libAnt.profiles.registry import register
 
 
+@register(121)
 class SpeedAndCadenceProfileMessage(ProfileMessage):
     """ Message from Speed & Cadence sensor """
 
+    # cadenceEventTime: time of the last valid bike cadence event (1/1024 sec)
+    # cumulativeCadenceRevolutionCount: total number of pedal revolutions
+    # speedEventTime: time of the last valid bike speed event (1/1024 sec)
+    # cumulativeSpeedRevolutionCount: total number of wheel revolutions
+    decoder = Struct('<HHHH')
+    fields = ('cadenceEventTime', 'cumulativeCadenceRevolutionCount',
+              'speedEventTime', 'cumulativeSpeedRevolutionCount')
+
     def __init__(self, msg, previous):
         super().__init__(msg, previous)
-        self.staleSpeedCounter = previous.staleSpeedCounter if previous is not None else 0
-        self.staleCadenceCounter = previous.staleCadenceCounter if previous is not None else 0
-        self.totalRevolutions = previous.totalRevolutions + self.cadenceRevCountDiff if previous is not None else 0
-        self.totalSpeedRevolutions = previous.totalSpeedRevolutions + self.speedRevCountDiff if previous is not None else 0
-
-        if self.previous is not None:
-            if self.speedEventTime == self.previous.speedEventTime:
-                self.staleSpeedCounter += 1
+        state = self.state
+        # no counters to compare to on the first message, or after a gap
+        if self.first or not hasattr(state, 'speedEventTime'):
+            self.speedEventTimeDiff = 0
+            self.cadenceEventTimeDiff = 0
+            self.speedRevCountDiff = 0
+            self.cadenceRevCountDiff = 0
+            self.staleSpeedCounter = 0
+            self.staleCadenceCounter = 0
+            self.totalRevolutions = getattr(state, 'totalRevolutions', 0)
+            self.totalSpeedRevolutions = getattr(state, 'totalSpeedRevolutions', 0)
+            # (revolutions, event time) of the last speed update, None for no speed
+            self._speedDiff = None
+            self.cadence = 0
+        else:
+            # Modulo takes care of the rollover of the counters
+            self.speedEventTimeDiff = (self.speedEventTime - state.speedEventTime) % self.maxSpeedEventTime
+            self.cadenceEventTimeDiff = (self.cadenceEventTime - state.cadenceEventTime) % self.maxCadenceEventTime
+            self.speedRevCountDiff = ((self.cumulativeSpeedRevolutionCount - state.cumulativeSpeedRevolutionCount)
+                                      % self.maxSpeedRevCount)
+            self.cadenceRevCountDiff = ((self.cumulativeCadenceRevolutionCount - state.cumulativeCadenceRevolutionCount)
+                                        % self.maxCadenceRevCount)
+            self.totalRevolutions = state.totalRevolutions + self.cadenceRevCountDiff
+            self.totalSpeedRevolutions = state.totalSpeedRevolutions + self.speedRevCountDiff
+
+            if self.speedEventTime == state.speedEventTime:
+                # No new event, keep reporting the last speed for a while
+                self.staleSpeedCounter = state.staleSpeedCounter + 1
+                self._speedDiff = state.speedDiff if self.staleSpeedCounter <= self.maxstaleSpeedCounter else None
             else:
                 self.staleSpeedCounter = 0
+                self._speedDiff = (self.speedRevCountDiff, self.speedEventTimeDiff)
 
-            if self.cadenceEventTime == self.previous.cadenceEventTime:
-                self.staleCadenceCounter += 1
+            if self.cadenceEventTime == state.cadenceEventTime:
+                self.staleCadenceCounter = state.staleCadenceCounter + 1
+                self.cadence = state.cadence if self.staleCadenceCounter <= self.maxstaleCadenceCounter else 0
             else:
                 self.staleCadenceCounter = 0
+                self.cadence = self.cadenceRevCountDiff * 1024 * 60 / self.cadenceEventTimeDiff
+
+        state.speedEventTime = self.speedEventTime
+        state.cadenceEventTime = self.cadenceEventTime
+        state.cumulativeSpeedRevolutionCount = self.cumulativeSpeedRevolutionCount
+        state.cumulativeCadenceRevolutionCount = self.cumulativeCadenceRevolutionCount
+        state.staleSpeedCounter = self.staleSpeedCounter
+        state.staleCadenceCounter = self.staleCadenceCounter
+        state.totalRevolutions = self.totalRevolutions
+        state.totalSpeedRevolutions = self.totalSpeedRevolutions
+        # speed and cadence only change when an update is not stale, so the
+        # values carried over already account for the stale messages
+        if self.staleSpeedCounter == 0:
+            state.speedDiff = self._speedDiff
+        if self.staleCadenceCounter == 0:
+            state.cadence = self.cadence
 
     maxCadenceEventTime = 65536
     maxSpeedEventTime = 65536
@@ -38,80 +89,18 @@ class SpeedAndCadenceProfileMessage(ProfileMessage):
         ret += '{} Total Revolutions: {:d}'.format(super().__str__(), self.totalRevolutions)
         return ret
 
-    @lazyproperty
-    def cadenceEventTime(self):
-        """ Represents the time of the last valid bike cadence event (1/1024 sec) """
-        return (self.msg.content[1] << 8) | self.msg.content[0]
-
-    @lazyproperty
-    def cumulativeCadenceRevolutionCount(self):
-        """ Represents the total number of pedal revolutions """
-        return (self.msg.content[3] << 8) | self.msg.content[2]
-
-    @lazyproperty
-    def speedEventTime(self):
-        """ Represents the time of the last valid bike speed event (1/1024 sec) """
-        return (self.msg.content[5] << 8) | self.msg.content[4]
-
-    @lazyproperty
-    def cumulativeSpeedRevolutionCount(self):
-        """ Represents the total number of wheel revolutions """
-        return (self.msg.content[7] << 8) | self.msg.content[6]
-
-    @lazyproperty
-    def speedEventTimeDiff(self):
-        if self.previous is None:
-            return 0
-        elif self.speedEventTime < self.previous.speedEventTime:
-            # Rollover
-            return (self.speedEventTime - self.previous.speedEventTime) + self.maxSpeedEventTime
-        else:
-            return self.speedEventTime - self.previous.speedEventTime
-
-    @lazyproperty
-    def cadenceEventTimeDiff(self):
-        if self.previous is None:
-            return 0
-        elif self.cadenceEventTime < self.previous.cadenceEventTime:
-            # Rollover
-            return (self.cadenceEventTime - self.previous.cadenceEventTime) + self.maxCadenceEventTime
-        else:
-            return self.cadenceEventTime - self.previous.cadenceEventTime
-
-    @lazyproperty
-    def speedRevCountDiff(self):
-        if self.previous is None:
-            return 0
-        elif self.cumulativeSpeedRevolutionCount < self.previous.cumulativeSpeedRevolutionCount:
-            # Rollover
-            return (
-                       self.cumulativeSpeedRevolutionCount - self.previous.cumulativeSpeedRevolutionCount) + self.maxSpeedRevCount
-        else:
-            return self.cumulativeSpeedRevolutionCount - self.previous.cumulativeSpeedRevolutionCount
-
-    @lazyproperty
-    def cadenceRevCountDiff(self):
-        if self.previous is None:
-            return 0
-        elif self.cumulativeCadenceRevolutionCount < self.previous.cumulativeCadenceRevolutionCount:
-            # Rollover
-            return (
-                       self.cumulativeCadenceRevolutionCount - self.previous.cumulativeCadenceRevolutionCount) + self.maxCadenceRevCount
-        else:
-            return self.cumulativeCadenceRevolutionCount - self.previous.cumulativeCadenceRevolutionCount
+    def record(self, circumference):
+        return {'speed': self.speed(circumference), 'cadence': self.cadence}
 
     def speed(self, c):
         """
         :param c: circumference of the wheel (mm)
         :return: The current speed (m/sec)
         """
-        if self.previous is None:
+        if self._speedDiff is None:
             return 0
-        if self.speedEventTime == self.previous.speedEventTime:
-            if self.staleSpeedCounter > self.maxstaleSpeedCounter:
-                return 0
-            return self.previous.speed(c)
-        return self.speedRevCountDiff * 1.024 * c / self.speedEventTimeDiff
+        revolutions, eventTime = self._speedDiff
+        return revolutions * 1.024 * c / eventTime
 
     def distance(self, c):
         """
@@ -127,19 +116,6 @@ class SpeedAndCadenceProfileMessage(ProfileMessage):
         """
         return self.totalSpeedRevolutions * c / 1000
 
-    @lazyproperty
-    def cadence(self):
-        """
-        :return: RPM
-        """
-        if self.previous is None:
-            return 0
-        if self.cadenceEventTime == self.previous.cadenceEventTime:
-            if self.staleCadenceCounter > self.maxstaleCadenceCounter:
-                return 0
-            return self.previous.cadence
-        return self.cadenceRevCountDiff * 1024 * 60 / self.cadenceEventTimeDiff
-
     @lazyproperty
     def averageCadence(self):
         """
@@ -0,0 +1,218 @@
+"""
+Order in which queued messages are written to the device
+
+Config and control messages go out first, in the order they were queued,
+before any data message. Data messages (broadcast, acknowledged and burst)
+are paced per channel: the device transmits them in the channel's radio
+slot, once per channel period, so a channel is only handed its next message
+once the device reported the previous one sent, or once its slots passed
+without a report. Channels with data waiting take turns, the one served
+longest ago first.
+
+Data waiting for a channel is kept per data page. A newer message replaces
+the one still waiting with the same page, e.g. only the latest grade is sent
+to a trainer, and the future of the replaced message is resolved with False.
+"""
+import time
+from collections import OrderedDict, deque
+from threading import Lock
+
+import libAnt.constants as c
+
+CONFIG = 0
+CONTROL = 1
+DATA = 2
+
+# Channel period assumed until a ChannelMessagingPeriodMessage is sent (4 Hz)
+DEFAULT_PERIOD = 8192 / 32768
+
+
+def data_key(msg):
+    """ Key of the data messages superseding each other: type and data page """
+    return msg.type, msg.content[1] if len(msg.content) > 1 else None
+
+
+def _resolve(future, result):
+    if future is not None and not future.done():
+        future.set_result(result)
+
+
+class ChannelSchedule:
+    """Data waiting for one channel and the transfer in progress"""
+
+    __slots__ = ('period', 'pending', 'type', 'future', 'busy_until', 'served')
+
+    def __init__(self, period=DEFAULT_PERIOD):
+        self.period = period
+        # data_key -> (msg, future), in the order they were first queued
+        self.pending = OrderedDict()
+        # Type and future of the message being transmitted, type is None
+        # when the channel is free
+        self.type = None
+        self.future = None
+        self.busy_until = 0.0
+        self.served = 0.0
+
+
+class TxScheduler:
+    """
+    Priority queue of the messages waiting to be written
+
+    Thread safe: messages are queued and taken from the transmit thread while
+    transfer reports arrive on the receive thread.
+
+    Attributes
+    ----------
+    slots : int
+        Channel periods after which a transfer the device never reported on
+        is given up, and the channel freed
+    """
+
+    slots = 2
+
+    def __init__(self):
+        self._lock = Lock()
+        self._config = deque()
+        self._control = deque()
+        self._channels = {}
+
+    def __len__(self):
+        with self._lock:
+            return (len(self._config) + len(self._control)
+                    + sum(len(s.pending) for s in self._channels.values()))
+
+    def put(self, priority: int, msg, future=None) -> None:
+        """
+        Queue a message
+
+        :param priority: CONFIG, CONTROL or DATA
+        :param msg: message, or list of config messages written in one batch
+        :param future: for DATA only, resolved with True once the device
+                       reports the transfer, False if it failed, was
+                       superseded or dropped
+        """
+        superseded = None
+        with self._lock:
+            if priority == CONFIG:
+                self._config.append(msg)
+            elif priority == CONTROL:
+                self._control.append(msg)
+            else:
+                schedule = self._schedule(msg.content[0])
+                key = data_key(msg)
+                previous = schedule.pending.get(key)
+                if previous is not None:
+                    superseded = previous[1]
+                schedule.pending[key] = (msg, future)
+        _resolve(superseded, False)
+
+    def next(self, now=None):
+        """
+        Take the next message to write
+
+        :return: (message or None, time.monotonic() at which a channel busy
+                 with a transfer is freed, None if none is)
+        """
+        now = time.monotonic() if now is None else now
+        expired = []
+        msg = wake = None
+        with self._lock:
+            if self._config:
+                msg = self._config.popleft()
+            elif self._control:
+                msg = self._control.popleft()
+            else:
+                chosen = None
+                for schedule in self._channels.values():
+                    if not schedule.pending:
+                        continue
+                    if schedule.type is not None:
+                        if now < schedule.busy_until:
+                            wake = (schedule.busy_until if wake is None
+                                    else min(wake, schedule.busy_until))
+                            continue
+                        expired.append(schedule.future)
+                        schedule.type = schedule.future = None
+                    if chosen is None or schedule.served < chosen.served:
+                        chosen = schedule
+                if chosen is not None:
+                    _, (msg, future) = chosen.pending.popitem(last=False)
+                    chosen.type = msg.type
+                    chosen.future = future
+                    chosen.busy_until = now + chosen.period * self.slots
+                    chosen.served = now
+            if msg is not None:
+                expired.extend(self._written(msg))
+        for future in expired:
+            _resolve(future, False)
+        return msg, wake
+
+    def transmitted(self, channel: int, event: int) -> bool:
+        """
+        Report a channel event, freeing the channel once the device is done
+        with the data message it was given
+
+        :return: True if the channel was freed
+        """
+        with self._lock:
+            schedule = self._channels.get(channel)
+            if schedule is None or schedule.type is None:
+                return False
+            if schedule.type == c.MESSAGE_CHANNEL_BROADCAST_DATA:
+                # Broadcast data goes out in the next slot, unacknowledged
+                if event != c.EVENT_TX:
+                    return False
+                result = True
+            elif event == c.EVENT_TRANSFER_TX_COMPLETED:
+                result = True
+            elif event == c.EVENT_TRANSFER_TX_FAILED:
+                result = False
+            else:
+                return False
+            future = schedule.future
+            schedule.type = schedule.future = None
+        _resolve(future, result)
+        return True
+
+    def drain(self) -> list:
+        """
+        Remove every queued message, e.g. when the device goes away
+
+        :return: futures of the data messages which were never resolved
+        """
+        with self._lock:
+            self._config.clear()
+            self._control.clear()
+            futures = [f for s in self._channels.values()
+                       for f in self._forget(s)]
+        return [f for f in futures if f is not None and not f.done()]
+
+    def _schedule(self, channel: int) -> ChannelSchedule:
+        schedule = self._channels.get(channel)
+        if schedule is None:
+            schedule = self._channels[channel] = ChannelSchedule()
+        return schedule
+
+    def _forget(self, schedule: ChannelSchedule) -> list:
+        futures = [future for _, future in schedule.pending.values()]
+        futures.append(schedule.future)
+        schedule.pending.clear()
+        schedule.type = schedule.future = None
+        return futures
+
+    def _written(self, msg) -> list:
+        """ Follow the config the device is given, return the dropped futures """
+        dropped = []
+        for sent in (msg if isinstance(msg, list) else [msg]):
+            if sent.type == c.MESSAGE_CHANNEL_PERIOD:
+                period = int.from_bytes(sent.content[1:3], byteorder='little')
+                self._schedule(sent.content[0]).period = period / 32768
+            elif sent.type == c.MESSAGE_CHANNEL_UNASSIGN:
+                schedule = self._channels.pop(sent.content[0], None)
+                if schedule is not None:
+                    dropped.extend(self._forget(schedule))
+            elif sent.type == c.MESSAGE_SYSTEM_RESET:
+                for schedule in self._channels.values():
+                    dropped.extend(self._forget(schedule))
+                self._channels.clear()
+        return dropped
@@ -0,0 +1,445 @@
+"""
+One worker process per ANT stick
+
+In a single process the reader threads of every stick, their pumps and the
+code consuming the messages all share one GIL, and with enough sticks the
+readers fall behind. ProcessNodePool runs each stick's Driver and Node in a
+worker process of its own. The worker publishes the broadcasts it receives
+into a FrameRing, a ring buffer in shared memory, as raw frames the parent
+rebuilds without unpickling anything. Commands (opening a channel...) go
+to the worker through a pipe.
+"""
+import math
+import pickle
+import threading
+import multiprocessing
+from functools import partial
+from multiprocessing import shared_memory
+from struct import Struct
+
+import libAnt.constants as c
+import libAnt.message as m
+from libAnt.drivers.driver import DriverException
+from libAnt.node import Node
+from libAnt.pool import NodePool
+
+# Kinds of record
+FRAME = 0
+SUCCESS = 1
+FAILURE = 2
+_SKIP = 0xFF
+
+# write and read positions, each on a cache line of its own, dropped records
+_position = Struct('<Q')
+_WRITE = 0
+_DROPPED = 8
+_READ = 64
+_DATA = 128
+# payload length, kind, timestamp
+_record = Struct('<HBd')
+MAX_PAYLOAD = 0xFFFF
+
+
+class FrameRing:
+    """
+    Single producer, single consumer ring of records in shared memory
+
+    Records are written one after the other and never split across the end
+    of the buffer: when one does not fit before the end, the producer skips
+    to the start. Positions are byte counters which only grow, so the ring
+    is empty when they are equal. When the consumer falls a whole buffer
+    behind, new records are dropped and counted rather than blocking the
+    producer.
+    """
+
+    def __init__(self, size: int = 1024 * 1024, name: str = None, wake=None):
+        """
+        :param size: bytes of records, when creating the ring
+        :param name: shared memory block of an existing ring to attach to
+        :param wake: multiprocessing Event shared by both ends, set when the
+                     producer writes to an empty ring
+        """
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=_DATA + size)
+            self._owner = True
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            self._owner = False
+        self._buf = self._shm.buf
+        self._size = self._shm.size - _DATA
+        self._wake = wake if wake is not None else multiprocessing.Event()
+        if self._owner:
+            self._buf[:_DATA] = bytes(_DATA)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def wake(self):
+        return self._wake
+
+    @property
+    def dropped(self) -> int:
+        return _position.unpack_from(self._buf, _DROPPED)[0]
+
+    def close(self) -> None:
+        """ Detach from the ring, the creator also frees it """
+        self._buf = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def put(self, kind: int, timestamp: float, payload: bytes) -> bool:
+        """
+        Append a record, from the producer
+
+        :return: False if there was no room and the record was dropped
+        :raise ValueError: if the record could never fit
+        """
+        if len(payload) > MAX_PAYLOAD:
+            raise ValueError(f'Payload of {len(payload)} bytes, at most {MAX_PAYLOAD} fit in a record')
+        buf = self._buf
+        length = _record.size + len(payload)
+        if length > self._size:
+            raise ValueError(f'Record of {length} bytes larger than the ring ({self._size} bytes)')
+        write = start = _position.unpack_from(buf, _WRITE)[0]
+        read = _position.unpack_from(buf, _READ)[0]
+        offset = write % self._size
+        tail = self._size - offset
+        skip = tail if tail < length else 0
+        if self._size - (write - read) < length + skip:
+            _position.pack_into(buf, _DROPPED, self.dropped + 1)
+            return False
+        if skip:
+            if tail >= _record.size:
+                _record.pack_into(buf, _DATA + offset, 0, _SKIP, 0.0)
+            write += skip
+            offset = 0
+        _record.pack_into(buf, _DATA + offset, len(payload), kind, timestamp)
+        start_payload = _DATA + offset + _record.size
+        buf[start_payload:start_payload + len(payload)] = payload
+        _position.pack_into(buf, _WRITE, write + length)
+        if _position.unpack_from(buf, _READ)[0] == start:
+            # the consumer may be waiting
+            self._wake.set()
+        return True
+
+    def get_many(self, timeout=None) -> list:
+        """
+        Take every record written so far, from the consumer, waiting up to
+        timeout for one if the ring is empty
+
+        :return: list of (kind, timestamp, payload)
+        """
+        buf = self._buf
+        read = _position.unpack_from(buf, _READ)[0]
+        write = _position.unpack_from(buf, _WRITE)[0]
+        if read == write:
+            self._wake.clear()
+            write = _position.unpack_from(buf, _WRITE)[0]
+            if read == write:
+                self._wake.wait(timeout)
+                write = _position.unpack_from(buf, _WRITE)[0]
+        records = []
+        while read < write:
+            offset = read % self._size
+            tail = self._size - offset
+            if tail < _record.size:
+                read += tail
+                continue
+            length, kind, timestamp = _record.unpack_from(buf, _DATA + offset)
+            if kind == _SKIP:
+                read += tail
+                continue
+            start = _DATA + offset + _record.size
+            records.append((kind, timestamp, bytes(buf[start:start + length])))
+            read += _record.size + length
+        _position.pack_into(buf, _READ, read)
+        return records
+
+
+def _portable(obj):
+    """ obj pickled, or its repr when it can not make the trip """
+    try:
+        data = pickle.dumps(obj)
+        pickle.loads(data)
+    except Exception:
+        data = pickle.dumps(RuntimeError(repr(obj)))
+    if len(data) > MAX_PAYLOAD:
+        # the start of its text, cut in bytes on a character boundary
+        text = str(obj).encode('utf-8', 'backslashreplace')[:MAX_PAYLOAD // 2]
+        data = pickle.dumps(text.decode('utf-8', 'ignore'))
+    if len(data) > MAX_PAYLOAD:
+        data = pickle.dumps(RuntimeError('Result too large to be sent'))
+    return data
+
+
+def _producer(ring: FrameRing):
+    """
+    put of the ring, serialized: the RX and TX threads of the Node, its
+    reconnects and the command thread all publish records, and the ring
+    only has room for one producer
+    """
+    lock = threading.Lock()
+
+    def put(kind: int, timestamp: float, payload: bytes) -> bool:
+        with lock:
+            return ring.put(kind, timestamp, payload)
+
+    return put
+
+
+def _serve(driverFactory, ringName, wake, conn, nodeKwargs):
+    """ Body of the worker process: run a Node and answer the parent's commands """
+    ring = FrameRing(name=ringName, wake=wake)
+    put = _producer(ring)
+
+    def success(msg):
+        if isinstance(msg, m.BroadcastMessage):
+            ts = msg.timestamp if msg.timestamp is not None else math.nan
+            put(FRAME, ts, bytes(msg._raw))
+        else:
+            put(SUCCESS, math.nan, _portable(msg))
+
+    def failure(e):
+        put(FAILURE, math.nan, _portable(e))
+
+    node = error = None
+    try:
+        node = Node(driverFactory(), success, failure, **nodeKwargs)
+    except Exception as e:
+        error = e
+
+    while True:
+        try:
+            command = conn.recv()
+        except EOFError:
+            break
+        if command is None:
+            break
+        channel_num, name, args, kwargs = command
+        try:
+            if error is not None:
+                raise error
+            target = node if channel_num is None else node.channels[channel_num]
+            attr = getattr(target, name)
+            result = (True, attr(*args, **kwargs) if callable(attr) else attr)
+        except Exception as e:
+            result = (False, e)
+        try:
+            conn.send(result)
+        except Exception:
+            conn.send((False, RuntimeError(repr(result[1]))))
+
+    if node is not None:
+        node.stop()
+    ring.close()
+    conn.close()
+
+
+class RemoteChannel:
+    """Channel of a NodeProcess, forwarding to the Channel in the worker"""
+
+    def __init__(self, node, number: int):
+        self._node = node
+        self.number = number
+
+    def send(self, msg, timeout=None):
+        """ See Channel.send, always waits for the result """
+        return self._node.call('send', msg, timeout, channel_num=self.number)
+
+    def __getattr__(self, name):
+        # state, id, status... as they are in the worker
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self._node.call(name, channel_num=self.number)
+
+
+class NodeProcess:
+    """
+    Node running in a worker process
+
+    Takes the same arguments as Node except for the driver, replaced by a
+    callable creating it in the worker (the class of the driver, a partial
+    of it...), and offers the part of the Node interface NodePool uses.
+    Callbacks are called from a thread of the parent reading the ring.
+    """
+
+    ringSize = 1024 * 1024
+    readTimeout = 1
+
+    def __init__(self, driverFactory,
+                 onSuccess=None,
+                 onFailure=None,
+                 name: str = None,
+                 debug=False,
+                 timeout: float = 5,
+                 reconnect=False):
+        self._driverFactory = driverFactory
+        self.onSuccess = onSuccess
+        self.onFailure = onFailure
+        self._name = name
+        self._nodeKwargs = {'name': name, 'debug': debug, 'timeout': timeout,
+                            'reconnect': reconnect}
+        self._context = multiprocessing.get_context('spawn')
+        self._process = None
+        self._conn = None
+        self._callLock = threading.Lock()
+        self._ring = None
+        self._reader = None
+        self._stopper = threading.Event()
+        self.max_channels = 0
+        self.channels = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def dropped(self) -> int:
+        """ Records the worker dropped because the parent fell behind """
+        return self._ring.dropped if self._ring is not None else 0
+
+    def start(self, onSuccess=None, onFailure=None):
+        if self.isRunning():
+            return True
+        if onSuccess:
+            self.onSuccess = onSuccess
+        if onFailure:
+            self.onFailure = onFailure
+        ring = FrameRing(self.ringSize, wake=self._context.Event())
+        conn, child = self._context.Pipe()
+        process = self._context.Process(
+            target=_serve, name=self._name,
+            args=(self._driverFactory, ring.name, ring.wake, child, self._nodeKwargs),
+            daemon=True)
+        try:
+            process.start()
+        except Exception:
+            # e.g. the driver factory can not be pickled
+            conn.close()
+            ring.close()
+            raise
+        finally:
+            child.close()
+        self._ring, self._conn, self._process = ring, conn, process
+        self._stopper.clear()
+        self._reader = threading.Thread(target=self._read, name=f'{self._name or "NodeProcess"}-ring', daemon=True)
+        self._reader.start()
+        try:
+            self.call('start')
+            self.max_channels = self.call('max_channels')
+        except Exception:
+            self.stop()
+            raise
+        self.channels = [None] * self.max_channels
+        return True
+
+    def stop(self):
+        if self._process is None:
+            return True
+        try:
+            with self._callLock:
+                self._conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self._process.join()
+        self._process = None
+        self._conn.close()
+        self._stopper.set()
+        self._ring.wake.set()
+        self._reader.join()
+        self._ring.close()
+        self._ring = None
+        self.channels = [None] * self.max_channels
+        return True
+
+    def isRunning(self):
+        return self._process is not None and self._process.is_alive()
+
+    def call(self, name, *args, channel_num=None, **kwargs):
+        """
+        Call a method of the Node in the worker, or of one of its channels,
+        or read an attribute
+
+        :return: what it returned, exceptions are raised again here
+        """
+        with self._callLock:
+            if self._conn is None:
+                raise DriverException("Node stopped")
+            try:
+                self._conn.send((channel_num, name, args, kwargs))
+                ok, result = self._conn.recv()
+            except (EOFError, OSError) as e:
+                raise DriverException("Worker process stopped") from e
+        if not ok:
+            raise result
+        return result
+
+    def open_channel(self, channel_num: int = 0, wait=True, **kwargs):
+        opened = self.call('open_channel', channel_num, wait=wait, **kwargs)
+        if opened:
+            self.channels[channel_num] = RemoteChannel(self, channel_num)
+        return opened
+
+    def wait_for_channel(self, channel_num: int):
+        found = self.call('wait_for_channel', channel_num)
+        if not found:
+            self.channels[channel_num] = None
+        return found
+
+    def close_channel(self, channel_num, timeout=False):
+        closed = self.call('close_channel', channel_num, timeout=timeout)
+        self.channels[channel_num] = None
+        return closed
+
+    def send_tx_msg(self, msg):
+        return self.call('send_tx_msg', msg)
+
+    def enable_extended_messages(self, **kwargs):
+        return self.call('enable_extended_messages', **kwargs)
+
+    def _read(self):
+        ring = self._ring
+        while True:
+            records = ring.get_many(self.readTimeout)
+            if not records and self._stopper.is_set():
+                return
+            for kind, timestamp, payload in records:
+                if kind == FRAME:
+                    msg = m._rebuild_broadcast(payload, None if math.isnan(timestamp) else timestamp)
+                    if self.onSuccess:
+                        self.onSuccess(msg)
+                elif kind == SUCCESS:
+                    if self.onSuccess:
+                        self.onSuccess(pickle.loads(payload))
+                elif self.onFailure:
+                    self.onFailure(pickle.loads(payload))
+
+
+class ProcessNodePool(NodePool):
+    """
+    NodePool running every stick in a worker process, see NodeProcess
+
+    drivers are callables creating the Driver in the worker, they have to be
+    picklable, e.g. functools.partial(USBDriver, vid, pid, bus, address).
+    """
+
+    nodeClass = NodeProcess
+
+    @classmethod
+    def from_usb(cls, vid=c.USB_VENDOR_ID, pids=c.USB_PRODUCT_IDS, **kwargs):
+        from libAnt.drivers.usb import USBDriver, find_devices
+        drivers = [partial(USBDriver, *device) for device in find_devices(vid, pids)]
+        if not drivers:
+            raise DriverException("Could not find any ANT device")
+        return cls(drivers, **kwargs)
+
+    @property
+    def dropped(self) -> int:
+        """ Records dropped by the workers because the parent fell behind """
+        return sum(node.dropped for node in self.nodes)
@@ -0,0 +1 @@
+__all__ = ['sink', 'writer', 'csvsink', 'jsonl', 'columnar']
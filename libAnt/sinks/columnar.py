@@ -0,0 +1,68 @@
+import sys
+from array import array
+from math import nan
+from struct import Struct
+
+from libAnt.sinks.sink import Sink, COLUMNS
+
+# File header: magic, version, then the array typecode of every column
+MAGIC = b'LACF'
+VERSION = 1
+TYPECODES = 'dHB' + 'd' * (len(COLUMNS) - 3)
+
+_file_header = Struct('<4sBB')
+_block_header = Struct('<I')
+
+
+class ColumnarSink(Sink):
+    """
+    Binary columnar format
+
+    Every batch is written as a block: the number of rows followed by each
+    column as a little endian array, missing fields stored as NaN. Blocks can
+    be loaded straight into arrays with read_columnar.
+    """
+
+    def onOpen(self):
+        self._file.write(_file_header.pack(MAGIC, VERSION, len(COLUMNS)) + TYPECODES.encode())
+
+    def encodeRows(self, rows):
+        out = [_block_header.pack(len(rows))]
+        for i, typecode in enumerate(TYPECODES):
+            if typecode == 'd':
+                column = array(typecode, (nan if row[i] is None else row[i] for row in rows))
+            else:
+                column = array(typecode, (row[i] for row in rows))
+            if sys.byteorder != 'little':
+                column.byteswap()
+            out.append(column.tobytes())
+        return b''.join(out)
+
+
+def read_columnar(path: str) -> dict:
+    """
+    Load a file written by ColumnarSink
+
+    :return: dict mapping each column name to an array of all its values
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, count = _file_header.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('Not a columnar capture: {}'.format(path))
+    pos = _file_header.size
+    typecodes = data[pos:pos + count].decode()
+    pos += count
+    columns = {name: array(typecode) for name, typecode in zip(COLUMNS, typecodes)}
+    while pos < len(data):
+        rows, = _block_header.unpack_from(data, pos)
+        pos += _block_header.size
+        for name, typecode in zip(COLUMNS, typecodes):
+            column = array(typecode)
+            size = rows * column.itemsize
+            column.frombytes(data[pos:pos + size])
+            if sys.byteorder != 'little':
+                column.byteswap()
+            columns[name].extend(column)
+            pos += size
+    return columns
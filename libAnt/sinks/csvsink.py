@@ -0,0 +1,16 @@
+import csv
+import io
+
+from libAnt.sinks.sink import Sink, COLUMNS
+
+
+class CsvSink(Sink):
+    """ Comma separated values with a header line, missing fields are left empty """
+
+    def onOpen(self):
+        self._file.write(self.encodeRows([COLUMNS]))
+
+    def encodeRows(self, rows):
+        out = io.StringIO()
+        csv.writer(out, lineterminator='\n').writerows(rows)
+        return out.getvalue().encode()
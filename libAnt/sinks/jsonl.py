@@ -0,0 +1,10 @@
+import json
+
+from libAnt.sinks.sink import Sink, COLUMNS
+
+
+class JsonLinesSink(Sink):
+    """ One JSON object per line, missing fields are null """
+
+    def encodeRows(self, rows):
+        return ''.join(json.dumps(dict(zip(COLUMNS, row))) + '\n' for row in rows).encode()
@@ -0,0 +1,63 @@
+from abc import ABC, abstractmethod
+
+from libAnt.profiles.history import FIELDS
+
+# Columns of every row handed to a sink, the decoded fields may be None
+COLUMNS = ('timestamp', 'deviceNumber', 'deviceType') + FIELDS
+
+
+def make_row(pmsg, num: int, type: int, record: dict) -> tuple:
+    """
+    :param pmsg: the profile message
+    :param record: decoded fields of the message, as returned by ProfileMessage.record
+    :return: row in COLUMNS order
+    """
+    return (pmsg.timestamp, num, type) + tuple(record.get(f) for f in FIELDS)
+
+
+class Sink(ABC):
+    """
+    Destination of the rows produced by the Factory
+
+    Subclasses turn a batch of rows into bytes in encodeRows, and may write a
+    header and footer from the onOpen and beforeClose hooks.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._file = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open(self):
+        if self._file is not None:
+            self.close()
+        self._file = open(self._path, 'wb')
+        self.onOpen()
+
+    def close(self):
+        if self._file is not None:
+            self.beforeClose()
+            self._file.close()
+            self._file = None
+
+    def write(self, rows: list):
+        self._file.write(self.encodeRows(rows))
+
+    def flush(self):
+        self._file.flush()
+
+    def onOpen(self):
+        pass
+
+    def beforeClose(self):
+        pass
+
+    @abstractmethod
+    def encodeRows(self, rows: list) -> bytes:
+        pass
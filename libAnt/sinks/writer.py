@@ -0,0 +1,114 @@
+import time
+from queue import Queue, Empty, Full
+from threading import Thread
+
+# Marks the end of the rows in the queue
+_STOP = object()
+
+
+class SinkWriter:
+    """
+    Background thread writing rows to one or more sinks
+
+    Rows are collected into batches of up to batchSize, or whatever arrived
+    within flushInterval, and every sink is flushed at that interval. The
+    queue between the producer and the writer thread holds at most maxPending
+    rows: when it is full put() drops the row and counts it, so a slow disk
+    never stalls the receive thread, or with `block` waits for room
+    (backpressure on the producer).
+    """
+
+    def __init__(self, sinks: list, batchSize: int = 256, flushInterval: float = 1.0,
+                 maxPending: int = 10000, block: bool = False, onFailure=None):
+        """
+        :param sinks: Sink instances, opened and closed by the writer
+        :param batchSize: maximum number of rows written in one call
+        :param flushInterval: seconds between flushes of the sinks
+        :param maxPending: maximum number of rows waiting to be written
+        :param block: whether put() waits for room when maxPending is reached
+        :param onFailure: optional callable receiving exceptions raised by the sinks
+        """
+        self._sinks = list(sinks)
+        self._batchSize = batchSize
+        self._flushInterval = flushInterval
+        self._queue = Queue(maxsize=maxPending)
+        self._block = block
+        self._onFailure = onFailure
+        self._thread = None
+        self.dropped = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        if self._thread is None:
+            for sink in self._sinks:
+                sink.open()
+            self._thread = Thread(target=self._run, name='SinkWriter', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """ Write every pending row, then close the sinks """
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+            for sink in self._sinks:
+                sink.close()
+
+    def put(self, row: tuple):
+        if self._block:
+            self._queue.put(row)
+        else:
+            try:
+                self._queue.put_nowait(row)
+            except Full:
+                self.dropped += 1
+
+    def _run(self):
+        q = self._queue
+        batch = []
+        deadline = time.monotonic() + self._flushInterval
+        running = True
+        while running:
+            try:
+                row = q.get(timeout=max(0, deadline - time.monotonic()))
+            except Empty:
+                pass
+            else:
+                # take what is already queued without waiting again
+                while True:
+                    if row is _STOP:
+                        running = False
+                        break
+                    batch.append(row)
+                    if len(batch) >= self._batchSize:
+                        break
+                    try:
+                        row = q.get_nowait()
+                    except Empty:
+                        break
+
+            now = time.monotonic()
+            if len(batch) >= self._batchSize:
+                self._write(batch, flush=False)
+                batch = []
+            if now >= deadline or not running:
+                self._write(batch, flush=True)
+                batch = []
+                deadline = now + self._flushInterval
+
+    def _write(self, batch: list, flush: bool):
+        for sink in self._sinks:
+            try:
+                if batch:
+                    sink.write(batch)
+                if flush:
+                    sink.flush()
+            except Exception as e:
+                if callable(self._onFailure):
+                    self._onFailure(e)
@@ -4,7 +4,7 @@ from setuptools import setup
 
 setup(
     name='LibAnt',
-    packages=['libAnt', 'libAnt.profiles', 'libAnt.drivers', 'libAnt.loggers'],
+    packages=['libAnt', 'libAnt.profiles', 'libAnt.drivers', 'libAnt.loggers', 'libAnt.sinks'],
     version='0.1.4',
     description='Python Ant+ Lib',
     author='Benjamin Tamasi',
@@ -13,4 +13,5 @@ setup(
     download_url='https://github.com/half2me/libAnt/tarball/0.1.3',
     keywords = ['ant', 'antplus', 'ant+', 'antfs', 'thisisant'],
     install_requires=['pyusb>=1.0.0', 'pyserial>=3.1.1'],
+    extras_require={'analysis': ['numpy'], 'test': ['pytest', 'pyserial>=3.1.1', 'numpy']},
 )
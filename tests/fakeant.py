@@ -0,0 +1,179 @@
+"""
+Simulated ANT stick, answering the messages a Node sends the way a real
+device does, and a Driver talking to it
+"""
+import threading
+import time
+
+import libAnt.constants as c
+from libAnt.drivers.buffer import ChunkBuffer
+from libAnt.drivers.driver import Driver, DriverException
+from libAnt.message import Message
+
+
+def frame(type: int, content) -> bytes:
+    return Message(type, bytes(content)).encode()
+
+
+class FakeStick:
+    """
+    Device side: records every message written to it and replies to them,
+    open channels receive broadcasts from a trainer at hz, with its channel
+    id once enabled by a LibConfigMessage. Without a trainer in range
+    (present False) searches time out.
+    """
+
+    def __init__(self, max_channels=8, device_number=1234, device_type=17, tx_type=5, hz=20):
+        self.max_channels = max_channels
+        self.device_number = device_number
+        self.device_type = device_type
+        self.tx_type = tx_type
+        self.hz = hz
+        self.present = True
+        self.writes = []
+        self.libConfig = 0
+        self._open = {}
+        self._lock = threading.Lock()
+        self._out = None
+        self._stopper = threading.Event()
+
+    def attach(self, out) -> None:
+        """ Start answering, out is called with the bytes the device sends """
+        self._out = out
+        self._stopper.clear()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def detach(self) -> None:
+        self._stopper.set()
+
+    def handle(self, data: bytes) -> None:
+        """ Bytes written by the driver, one or more frames """
+        i = 0
+        while i < len(data):
+            length, type = data[i + 1], data[i + 2]
+            content = bytes(data[i + 3:i + 3 + length])
+            i += length + 4
+            self.writes.append((type, content))
+            self._respond(type, content)
+
+    def written(self, type: int) -> list:
+        """ Content of the messages of that type written so far """
+        return [content for t, content in self.writes if t == type]
+
+    def _event(self, channel: int, id: int, code: int = 0) -> None:
+        self._out(frame(c.MESSAGE_CHANNEL_EVENT, [channel, id, code]))
+
+    def _respond(self, type: int, content: bytes) -> None:
+        if type == c.MESSAGE_SYSTEM_RESET:
+            with self._lock:
+                self._open.clear()
+            self.libConfig = 0
+            self._out(frame(c.MESSAGE_STARTUP, [0x20]))
+        elif type == c.MESSAGE_CHANNEL_REQUEST:
+            channel, requested = content[0], content[1]
+            if requested == c.MESSAGE_CAPABILITIES:
+                self._out(frame(requested, [self.max_channels, 3, 0, 0, 0, 0]))
+            elif requested == c.MESSAGE_SERIAL_NUMBER:
+                self._out(frame(requested, [1, 2, 3, 4]))
+            elif requested == c.MESSAGE_CHANNEL_ID:
+                self._out(frame(requested, [channel, self.device_number & 0xFF, self.device_number >> 8,
+                                            self.device_type, self.tx_type]))
+            elif requested == c.MESSAGE_CHANNEL_STATUS:
+                self._out(frame(requested, [channel, 0x03]))
+        elif type == c.MESSAGE_CHANNEL_OPEN:
+            self._event(content[0], type)
+            if not self.present:
+                self._event(content[0], 1, c.EVENT_RX_SEARCH_TIMEOUT)
+                self._event(content[0], 1, c.EVENT_CHANNEL_CLOSED)
+                return
+            with self._lock:
+                self._open[content[0]] = True
+        elif type == c.MESSAGE_CHANNEL_CLOSE:
+            self._event(content[0], type)
+            with self._lock:
+                self._open.pop(content[0], None)
+            self._event(content[0], 1, c.EVENT_CHANNEL_CLOSED)
+        elif type == c.MESSAGE_LIB_CONFIG:
+            self.libConfig = content[1]
+            self._event(content[0], type)
+        elif type == c.MESSAGE_CHANNEL_ACKNOWLEDGED_DATA:
+            self._event(content[0], 1, c.EVENT_TRANSFER_TX_COMPLETED)
+        else:
+            self._event(content[0], type)
+
+    def _run(self) -> None:
+        n = 0
+        while not self._stopper.wait(1 / self.hz):
+            n += 1
+            with self._lock:
+                channels = list(self._open)
+            extended = []
+            if self.libConfig & c.EXT_FLAG_CHANNEL_ID:
+                extended = [c.EXT_FLAG_CHANNEL_ID, self.device_number & 0xFF, self.device_number >> 8,
+                            self.device_type, self.tx_type]
+            for channel in channels:
+                self._out(frame(c.MESSAGE_CHANNEL_BROADCAST_DATA,
+                                [channel, 0x19, n & 0xFF, 90, (n * 200) & 0xFF, (n * 200) >> 8 & 0xFF, 200, 0, 0x20]
+                                + extended))
+
+
+class FakeDriver(Driver):
+    """
+    Driver of a FakeStick, unplug() makes reads fail as they do when a
+    USB stick is pulled out, and the next `failures` opens fail too
+    """
+
+    def __init__(self, stick: FakeStick = None, logger=None):
+        super().__init__(logger=logger)
+        self.stick = stick if stick is not None else FakeStick()
+        self.failures = 0
+        self._buffer = ChunkBuffer()
+        self._opened = False
+
+    def unplug(self, failures: int = 0) -> None:
+        self.failures = failures
+        self._buffer.put(None)
+
+    def _isOpen(self) -> bool:
+        return self._opened
+
+    def _open(self) -> None:
+        if self.failures:
+            self.failures -= 1
+            raise DriverException("Could not open specified device")
+        self._buffer = ChunkBuffer()
+        self._opened = True
+        self.stick.attach(self._buffer.put)
+
+    def _close(self) -> None:
+        self._opened = False
+        self.stick.detach()
+
+    def _read(self, count: int, timeout=None) -> bytes:
+        raise NotImplementedError()
+
+    def _readChunk(self, timeout=None) -> bytes:
+        data = self._buffer.get(timeout=timeout)
+        if data is None:
+            self._close()
+            raise DriverException("Device is closed!")
+        return data
+
+    def _watch(self, callback) -> bool:
+        self._buffer.setListener(callback)
+        return True
+
+    def _write(self, data: bytes) -> None:
+        self.stick.handle(data)
+
+    def _abort(self) -> None:
+        pass
+
+
+def wait_until(predicate, timeout: float = 5) -> bool:
+    end = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.01)
+    return True
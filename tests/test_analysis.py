@@ -0,0 +1,86 @@
+import pytest
+
+import libAnt.constants as c
+from libAnt.loggers.pcap import pcap_global_header, pcap_packet_header
+from libAnt.message import Message
+
+np = pytest.importorskip('numpy')
+
+from libAnt.analysis import decode_frames, device_series, devices, load_pcap  # noqa: E402
+
+START = 1500000000.0
+
+
+def broadcast(page: list, device_number: int, device_type: int, channel: int = 0) -> bytes:
+    content = [channel] + page + [c.EXT_FLAG_CHANNEL_ID, device_number & 0xFF, device_number >> 8, device_type, 5]
+    return Message(c.MESSAGE_CHANNEL_BROADCAST_DATA, bytes(content)).encode()
+
+
+def trainer(n: int, power: int, acc: int) -> bytes:
+    return broadcast([c.PAGE_TRAINER_DATA, n, 90, acc & 0xFF, acc >> 8 & 0xFF, power, 0, 0x20], 1234, 17)
+
+
+def heart(n: int, bpm: int) -> bytes:
+    return broadcast([4, 0, 0, 0, 0, n, 0, bpm], 77, 0x78, channel=1)
+
+
+def corrupt(frame: bytes) -> bytes:
+    return frame[:-1] + bytes([frame[-1] ^ 0xFF])
+
+
+@pytest.fixture
+def capture(tmp_path):
+    packets = []
+    acc = 0
+    for n in range(1, 11):
+        acc += 150 + n
+        packets.append(trainer(n, 150 + n, acc))
+        packets.append(heart(n, 120 + n))
+    packets.insert(5, corrupt(trainer(99, 250, 0)))
+    # neither a broadcast nor long enough
+    packets.insert(0, Message(c.MESSAGE_CHANNEL_EVENT, bytes([0, 1, c.EVENT_TX])).encode())
+    path = tmp_path / 'a.pcap'
+    with open(path, 'wb') as f:
+        f.write(pcap_global_header())
+        for i, data in enumerate(packets):
+            f.write(pcap_packet_header(START + i * 0.25, len(data)) + data)
+    return str(path), packets
+
+
+def test_load_pcap_keeps_valid_broadcasts(capture):
+    path, packets = capture
+    frames = load_pcap(path)
+    assert len(frames) == 20
+    assert set(frames['channel']) == {0, 1}
+    assert (frames['flag'] == c.EXT_FLAG_CHANNEL_ID).all()
+    assert frames['timestamp'][0] == START + 0.25
+    trainers = frames[frames['device_type'] == 17]
+    assert (trainers['device_number'] == 1234).all() and (trainers['tx_type'] == 5).all()
+    assert list(trainers['payload'][:, 1]) == list(range(1, 11))
+
+
+def test_decode_frames_drops_bad_checksums():
+    packets = [trainer(1, 100, 100), corrupt(trainer(2, 100, 200)), heart(1, 60)]
+    data = b''.join(packets)
+    lengths = np.array([len(p) for p in packets], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    frames = decode_frames(data, offsets, lengths, np.array([1.0, 2.0, 3.0]))
+    assert list(frames['timestamp']) == [1.0, 3.0]
+    assert list(frames['device_number']) == [1234, 77]
+
+
+def test_devices(capture):
+    assert devices(load_pcap(capture[0])) == [(77, 0x78), (1234, 17)]
+
+
+def test_device_series(capture):
+    frames = load_pcap(capture[0])
+    series = device_series(frames, 1234, 17)
+    assert len(series) == 10
+    # the first from the instantaneous power, then from the accumulated power
+    assert list(series['power']) == [150.0 + n for n in range(1, 11)]
+    assert (series['cadence'] == 90).all()
+    assert np.isnan(series['heartrate']).all()
+    hr = device_series(frames, 77, 0x78)
+    assert list(hr['heartrate']) == [120.0 + n for n in range(1, 11)]
+    assert len(device_series(frames, 1, 17)) == 0
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+
+import libAnt.constants as c
+from libAnt.drivers.asyncdriver import AsyncDriver
+from libAnt.drivers.pcap import PcapDriver
+from libAnt.loggers.pcap import pcap_global_header, pcap_packet_header
+from libAnt.message import Message
+
+from fakeant import FakeDriver
+
+
+def frame(channel: int, n: int) -> bytes:
+    return Message(c.MESSAGE_CHANNEL_BROADCAST_DATA, bytes([channel, 0x10, n, 0, 0, 0, 0, 0, 0])).encode()
+
+
+def test_replayed_messages_keep_capture_time(tmp_path):
+    packets = [(1500000000.0 + i * 0.5, frame(0, i)) for i in range(20)]
+    path = tmp_path / 'a.pcap'
+    with open(path, 'wb') as f:
+        f.write(pcap_global_header())
+        for ts, data in packets:
+            f.write(pcap_packet_header(ts, len(data)) + data)
+
+    async def replay():
+        msgs = []
+        async with AsyncDriver(PcapDriver(str(path), speed=PcapDriver.REPLAY_MAX)) as driver:
+            while len(msgs) < len(packets):
+                msgs += await asyncio.wait_for(driver.read_many(), 5)
+        return msgs
+
+    msgs = asyncio.run(replay())
+    assert [(msg.timestamp, msg.content[2]) for msg in msgs] == [(ts, i) for i, (ts, _) in enumerate(packets)]
+
+
+class RecordingDriver(FakeDriver):
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def _write(self, data: bytes) -> None:
+        self.threads.append(threading.get_ident())
+        super()._write(data)
+
+
+def test_writes_run_off_the_event_loop_in_order():
+    driver = RecordingDriver()
+    msgs = [Message(c.MESSAGE_CHANNEL_OPEN, bytes([i])) for i in range(8)]
+
+    async def write():
+        async with AsyncDriver(driver) as front:
+            await asyncio.gather(*(front.write(msg) for msg in msgs[:4]))
+            await front.write_many(msgs[4:])
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(write())
+    assert driver.threads and loop_thread not in driver.threads
+    assert driver.stick.written(c.MESSAGE_CHANNEL_OPEN) == [bytes([i]) for i in range(8)]
@@ -0,0 +1,25 @@
+import asyncio
+
+import libAnt.constants as c
+from libAnt.asyncnode import AsyncNode
+
+from fakeant import FakeDriver
+
+
+def test_channel_released_after_search_timeout():
+    driver = FakeDriver()
+    driver.stick.present = False
+    failures = []
+
+    async def run():
+        async with AsyncNode(driver, onFailure=failures.append) as node:
+            assert not await node.open_channel(0, profile='FE-C')
+            assert node.channels[0] is None
+            driver.stick.present = True
+            assert await node.open_channel(0, profile='FE-C')
+            return node.channels[0].id
+
+    channel_id = asyncio.run(asyncio.wait_for(run(), 10))
+    assert channel_id['device_number'] == 1234
+    assert driver.stick.written(c.MESSAGE_CHANNEL_UNASSIGN) == [bytes([0])]
+    assert not any('already in use' in str(e) for e in failures)
@@ -0,0 +1,100 @@
+import os
+
+import pytest
+
+from libAnt.drivers.pcap import PcapReader
+from libAnt.loggers.compressed import (CompressedLogger, CompressedReader, compressed_to_pcap,
+                                       decodeBlock, encodeBlock, pcap_to_compressed, _footer,
+                                       _index_entry)
+from libAnt.loggers.pcap import pcap_global_header, pcap_packet_header
+
+PACKETS = [(1000.0 + i * 0.125, bytes([0xA4, 3, 0x4E, i & 0xFF, i >> 8, 0])) for i in range(500)]
+
+
+def write_capture(path, packets=PACKETS) -> str:
+    with open(path, 'wb') as f:
+        f.write(pcap_global_header())
+        for ts, data in packets:
+            f.write(pcap_packet_header(ts, len(data)) + data)
+    return str(path)
+
+
+def frames(reader) -> list:
+    return [(round(ts, 6), bytes(frame)) for ts, frame in reader]
+
+
+def test_block_round_trip():
+    records = [(1000000, b'\xA4\x01'), (1000250, b''), (1003000, b'\xA4' * 300)]
+    decoded = decodeBlock(encodeBlock(records), records[0][0])
+    assert [(ts, bytes(f)) for ts, f in decoded] == [(ts / 1000000, f) for ts, f in records]
+
+
+@pytest.mark.parametrize('codec', ['zlib', 'lzma'])
+def test_pcap_round_trip(tmp_path, codec):
+    src = write_capture(tmp_path / 'a.pcap')
+    compressed = str(tmp_path / 'a.lacz')
+    back = str(tmp_path / 'b.pcap')
+    assert pcap_to_compressed(src, compressed, codec=codec, blockSize=256) == len(PACKETS)
+    assert compressed_to_pcap(compressed, back) == len(PACKETS)
+    with PcapReader(src) as a, PcapReader(back) as b:
+        assert frames(a) == frames(b)
+    assert os.path.getsize(compressed) < os.path.getsize(src)
+
+
+def test_seek_and_slice_across_blocks(tmp_path):
+    compressed = str(tmp_path / 'a.lacz')
+    pcap_to_compressed(write_capture(tmp_path / 'a.pcap'), compressed, blockSize=256)
+    with CompressedReader(compressed) as reader:
+        assert len(reader._index) > 1
+        assert len(reader) == len(PACKETS)
+        assert (reader.startTime, reader.endTime) == (PACKETS[0][0], PACKETS[-1][0])
+        reader.seek(1030.0)
+        assert frames(reader) == [(round(ts, 6), f) for ts, f in PACKETS[240:]]
+        assert frames(reader.slice(1010.0, 1010.5)) == [(round(ts, 6), f) for ts, f in PACKETS[80:84]]
+
+
+def test_clock_stepping_back_stays_searchable(tmp_path):
+    # the clock steps back 20 s in the middle of the capture, across blocks
+    packets = PACKETS[:250] + [(ts - 20, f) for ts, f in PACKETS[250:]]
+    compressed = str(tmp_path / 'a.lacz')
+    pcap_to_compressed(write_capture(tmp_path / 'a.pcap', packets), compressed, blockSize=256)
+    with CompressedReader(compressed) as reader:
+        stored = frames(reader)
+        timestamps = [ts for ts, _ in stored]
+        assert timestamps == sorted(timestamps)
+        assert [f for _, f in stored] == [f for _, f in packets]
+        # header and index hold the timestamps the frames decode to
+        lasts = [entry[2] / 1000000 for entry in reader._index]
+        assert lasts == sorted(lasts)
+        for block, (_, first, last, count) in enumerate(reader._index):
+            decoded = reader._frames(block)
+            assert (decoded[0][0], decoded[-1][0], len(decoded)) == (first / 1000000, last / 1000000, count)
+        target = stored[400][0]
+        reader.seek(target)
+        assert next(iter(reader))[0] == pytest.approx(target)
+
+
+def test_file_without_index_is_scanned(tmp_path):
+    compressed = str(tmp_path / 'a.lacz')
+    pcap_to_compressed(write_capture(tmp_path / 'a.pcap'), compressed, blockSize=256)
+    with open(compressed, 'rb') as f:
+        data = f.read()
+    with CompressedReader(compressed) as reader:
+        indexSize = len(reader._index) * _index_entry.size + _footer.size
+    with open(compressed, 'wb') as f:
+        # lose the index and a part of the last block
+        f.write(data[:-indexSize - 5])
+    with CompressedReader(compressed) as reader:
+        recovered = frames(reader)
+    assert recovered and recovered == [(round(ts, 6), f) for ts, f in PACKETS[:len(recovered)]]
+
+
+def test_logger_round_trip(tmp_path):
+    with CompressedLogger(str(tmp_path / 'log.lacz'), blockSize=64) as logger:
+        for _, frame in PACKETS[:50]:
+            logger.log(frame)
+        path = logger.logFile
+    with CompressedReader(path) as reader:
+        logged = frames(reader)
+    assert [f for _, f in logged] == [f for _, f in PACKETS[:50]]
+    assert [ts for ts, _ in logged] == sorted(ts for ts, _ in logged)
@@ -0,0 +1,85 @@
+from concurrent.futures import Future
+
+import libAnt.constants as c
+import libAnt.message as m
+from libAnt.dispatcher import Dispatcher
+
+
+def reply(type: int, content) -> m.Message:
+    return m.Message(type, bytes(content))
+
+
+def event(channel: int, id: int, code: int = 0) -> m.Message:
+    return reply(c.MESSAGE_CHANNEL_EVENT, [channel, id, code])
+
+
+def test_event_resolves_request_of_its_channel_and_id():
+    dispatcher = Dispatcher()
+    on0 = dispatcher.expect(m.OpenChannelMessage(0), Future())
+    on1 = dispatcher.expect(m.OpenChannelMessage(1), Future())
+    assert dispatcher.resolve(event(1, c.MESSAGE_CHANNEL_OPEN)) is on1
+    assert dispatcher.resolve(event(0, c.MESSAGE_CHANNEL_OPEN)) is on0
+    assert dispatcher.resolve(event(0, c.MESSAGE_CHANNEL_OPEN)) is None
+    assert len(dispatcher) == 0
+
+
+def test_requested_response_is_not_confused_with_event_of_same_id():
+    dispatcher = Dispatcher()
+    config = dispatcher.expect(m.SetChannelIdMessage(0), Future())
+    request = dispatcher.expect(m.RequestChannelIDMessage(0), Future())
+    assert dispatcher.resolve(reply(c.MESSAGE_CHANNEL_ID, [0, 1, 2, 3, 4])) is request
+    assert dispatcher.resolve(event(0, c.MESSAGE_CHANNEL_ID)) is config
+
+
+def test_global_responses_and_startup():
+    dispatcher = Dispatcher()
+    capabilities = dispatcher.expect(m.RequestCapabilitiesMessage(), Future())
+    reset = dispatcher.expect(m.ResetSystemMessage(), Future())
+    assert dispatcher.resolve(reply(c.MESSAGE_STARTUP, [0x20])) is reset
+    assert dispatcher.resolve(reply(c.MESSAGE_CAPABILITIES, [8, 3, 0, 0, 0, 0])) is capabilities
+
+
+def test_broadcasts_and_rf_events_are_not_replies():
+    dispatcher = Dispatcher()
+    dispatcher.expect(m.OpenChannelMessage(0), Future())
+    assert dispatcher.resolve(reply(c.MESSAGE_CHANNEL_BROADCAST_DATA, [0] * 9)) is None
+    assert dispatcher.resolve(event(0, c.MESSAGE_RF_EVENT, c.EVENT_TX)) is None
+    assert len(dispatcher) == 1
+
+
+def test_same_key_answered_in_order_skipping_done_futures():
+    dispatcher = Dispatcher()
+    first = dispatcher.expect(m.OpenChannelMessage(0), Future())
+    second = dispatcher.expect(m.OpenChannelMessage(0), Future())
+    third = dispatcher.expect(m.OpenChannelMessage(0), Future())
+    second.future.cancel()
+    assert dispatcher.resolve(event(0, c.MESSAGE_CHANNEL_OPEN)) is first
+    assert dispatcher.resolve(event(0, c.MESSAGE_CHANNEL_OPEN)) is third
+
+
+def test_expire_by_deadline():
+    dispatcher = Dispatcher()
+    short = dispatcher.expect(m.OpenChannelMessage(0), Future(), timeout=1)
+    long = dispatcher.expect(m.OpenChannelMessage(1), Future(), timeout=5)
+    dispatcher.expect(m.OpenChannelMessage(2), Future())
+    assert dispatcher.next_deadline() == short.deadline
+    assert dispatcher.expire(short.deadline - 0.1) == []
+    assert dispatcher.expire(short.deadline) == [short]
+    assert dispatcher.next_deadline() == long.deadline
+    assert dispatcher.resolve(event(0, c.MESSAGE_CHANNEL_OPEN)) is None
+
+    # resolved before its deadline, not expired again
+    assert dispatcher.resolve(event(1, c.MESSAGE_CHANNEL_OPEN)) is long
+    assert dispatcher.expire(long.deadline) == []
+    assert dispatcher.next_deadline() is None
+
+
+def test_withdraw_and_drain():
+    dispatcher = Dispatcher()
+    withdrawn = dispatcher.expect(m.OpenChannelMessage(0), Future(), timeout=1)
+    pending = dispatcher.expect(m.OpenChannelMessage(1), Future(), timeout=1)
+    dispatcher.withdraw(withdrawn)
+    assert dispatcher.resolve(event(0, c.MESSAGE_CHANNEL_OPEN)) is None
+    assert dispatcher.drain() == [pending]
+    assert len(dispatcher) == 0
+    assert dispatcher.next_deadline() is None
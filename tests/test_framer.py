@@ -0,0 +1,152 @@
+from queue import Empty
+
+import pytest
+
+import libAnt.constants as c
+from libAnt.drivers.driver import Driver, DriverException
+from libAnt.drivers.framer import Framer
+from libAnt.message import Message
+
+
+def frame(type: int, content) -> bytes:
+    return Message(type, bytes(content)).encode()
+
+
+BROADCAST = frame(c.MESSAGE_CHANNEL_BROADCAST_DATA, [0, 0x19, 1, 2, 3, 4, 5, 6, 7])
+EVENT = frame(c.MESSAGE_CHANNEL_EVENT, [0, 1, c.EVENT_TX])
+
+
+def parsed(messages) -> list:
+    return [(msg.type, bytes(msg.content)) for msg in messages]
+
+
+def test_whole_frames_in_one_chunk():
+    msgs = Framer().feed(BROADCAST + EVENT, 12.5)
+    assert parsed(msgs) == [(c.MESSAGE_CHANNEL_BROADCAST_DATA, bytes([0, 0x19, 1, 2, 3, 4, 5, 6, 7])),
+                            (c.MESSAGE_CHANNEL_EVENT, bytes([0, 1, c.EVENT_TX]))]
+    assert [msg.timestamp for msg in msgs] == [12.5, 12.5]
+
+
+def test_frame_split_across_chunks():
+    framer = Framer()
+    data = BROADCAST + EVENT
+    msgs = []
+    for i in range(len(data)):
+        msgs += framer.feed(data[i:i + 1], i)
+    assert parsed(msgs) == parsed(Framer().feed(data))
+    # stamped with the chunk completing them
+    assert [msg.timestamp for msg in msgs] == [len(BROADCAST) - 1, len(data) - 1]
+    assert len(framer) == 0
+
+
+def test_incomplete_frame_is_held():
+    framer = Framer()
+    assert framer.feed(BROADCAST[:5]) == []
+    assert len(framer) == 5
+    assert parsed(framer.feed(BROADCAST[5:])) == parsed(Framer().feed(BROADCAST))
+
+
+def test_resync_on_sync_byte_after_garbage():
+    msgs = Framer().feed(b'\x00\x13\x37' + BROADCAST + b'\xff' + EVENT)
+    assert [msg.type for msg in msgs] == [c.MESSAGE_CHANNEL_BROADCAST_DATA, c.MESSAGE_CHANNEL_EVENT]
+
+
+def test_bad_checksum_is_dropped_and_reported():
+    corrupt = bytearray(BROADCAST)
+    corrupt[-1] ^= 0xFF
+    frames = []
+    framer = Framer(onFrame=frames.append)
+    msgs = framer.feed(bytes(corrupt) + EVENT)
+    assert [msg.type for msg in msgs] == [c.MESSAGE_CHANNEL_EVENT]
+    assert frames == [bytes(corrupt), EVENT]
+
+
+def test_messages_do_not_hold_the_buffer():
+    framer = Framer()
+    held = framer.feed(BROADCAST + EVENT[:3])
+    # still able to grow and shrink the buffer while messages are kept
+    msgs = framer.feed(EVENT[3:] + BROADCAST)
+    assert parsed(held + msgs) == parsed(Framer().feed(BROADCAST + EVENT + BROADCAST))
+
+
+def test_failing_frame_callback_leaves_the_framer_usable():
+    def fail(frame):
+        raise RuntimeError('logger failed')
+
+    framer = Framer(onFrame=fail)
+    with pytest.raises(RuntimeError):
+        framer.feed(EVENT)
+    # the frame stays buffered, and the buffer can still grow
+    framer._onFrame = None
+    assert [msg.type for msg in framer.feed(BROADCAST)] == [c.MESSAGE_CHANNEL_EVENT, c.MESSAGE_CHANNEL_BROADCAST_DATA]
+
+
+def test_oversized_length_is_a_false_sync():
+    # 0xA4 followed by a length above maxLength is skipped without waiting
+    # for that many bytes
+    framer = Framer(maxLength=16)
+    msgs = framer.feed(bytes([c.MESSAGE_TX_SYNC, 0xF0]) + EVENT)
+    assert [msg.type for msg in msgs] == [c.MESSAGE_CHANNEL_EVENT]
+    assert len(framer) == 0
+
+
+def test_clear_drops_partial_frame():
+    framer = Framer()
+    framer.feed(BROADCAST[:6])
+    framer.clear()
+    assert parsed(framer.feed(EVENT)) == parsed(Framer().feed(EVENT))
+
+
+class ChunkDriver(Driver):
+    """ Driver handing over a fixed list of chunks """
+
+    def __init__(self, chunks):
+        super().__init__()
+        self._chunks = list(chunks)
+        self._opened = False
+
+    def _isOpen(self) -> bool:
+        return self._opened
+
+    def _open(self) -> None:
+        self._opened = True
+
+    def _close(self) -> None:
+        self._opened = False
+
+    def _read(self, count: int, timeout=None) -> bytes:
+        raise NotImplementedError()
+
+    def _readChunk(self, timeout=None) -> bytes:
+        if not self._chunks:
+            raise Empty
+        return self._chunks.pop(0)
+
+    def _write(self, data: bytes) -> None:
+        pass
+
+    def _abort(self) -> None:
+        pass
+
+
+def test_read_many_returns_every_frame_of_a_chunk():
+    driver = ChunkDriver([BROADCAST[:3], BROADCAST[3:] + EVENT + BROADCAST])
+    driver.open()
+    msgs = driver.read_many(timeout=0)
+    assert [msg.type for msg in msgs] == [c.MESSAGE_CHANNEL_BROADCAST_DATA, c.MESSAGE_CHANNEL_EVENT,
+                                          c.MESSAGE_CHANNEL_BROADCAST_DATA]
+    assert driver.read_many(timeout=0) == []
+
+
+def test_read_keeps_the_rest_of_the_chunk():
+    driver = ChunkDriver([BROADCAST + EVENT])
+    driver.open()
+    assert driver.read(timeout=0).type == c.MESSAGE_CHANNEL_BROADCAST_DATA
+    assert driver.read(timeout=0).type == c.MESSAGE_CHANNEL_EVENT
+    with pytest.raises(Empty):
+        driver.read(timeout=0)
+
+
+def test_read_many_on_closed_driver():
+    with pytest.raises(DriverException):
+        ChunkDriver([]).read_many(timeout=0)
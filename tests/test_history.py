@@ -0,0 +1,75 @@
+import random
+from math import isclose
+
+import pytest
+
+from libAnt.profiles.history import DeviceHistory, NP_WINDOW
+
+
+def window_of(samples, now, duration, capacity):
+    """ Samples a rolling window holds, computed from scratch """
+    kept = samples[-capacity:]
+    inside = [s for s in kept if s[0] >= now - duration]
+    return inside or kept[-1:]
+
+
+def mean(values):
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else None
+
+
+def test_rolling_aggregates_match_brute_force():
+    rng = random.Random(7)
+    capacity = 50
+    history = DeviceHistory(capacity, windows=(10, 40))
+    samples = []
+    np_series = []
+    t = 0.0
+    for _ in range(300):
+        t += rng.choice((0.25, 0.5, 1, 3))
+        power = None if rng.random() < 0.1 else rng.randint(0, 600)
+        cadence = rng.randint(60, 110)
+        history.append(t, power=power, cadence=cadence)
+        samples.append((t, power, cadence))
+        np_series.append((t, mean(p for _, p, _ in window_of(samples, t, NP_WINDOW, capacity))))
+
+        for duration in (10, 40):
+            inside = window_of(samples, t, duration, capacity)
+            powers = [p for _, p, _ in inside if p is not None]
+            expected = mean(powers)
+            got = history.mean('power', duration)
+            assert (got is None and expected is None) or isclose(got, expected)
+            assert history.max('power', duration) == (max(powers) if powers else None)
+            assert history.max('cadence', duration) == max(cd for _, _, cd in inside)
+
+            rolling = [p for ts, p in np_series[-capacity:] if ts >= t - duration] or [np_series[-1][1]]
+            np4 = mean(p ** 4 for p in rolling if p is not None)
+            got = history.normalizedPower(duration)
+            assert (got is None and np4 is None) or isclose(got, np4 ** 0.25)
+
+
+def test_ring_keeps_the_last_capacity_samples_in_order():
+    history = DeviceHistory(4)
+    for t in range(10):
+        history.append(float(t), power=t * 10)
+    assert len(history) == 4
+    assert list(history.timestamps()) == [6.0, 7.0, 8.0, 9.0]
+    assert list(history.series('power')) == [60.0, 70.0, 80.0, 90.0]
+
+
+def test_missing_fields_are_nan_and_skipped():
+    history = DeviceHistory(8)
+    history.append(0.0, heartrate=120)
+    history.append(1.0)
+    series = history.series('heartrate')
+    assert series[0] == 120 and series[1] != series[1]
+    assert history.mean('heartrate', 30) == 120
+    assert history.mean('speed', 30) is None
+    assert history.max('speed', 30) is None
+
+
+def test_unknown_window_or_capacity():
+    with pytest.raises(ValueError):
+        DeviceHistory(0)
+    with pytest.raises(ValueError):
+        DeviceHistory(8, windows=(30,)).mean('power', 60)
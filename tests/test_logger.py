@@ -0,0 +1,90 @@
+import os
+import time
+
+from libAnt.drivers.pcap import PcapReader
+from libAnt.loggers.logger import Logger
+from libAnt.loggers.pcap import PcapLogger
+
+from fakeant import wait_until
+
+FRAMES = [bytes([0xA4, 1, 0x4E, i, i ^ 0xEB]) for i in range(100)]
+
+
+def contents(path) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_close_writes_every_frame_in_order(tmp_path):
+    logger = Logger(str(tmp_path / 'log.bin'), batchSize=64, flushInterval=60)
+    with logger:
+        for data in FRAMES:
+            logger.log(data)
+        path = logger.logFile
+        # batches written by the background thread once batchSize is reached
+        assert wait_until(lambda: os.path.getsize(path) >= 64)
+    assert contents(path) == b''.join(FRAMES)
+    assert logger.dropped == 0
+
+
+def test_frames_dropped_and_counted_past_max_pending(tmp_path):
+    # nothing is written before close: no batch reaches batchSize
+    logger = Logger(str(tmp_path / 'log.bin'), batchSize=1 << 20, flushInterval=60, maxPending=52)
+    with logger:
+        for data in FRAMES[:20]:
+            logger.log(data)
+        path = logger.logFile
+        assert os.path.getsize(path) == 0
+    assert logger.dropped == 10
+    assert contents(path) == b''.join(FRAMES[:10])
+
+
+def logs(directory) -> list:
+    return sorted(os.listdir(directory), key=lambda name: int(name.split('-')[1].split('.')[0]))
+
+
+def test_rotation_by_size(tmp_path):
+    with Logger(str(tmp_path / 'log.bin'), flushInterval=60, maxBytes=20) as logger:
+        for data in FRAMES:
+            logger.log(data)
+    names = logs(tmp_path)
+    assert names[0] == 'log-0.bin' and len(names) == 25
+    assert all(os.path.getsize(tmp_path / name) <= 20 for name in names)
+    assert b''.join(contents(tmp_path / name) for name in names) == b''.join(FRAMES)
+
+
+def test_rotated_files_start_with_their_header(tmp_path):
+    with PcapLogger(str(tmp_path / 'log.pcap'), flushInterval=60, maxBytes=200) as logger:
+        for data in FRAMES[:30]:
+            logger.log(data)
+    names = logs(tmp_path)
+    assert len(names) > 1
+    read = []
+    for name in names:
+        with PcapReader(str(tmp_path / name)) as reader:
+            read += [bytes(frame) for _, frame in reader]
+    assert read == FRAMES[:30]
+
+
+def test_rotation_by_age(tmp_path):
+    with Logger(str(tmp_path / 'log.bin'), flushInterval=60, maxAge=0.05) as logger:
+        logger.log(FRAMES[0])
+        logger.flush()
+        time.sleep(0.1)
+        logger.log(FRAMES[1])
+        logger.flush()
+        logger.log(FRAMES[2])
+    assert logs(tmp_path) == ['log-0.bin', 'log-1.bin']
+    assert contents(tmp_path / 'log-1.bin') == FRAMES[1] + FRAMES[2]
+
+
+def test_retention_keeps_the_most_recent_files(tmp_path):
+    with Logger(str(tmp_path / 'log.bin'), flushInterval=60, maxBytes=20, retention=3) as logger:
+        for data in FRAMES:
+            logger.log(data)
+    assert logs(tmp_path) == ['log-22.bin', 'log-23.bin', 'log-24.bin']
+    assert contents(tmp_path / 'log-24.bin') == b''.join(FRAMES[96:])
+    # numbering goes on from the files already there, which count towards retention
+    with Logger(str(tmp_path / 'log.bin'), retention=3) as logger:
+        logger.log(FRAMES[0])
+    assert logs(tmp_path) == ['log-23.bin', 'log-24.bin', 'log-25.bin']
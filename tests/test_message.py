@@ -0,0 +1,60 @@
+import copy
+import pickle
+
+import pytest
+
+import libAnt.constants as c
+from libAnt.message import BroadcastMessage, Message, _rebuild_broadcast
+
+PAYLOAD = bytes([0x19, 7, 90, 0x10, 0x27, 200, 0, 0x20])
+# channel id, rssi and receive timestamp
+EXTENDED = bytes([c.EXT_FLAG_CHANNEL_ID | c.EXT_FLAG_RSSI | c.EXT_FLAG_TIMESTAMP,
+                  0xD2, 0x04, 17, 5,
+                  0x20, 0xC4, 0xA6,
+                  0x34, 0x12])
+RAW = bytes([2]) + PAYLOAD + EXTENDED
+
+
+def received(raw: bytes = RAW, timestamp=1500000000.5) -> BroadcastMessage:
+    # as parsed from a frame: a view into the received bytes
+    view = memoryview(bytearray(raw))
+    return _rebuild_broadcast(view, timestamp)
+
+
+def test_messages_have_no_dict():
+    for msg in (Message(c.MESSAGE_CHANNEL_OPEN, bytes([0])), received()):
+        assert not hasattr(msg, '__dict__')
+        with pytest.raises(AttributeError):
+            msg.unknown = 1
+
+
+def test_extended_fields_decoded_on_first_read():
+    msg = received()
+    assert isinstance(msg.content, memoryview)
+    assert (msg.channel, bytes(msg.content), msg.flag) == (2, PAYLOAD, EXTENDED[0])
+    assert msg._ext is None
+    assert (msg.device_number, msg.device_type, msg.tx_type) == (1234, 17, 5)
+    assert msg._ext is not None
+    assert (msg.rssi_measurement_type, msg.rssi, msg.rssi_threshold) == (0x20, 0xC4, 0xA6)
+    assert msg.rx_timestamp == 0x1234
+    assert (msg.deviceNumber, msg.deviceType) == (1234, 17)
+    assert bytes(msg.ext_content) == EXTENDED[1:]
+
+
+def test_fields_of_a_plain_broadcast_are_none():
+    msg = received(RAW[:9])
+    assert msg.flag is None and msg.ext_content is None
+    assert (msg.device_number, msg.rssi, msg.rx_timestamp) == (None, None, None)
+
+
+@pytest.mark.parametrize('raw', [RAW, RAW[:9]])
+def test_pickle_and_deepcopy(raw):
+    msg = received(raw)
+    for copied in (pickle.loads(pickle.dumps(msg)), copy.deepcopy(msg)):
+        assert type(copied) is BroadcastMessage
+        assert copied.timestamp == msg.timestamp
+        assert (copied.type, copied.channel, copied.flag) == (msg.type, msg.channel, msg.flag)
+        assert bytes(copied.content) == bytes(msg.content)
+        assert (copied.device_number, copied.rssi, copied.rx_timestamp) == (msg.device_number, msg.rssi,
+                                                                           msg.rx_timestamp)
+        assert not hasattr(copied, '__dict__')
@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+import libAnt.constants as c
+import libAnt.message as m
+from libAnt.asyncnode import AsyncChannel
+from libAnt.node import Channel, Node
+
+from fakeant import FakeDriver
+
+
+def test_channel_config_is_the_same_for_both_nodes():
+    settings = dict(channel_num=2, network_num=1, device_type=17, channel_frequency=2457,
+                    channel_msg_freq=4, channel_search_timeout=5)
+    async_channel = AsyncChannel(None, **settings)
+    channel = SimpleNamespace(number=2, network=1, network_key=c.ANTPLUS_NETWORK_KEY,
+                              _type=c.CHANNEL_BIDIRECTIONAL_SLAVE, device_type=17, frequency=2457,
+                              msg_freq=4, search_timeout=5, id=None)
+    assert ([(msg.type, bytes(msg.content)) for msg in async_channel.config_messages()]
+            == [(msg.type, bytes(msg.content)) for msg in Channel.config_messages(channel)])
+    assign = m.AssignChannelMessage(2, c.CHANNEL_BIDIRECTIONAL_SLAVE, 1)
+    assert bytes(Channel.config_messages(channel)[1].content) == bytes(assign.content)
+
+
+def test_configure_skips_settings_already_applied():
+    driver = FakeDriver()
+    with Node(driver, lambda msg: None, lambda e: None, name='test') as node:
+        msgs = Channel.config_messages(SimpleNamespace(
+            number=0, network=0, network_key=c.ANTPLUS_NETWORK_KEY, _type=c.CHANNEL_BIDIRECTIONAL_SLAVE,
+            device_type=17, frequency=2457, msg_freq=4, search_timeout=5, id=None))
+        sent = len(driver.stick.writes)
+        first = [future.result(timeout=5) for future in node.configure(msgs)]
+        assert not any(str(result).startswith('Message Skipped') for result in first)
+        assert len(driver.stick.writes) == sent + len(msgs)
+
+        sent = len(driver.stick.writes)
+        second = [future.result(timeout=5) for future in node.configure(msgs)]
+        assert all(str(result).startswith('Message Skipped') for result in second)
+        assert len(driver.stick.writes) == sent
+
+        # a changed setting is sent again, alone
+        msgs[3] = m.SetChannelRfFrequencyMessage(0, 2466)
+        [future.result(timeout=5) for future in node.configure(msgs)]
+        assert driver.stick.writes[sent:] == [(msgs[3].type, bytes(msgs[3].content))]
@@ -0,0 +1,106 @@
+import os
+
+import pytest
+
+import libAnt.constants as c
+from libAnt.drivers.pcap import PcapDriver, PcapReader
+from libAnt.loggers.pcap import pcap_global_header, pcap_packet_header
+from libAnt.message import Message
+
+from fakeant import wait_until
+
+PACKETS = [(1000.0 + i * 0.25, bytes([0xA4, i, i + 1])) for i in range(8)]
+
+
+def write_capture(path, packets=PACKETS, tail=b'') -> str:
+    with open(path, 'wb') as f:
+        f.write(pcap_global_header())
+        for ts, data in packets:
+            f.write(pcap_packet_header(ts, len(data)) + data)
+        f.write(tail)
+    return str(path)
+
+
+def read_all(reader) -> list:
+    return [(ts, bytes(data)) for ts, data in reader]
+
+
+def test_index_iteration_seek_and_slice(tmp_path):
+    with PcapReader(write_capture(tmp_path / 'a.pcap')) as reader:
+        assert len(reader) == 8
+        assert (reader.startTime, reader.endTime) == (1000.0, 1001.75)
+        assert read_all(reader) == PACKETS
+        assert reader.seek(1000.6) == 3
+        assert read_all(reader) == PACKETS[3:]
+        assert [(ts, bytes(d)) for ts, d in reader.slice(1000.25, 1001.0)] == PACKETS[1:4]
+
+
+def test_truncated_last_packet_is_ignored(tmp_path):
+    path = write_capture(tmp_path / 'a.pcap', tail=pcap_packet_header(2000.0, 10) + b'\xA4')
+    with PcapReader(path) as reader:
+        assert read_all(reader) == PACKETS
+
+
+def test_cached_index_is_saved_and_loaded(tmp_path, monkeypatch):
+    path = write_capture(tmp_path / 'a.pcap')
+    with PcapReader(path, cacheIndex=True) as reader:
+        assert os.path.exists(reader.indexFile)
+        built = (list(reader.offsets), list(reader.lengths), list(reader.timestamps))
+
+    def unexpected(self):
+        raise AssertionError('index rebuilt')
+
+    monkeypatch.setattr(PcapReader, '_buildIndex', unexpected)
+    with PcapReader(path, cacheIndex=True) as reader:
+        assert (list(reader.offsets), list(reader.lengths), list(reader.timestamps)) == built
+        assert read_all(reader) == PACKETS
+
+
+def test_stale_index_is_rebuilt(tmp_path):
+    path = write_capture(tmp_path / 'a.pcap')
+    with PcapReader(path, cacheIndex=True):
+        pass
+    extra = PACKETS + [(1002.0, b'\xA4\x00')]
+    write_capture(tmp_path / 'a.pcap', extra)
+    with PcapReader(path, cacheIndex=True) as reader:
+        assert read_all(reader) == extra
+
+
+@pytest.mark.parametrize('content', [b'', b'LAPI', b'\x00' * 64])
+def test_corrupt_index_is_rebuilt(tmp_path, content):
+    path = write_capture(tmp_path / 'a.pcap')
+    with open(path + '.idx', 'wb') as f:
+        f.write(content)
+    with PcapReader(path, cacheIndex=True) as reader:
+        assert read_all(reader) == PACKETS
+
+
+def test_index_dir(tmp_path):
+    captures, indexes = tmp_path / 'captures', tmp_path / 'indexes'
+    captures.mkdir()
+    indexes.mkdir()
+    path = write_capture(captures / 'a.pcap')
+    with PcapReader(path, cacheIndex=True, indexDir=str(indexes)) as reader:
+        assert reader.indexFile == str(indexes / 'a.pcap.idx')
+    assert os.listdir(captures) == ['a.pcap']
+    assert os.listdir(indexes) == ['a.pcap.idx']
+
+
+def test_no_index_written_without_cache(tmp_path):
+    path = write_capture(tmp_path / 'a.pcap')
+    with PcapReader(path):
+        pass
+    assert os.listdir(tmp_path) == ['a.pcap']
+
+
+def test_replay_keeps_capture_time_of_partly_read_packets(tmp_path):
+    frames = [Message(c.MESSAGE_CHANNEL_BROADCAST_DATA, bytes([0, i, 0, 0, 0, 0, 0, 0, 0])).encode()
+              for i in range(3)]
+    packets = [(1500000000.0 + i, frame) for i, frame in enumerate(frames)]
+    driver = PcapDriver(write_capture(tmp_path / 'a.pcap', packets), speed=PcapDriver.REPLAY_MAX)
+    with driver:
+        assert wait_until(lambda: len(driver._buffer) == 3)
+        # the end of the first packet and the two others are left over
+        assert driver._read(len(frames[0]) - 4, timeout=1) == frames[0][:-4]
+        msgs = driver.read_many(timeout=1)
+    assert [msg.timestamp for msg in msgs] == [packets[1][0], packets[2][0]]
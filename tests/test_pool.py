@@ -0,0 +1,37 @@
+import libAnt.constants as c
+import libAnt.message as m
+from libAnt.node import Pump
+from libAnt.pool import NodePool
+
+from fakeant import FakeDriver, FakeStick, wait_until
+
+
+def broadcasts_from(received, device_number) -> list:
+    return [msg for msg in received if isinstance(msg, m.BroadcastMessage)
+            and msg.device_number == device_number]
+
+
+def test_channels_spread_and_told_apart_by_channel_id(monkeypatch):
+    monkeypatch.setattr(Pump, 'reconnect_delay', 0.05)
+    drivers = [FakeDriver(FakeStick(max_channels=2, device_number=100 + i)) for i in range(2)]
+    received = []
+    with NodePool(drivers, received.append, name='pool', reconnect=True) as pool:
+        assert len(pool.nodes) == 2
+        for driver in drivers:
+            assert driver.stick.written(c.MESSAGE_LIB_CONFIG) == [bytes([0, c.EXT_FLAG_CHANNEL_ID])]
+
+        channels = pool.open_channels([{'profile': 'FE-C'}] * 3)
+        assert all(channels)
+        assert [pool.nodes.index(pool.node_of(channel)) for channel in channels] == [0, 1, 0]
+        assert pool.open_channel(profile='FE-C', wait=False) is not None
+        assert pool.open_channel(profile='FE-C', wait=False) is None
+
+        # channel 0 of both sticks, told apart by the device which sent it
+        assert wait_until(lambda: all(0 in {msg.channel for msg in broadcasts_from(received, number)}
+                                      for number in (100, 101)))
+
+        # extended data is enabled again once a stick is back
+        drivers[1].unplug()
+        assert wait_until(lambda: len(drivers[1].stick.written(c.MESSAGE_LIB_CONFIG)) == 2)
+        count = len(broadcasts_from(received, 101))
+        assert wait_until(lambda: len(broadcasts_from(received, 101)) > count)
@@ -0,0 +1,43 @@
+import pytest
+
+import libAnt.constants as c
+import libAnt.message as m
+from libAnt.profiles import registry
+from libAnt.profiles.fitness_equipment_profile import TrainerDataPage
+from libAnt.profiles.profile import ProfileState
+
+FEC = c.PROFILES['FE-C']
+
+
+def broadcast(payload, timestamp=0.0) -> m.BroadcastMessage:
+    raw = bytes([0] + list(payload) + [c.EXT_FLAG_CHANNEL_ID, 0xD2, 0x04, FEC, 5])
+    return m._rebuild_broadcast(raw, timestamp)
+
+
+def trainer_data(event, accumulated_power, power, status=0x2) -> m.BroadcastMessage:
+    return broadcast([c.PAGE_TRAINER_DATA, event, 90, accumulated_power & 0xFF, accumulated_power >> 8,
+                      power & 0xFF, (power >> 8) | (status << 4), 0x20])
+
+
+def test_trainer_data_page_is_routed_and_decoded():
+    assert registry.lookup(FEC, c.PAGE_TRAINER_DATA) is TrainerDataPage
+    page = TrainerDataPage(trainer_data(1, 1000, 0x123), ProfileState())
+    assert (page.event, page.inst_cadence, page.accumulated_power) == (1, 90, 1000)
+    assert (page.inst_power, page.trainer_status) == (0x123, 0x2)
+    assert page.accumulated_pwr_diff is None
+
+
+def test_trainer_data_differences_roll_over():
+    state = ProfileState()
+    TrainerDataPage(trainer_data(255, 65500, 200), state)
+    page = TrainerDataPage(trainer_data(1, 164, 200), state)
+    assert (page.event_diff, page.accumulated_pwr_diff) == (2, 200)
+
+
+def test_other_page_is_rejected_without_touching_the_state():
+    state = ProfileState()
+    with pytest.raises(ValueError):
+        TrainerDataPage(broadcast([0x10, 0, 0, 0, 0, 0, 0, 0], timestamp=5.0), state)
+    assert (state.count, state.firstTimestamp) == (0, None)
+    page = TrainerDataPage(trainer_data(1, 1000, 200, 0x2), state)
+    assert page.first and page.firstTimestamp == 0.0
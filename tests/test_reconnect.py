@@ -0,0 +1,33 @@
+import libAnt.constants as c
+import libAnt.message as m
+from libAnt.node import Node, Pump
+
+from fakeant import FakeDriver, FakeStick, wait_until
+
+
+def test_channel_id_keeps_transmission_type():
+    msg = m.ChannelIDMessage(bytes([0, 0xD2, 0x04, 17, 5]))
+    assert msg.id_dict == {'channel_number': 0, 'device_number': 1234,
+                           'device_type': 17, 'tx_type': 5}
+
+
+def test_reconnect_restores_channel_to_found_device(monkeypatch):
+    monkeypatch.setattr(Pump, 'reconnect_delay', 0.05)
+    driver = FakeDriver(FakeStick(device_number=1234, device_type=17, tx_type=5))
+    received = []
+    errors = []
+    with Node(driver, received.append, errors.append, name='test', reconnect=True) as node:
+        assert node.open_channel(0, profile='FE-C')
+        channel = node.channels[0]
+        assert channel.id['tx_type'] == 5
+
+        driver.unplug(failures=2)
+        assert wait_until(lambda: any(isinstance(msg, m.Gap) for msg in received))
+        assert wait_until(lambda: channel.state == c.CHANNEL_STATE_TRACKING
+                          and len(driver.stick.written(c.MESSAGE_CHANNEL_ID)) == 2)
+
+        first, restored = driver.stick.written(c.MESSAGE_CHANNEL_ID)
+        # searching for any device of the profile, then for the one found
+        assert first == bytes([0, 0, 0, 17, 0])
+        assert restored == bytes([0, 0xD2, 0x04, 17, 5])
+        assert errors
@@ -0,0 +1,115 @@
+from concurrent.futures import Future
+
+import libAnt.constants as c
+import libAnt.message as m
+from libAnt.scheduler import CONFIG, CONTROL, DATA, DEFAULT_PERIOD, TxScheduler
+
+
+def ack(channel: int, page: int, value: int = 0) -> m.Message:
+    return m.AcknowledgedMessage(channel, bytes([page, value, 0, 0, 0, 0, 0, 0]))
+
+
+def broadcast(channel: int, page: int) -> m.Message:
+    return m.Message(c.MESSAGE_CHANNEL_BROADCAST_DATA, bytes([channel, page, 0, 0, 0, 0, 0, 0, 0]))
+
+
+def test_config_then_control_then_data():
+    scheduler = TxScheduler()
+    data, control = ack(0, 0x33), m.OpenChannelMessage(0)
+    config = [m.AssignChannelMessage(0, c.CHANNEL_BIDIRECTIONAL_SLAVE)]
+    scheduler.put(DATA, data, Future())
+    scheduler.put(CONTROL, control)
+    scheduler.put(CONFIG, config)
+    assert [scheduler.next(0)[0] for _ in range(4)] == [config, control, data, None]
+
+
+def test_waiting_data_coalesced_by_page():
+    scheduler = TxScheduler()
+    futures = [Future() for _ in range(3)]
+    scheduler.put(DATA, ack(0, 0x33, 1), futures[0])
+    scheduler.put(DATA, ack(0, 0x30, 2), futures[1])
+    scheduler.put(DATA, ack(0, 0x33, 3), futures[2])
+    assert len(scheduler) == 2
+    # superseded by the newer message of the same page
+    assert futures[0].result(timeout=0) is False
+    msg, _ = scheduler.next(0)
+    # keeps the place of the first message of that page
+    assert msg.content[1:3] == bytes([0x33, 3])
+
+
+def test_one_transfer_per_channel_paced_by_period():
+    scheduler = TxScheduler()
+    first, second = Future(), Future()
+    scheduler.put(DATA, ack(0, 0x33), first)
+    scheduler.put(DATA, ack(0, 0x30), second)
+    assert scheduler.next(0)[0] is not None
+    msg, wake = scheduler.next(0.1)
+    assert msg is None
+    assert wake == DEFAULT_PERIOD * TxScheduler.slots
+
+    assert scheduler.transmitted(0, c.EVENT_TRANSFER_TX_COMPLETED)
+    assert first.result(timeout=0) is True
+    assert scheduler.next(0.1)[0].content[1] == 0x30
+    assert scheduler.transmitted(0, c.EVENT_TRANSFER_TX_FAILED)
+    assert second.result(timeout=0) is False
+
+
+def test_unreported_transfer_given_up_after_slots():
+    scheduler = TxScheduler()
+    scheduler.put(CONFIG, [m.ChannelMessagingPeriodMessage(0, 8)])
+    scheduler.next(0)
+    lost, following = Future(), Future()
+    scheduler.put(DATA, ack(0, 0x33), lost)
+    scheduler.put(DATA, ack(0, 0x30), following)
+    scheduler.next(0)
+    period = 1 / 8
+    assert scheduler.next(period * TxScheduler.slots - 0.01)[0] is None
+    assert scheduler.next(period * TxScheduler.slots)[0].content[1] == 0x30
+    assert lost.result(timeout=0) is False
+
+
+def test_broadcast_freed_by_tx_event_only():
+    scheduler = TxScheduler()
+    future = Future()
+    scheduler.put(DATA, broadcast(0, 0x10), future)
+    scheduler.next(0)
+    assert not scheduler.transmitted(0, c.EVENT_TRANSFER_TX_COMPLETED)
+    assert scheduler.transmitted(0, c.EVENT_TX)
+    assert future.result(timeout=0) is True
+
+
+def test_channels_take_turns():
+    scheduler = TxScheduler()
+    for page in (0x30, 0x31):
+        scheduler.put(DATA, ack(0, page), Future())
+        scheduler.put(DATA, ack(1, page), Future())
+    sent = []
+    for now in (10, 11, 12, 13):
+        msg, _ = scheduler.next(now)
+        sent.append((msg.content[0], msg.content[1]))
+        scheduler.transmitted(msg.content[0], c.EVENT_TRANSFER_TX_COMPLETED)
+    assert sent == [(0, 0x30), (1, 0x30), (0, 0x31), (1, 0x31)]
+
+
+def test_unassign_and_reset_drop_pending_data():
+    scheduler = TxScheduler()
+    on0, on1 = Future(), Future()
+    scheduler.put(DATA, ack(0, 0x33), on0)
+    scheduler.put(DATA, ack(1, 0x33), on1)
+    scheduler.put(CONFIG, [m.UnassignChannelMessage(0)])
+    scheduler.next(0)
+    assert on0.result(timeout=0) is False
+    assert not on1.done()
+    scheduler.put(CONTROL, m.ResetSystemMessage())
+    scheduler.next(0)
+    assert on1.result(timeout=0) is False
+    assert len(scheduler) == 0
+
+
+def test_drain():
+    scheduler = TxScheduler()
+    future = Future()
+    scheduler.put(CONTROL, m.OpenChannelMessage(0))
+    scheduler.put(DATA, ack(0, 0x33), future)
+    assert scheduler.drain() == [future]
+    assert scheduler.next(0) == (None, None)
@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+from queue import Empty
+
+import pytest
+
+import libAnt.constants as c
+from libAnt.drivers.driver import DriverException
+from libAnt.message import Message
+
+pytest.importorskip('serial')
+pty = pytest.importorskip('pty')
+
+from libAnt.drivers.serial import SerialDriver  # noqa: E402
+
+EVENT = Message(c.MESSAGE_CHANNEL_EVENT, bytes([0, 1, c.EVENT_TX])).encode()
+
+
+@pytest.fixture
+def port():
+    master, slave = pty.openpty()
+    yield master, os.ttyname(slave)
+    for fd in (master, slave):
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+
+def test_read_honors_timeout(port):
+    _, name = port
+    with SerialDriver(name) as driver:
+        start = time.monotonic()
+        assert driver.read_many(timeout=0.2) == []
+        assert time.monotonic() - start < 1
+        with pytest.raises(Empty):
+            driver.read(timeout=0)
+
+
+def test_read_takes_every_buffered_frame(port):
+    master, name = port
+    with SerialDriver(name, baudRate=460800) as driver:
+        os.write(master, EVENT * 3)
+        time.sleep(0.05)
+        assert len(driver.read_many(timeout=0.2)) == 3
+
+
+def test_read_waits_for_data(port):
+    master, name = port
+    with SerialDriver(name) as driver:
+        threading.Timer(0.1, os.write, (master, EVENT)).start()
+        assert driver.read(timeout=2).type == c.MESSAGE_CHANNEL_EVENT
+
+
+def test_unplug_raises_driver_exceptions(port):
+    master, name = port
+    driver = SerialDriver(name)
+    driver.open()
+    # the other end of the pty going away, as a USB-serial adapter does
+    os.close(master)
+    with pytest.raises(DriverException):
+        driver.write(Message(c.MESSAGE_CHANNEL_EVENT, bytes([0, 1, 0])))
+    with pytest.raises(DriverException):
+        driver.read_many(timeout=0.1)
+    driver.close()
+
+
+def test_failed_open_and_repeated_close():
+    driver = SerialDriver('/dev/does-not-exist')
+    with pytest.raises(DriverException):
+        driver.reOpen()
+    assert not driver.isOpen()
+    driver.close()
+    driver.close()
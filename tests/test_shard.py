@@ -0,0 +1,123 @@
+import pickle
+import threading
+from struct import Struct
+
+import pytest
+
+from libAnt.shard import FAILURE, FRAME, MAX_PAYLOAD, SUCCESS, FrameRing, _portable, _producer, _record
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing(size=256)
+    yield ring
+    ring.close()
+
+
+def test_records_in_order(ring):
+    assert ring.get_many(timeout=0) == []
+    assert ring.put(FRAME, 1.5, b'\xA4\x01')
+    assert ring.put(SUCCESS, 2.5, b'')
+    assert ring.put(FAILURE, 3.5, b'error')
+    assert ring.get_many(timeout=0) == [(FRAME, 1.5, b'\xA4\x01'), (SUCCESS, 2.5, b''), (FAILURE, 3.5, b'error')]
+    assert ring.get_many(timeout=0) == []
+
+
+@pytest.mark.parametrize('count, tail', [(4, 56), (5, 6)])
+def test_wraparound_skips_the_end_of_the_buffer(ring, count, tail):
+    # records of 50 bytes, the next one does not fit in the tail: it is left
+    # with a skip record, or without one when shorter than a record header
+    payload = bytes(50 - _record.size)
+    for i in range(count):
+        assert ring.put(FRAME, float(i), payload)
+    assert len(ring.get_many(timeout=0)) == count
+    assert 256 - count * 50 == tail
+    larger = bytes(range(tail))
+    assert ring.put(FRAME, 10.0, larger)
+    assert ring.put(SUCCESS, 11.0, b'next')
+    assert ring.get_many(timeout=0) == [(FRAME, 10.0, larger), (SUCCESS, 11.0, b'next')]
+    assert ring.dropped == 0
+
+
+def test_full_ring_drops_and_counts(ring):
+    payload = bytes(40)
+    written = 0
+    while ring.put(FRAME, 0.0, payload):
+        written += 1
+    assert not ring.put(FRAME, 0.0, payload)
+    assert ring.dropped == 2
+    assert len(ring.get_many(timeout=0)) == written
+    # room again once consumed
+    assert ring.put(FRAME, 1.0, payload)
+    assert ring.get_many(timeout=0) == [(FRAME, 1.0, payload)]
+
+
+def test_records_which_never_fit_are_rejected(ring):
+    with pytest.raises(ValueError):
+        ring.put(FRAME, 0.0, bytes(256))
+    big = FrameRing(size=2 * MAX_PAYLOAD)
+    try:
+        with pytest.raises(ValueError):
+            big.put(FRAME, 0.0, bytes(MAX_PAYLOAD + 1))
+        assert big.put(FRAME, 0.0, bytes(MAX_PAYLOAD))
+    finally:
+        big.close()
+    assert ring.dropped == 0
+
+
+def test_concurrent_producers_lose_nothing_silently():
+    ring = FrameRing(size=4096)
+    put = _producer(ring)
+    item = Struct('<BI')
+    producers, count = 4, 5000
+    received = []
+    done = threading.Event()
+
+    def produce(n):
+        for i in range(count):
+            put(FRAME, 0.0, item.pack(n, i))
+
+    def consume():
+        while not done.is_set():
+            received.extend(ring.get_many(timeout=0.01))
+        received.extend(ring.get_many(timeout=0))
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    threads = [threading.Thread(target=produce, args=(n,)) for n in range(producers)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        done.set()
+        consumer.join()
+        records = [item.unpack(payload) for _, _, payload in received]
+        assert len(records) + ring.dropped == producers * count
+        # in order for each producer, none duplicated
+        for n in range(producers):
+            sent = [i for p, i in records if p == n]
+            assert sent == sorted(set(sent))
+    finally:
+        ring.close()
+
+
+def test_attached_end_sees_the_records(ring):
+    consumer = FrameRing(name=ring.name, wake=ring.wake)
+    try:
+        ring.put(FRAME, 1.0, b'\xA4')
+        assert consumer.get_many(timeout=1) == [(FRAME, 1.0, b'\xA4')]
+    finally:
+        consumer.close()
+
+
+def test_portable_results_fit_in_a_record():
+    assert pickle.loads(_portable({'channel': 1})) == {'channel': 1}
+    # not picklable: sent as its repr
+    unpicklable = pickle.loads(_portable(lambda: None))
+    assert isinstance(unpicklable, RuntimeError)
+    # non ASCII text taking more bytes than characters
+    for text in ('é' * MAX_PAYLOAD, '\U0001F6B2' * MAX_PAYLOAD):
+        data = _portable(text)
+        assert len(data) <= MAX_PAYLOAD
+        assert text.startswith(pickle.loads(data))
@@ -0,0 +1,99 @@
+import csv
+import threading
+
+import pytest
+
+import libAnt.constants as c
+import libAnt.message as m
+from libAnt.profiles.factory import Factory
+from libAnt.sinks.csvsink import CsvSink
+from libAnt.sinks.sink import COLUMNS, Sink
+from libAnt.sinks.writer import SinkWriter
+
+
+def trainer_broadcast(n: int, timestamp: float) -> m.BroadcastMessage:
+    raw = bytes([0, 0x19, n, 90, 200, 0, 200, 0, 0x20, c.EXT_FLAG_CHANNEL_ID, 0xD2, 0x04, 17, 5])
+    return m._rebuild_broadcast(raw, timestamp)
+
+
+class SlowSink(Sink):
+    """ Keeps the rows, each write waits until released """
+
+    def __init__(self):
+        super().__init__(None)
+        self.rows = []
+        self.release = threading.Event()
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def write(self, rows: list):
+        self.release.wait()
+        self.rows += rows
+
+    def encodeRows(self, rows: list) -> bytes:
+        return b''
+
+
+def test_full_queue_drops_and_counts_by_default():
+    sink = SlowSink()
+    writer = SinkWriter([sink], batchSize=1, maxPending=4)
+    writer.start()
+    for i in range(50):
+        writer.put((i,))
+    assert writer.dropped > 0
+    sink.release.set()
+    writer.stop()
+    assert len(sink.rows) + writer.dropped == 50
+    assert sink.rows == sorted(sink.rows)
+
+
+def test_sink_without_encode_rows_is_abstract():
+    class Incomplete(Sink):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete(None)
+
+
+def test_csv_sink(tmp_path):
+    path = str(tmp_path / 'rows.csv')
+    with SinkWriter([CsvSink(path)]) as writer:
+        writer.put((1.5, 1234, 17, 200, 90, None, None))
+        writer.put((2.0, 1234, 17, 210, 91, None, None))
+    with open(path, newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows == [list(COLUMNS),
+                    ['1.5', '1234', '17', '200', '90', '', ''],
+                    ['2.0', '1234', '17', '210', '91', '', '']]
+
+
+def test_factory_does_not_hold_its_lock_while_queueing():
+    class Writer:
+        """ put() blocks until the factory answers from another thread """
+
+        def __init__(self, factory):
+            self.factory = factory
+            self.rows = []
+
+        def put(self, row):
+            answered = threading.Event()
+
+            def query():
+                self.factory.history(1234, 17)
+                answered.set()
+
+            threading.Thread(target=query, daemon=True).start()
+            assert answered.wait(2), 'Factory lock held while the writer blocks'
+            self.rows.append(row)
+
+    writer = Writer(None)
+    factory = writer.factory = Factory(writer=writer)
+    factory.parseMessage(trainer_broadcast(1, 10.0))
+    assert [row[:3] for row in writer.rows] == [(10.0, 1234, 17)]
@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+import pytest
+
+import libAnt.drivers.usb as usbdriver
+from libAnt.drivers.driver import DriverException
+from libAnt.drivers.usb import USBDriver
+
+VID, PID = 0x0FCF, 0x1008
+
+
+class USBError(Exception):
+    pass
+
+
+class Bus:
+    """ Stand-in for pyusb's device enumeration, without port numbers as with libusb0 """
+
+    def __init__(self):
+        self.devices = []
+
+    def plug(self, address, serial=None, bus=1):
+        dev = SimpleNamespace(idVendor=VID, idProduct=PID, bus=bus, address=address,
+                              iSerialNumber=3 if serial else 0, serial=serial)
+        self.devices.append(dev)
+        return dev
+
+    def unplug(self, dev):
+        self.devices.remove(dev)
+
+    def find(self, find_all=False, backend=None, idVendor=None, idProduct=None, **match):
+        found = [dev for dev in self.devices
+                 if (dev.idVendor, dev.idProduct) == (idVendor, idProduct)
+                 and all(getattr(dev, k) == v for k, v in match.items())]
+        return found if find_all else next(iter(found), None)
+
+
+@pytest.fixture
+def bus(monkeypatch):
+    bus = Bus()
+    usb = SimpleNamespace(core=SimpleNamespace(find=bus.find, USBError=USBError),
+                          util=SimpleNamespace(get_string=lambda dev, index: dev.serial))
+    monkeypatch.setattr(usbdriver, '_usb', usb)
+    monkeypatch.setattr(usbdriver, '_backend', object())
+    monkeypatch.setattr(usbdriver, '_bound', usbdriver.WeakValueDictionary())
+    return bus
+
+
+def test_replugged_stick_found_again_by_serial(bus):
+    first = bus.plug(4, serial='A1')
+    bus.plug(5, serial='B2')
+    driver = USBDriver(VID, PID, bus=1, address=4)
+    bus.unplug(first)
+    with pytest.raises(DriverException):
+        # never swapped for the other stick
+        driver._relocate()
+    replugged = bus.plug(9, serial='A1')
+    driver._relocate()
+    assert driver._dev is replugged
+
+
+def test_stick_without_serial_takes_an_unbound_one(bus):
+    first, second = bus.plug(4), bus.plug(5)
+    a = USBDriver(VID, PID, bus=1, address=4)
+    b = USBDriver(VID, PID, bus=1, address=5)
+    bus.unplug(first)
+    with pytest.raises(DriverException):
+        # the remaining stick is bound to b, even while b is not open
+        a._relocate()
+    replugged = bus.plug(9)
+    a._relocate()
+    assert (a._dev, b._dev) == (replugged, second)